@@ -19,6 +19,15 @@ class AdversarialEnv:
     def opponent_policy(self, opponent_policy):
         self.__opponent_policy = opponent_policy
 
+    @property
+    def player_color(self):
+        return self.__env.player_color
+
+    @player_color.setter
+    def player_color(self, player_color):
+        assert player_color in ['black', 'white'], 'Invalid player color'
+        self.__env.player_color = player_color
+
     def swap_role(self):
         if (self.__env.player_color == 'black'):
             self.__env.player_color = 'white'
@@ -33,6 +42,9 @@ class AdversarialEnv:
         # Reset env and attach defined opponent policy to env
         return self.__env.step(self.__opponent_policy)
 
+    def seed(self, seed=None):
+        return self.__env.seed(seed)
+
     def render(self):
         return self.__env.render()
 
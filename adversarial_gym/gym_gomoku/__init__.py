@@ -93,3 +93,30 @@ register(
     },
     nondeterministic=True,
 )
+
+register(
+    id='Gomoku5x5-turn-v0',
+    entry_point='adversarial_gym.gym_gomoku.envs:GomokuTurnEnv',
+    kwargs={
+        'board_size': 5,
+    },
+    nondeterministic=True,
+)
+
+register(
+    id='Gomoku9x9-turn-v0',
+    entry_point='adversarial_gym.gym_gomoku.envs:GomokuTurnEnv',
+    kwargs={
+        'board_size': 9,
+    },
+    nondeterministic=True,
+)
+
+register(
+    id='Gomoku15x15-turn-v0',
+    entry_point='adversarial_gym.gym_gomoku.envs:GomokuTurnEnv',
+    kwargs={
+        'board_size': 15,
+    },
+    nondeterministic=True,
+)
@@ -1 +1 @@
-from .gomoku import GomokuEnv
+from .gomoku import GomokuEnv, GomokuTurnEnv, GomokuVecEnv
@@ -11,6 +11,7 @@ import random
 
 from .util import gomoku_util
 from .util import make_beginner_policy
+from .util import encode_boards, has_five
 
 # Rules from Wikipedia: Gomoku is an abstract strategy board game, Gobang or Five in a Row, it is traditionally played with Go pieces (black and white stones) on a go board with 19x19 or (15x15)
 # The winner is the first player to get an unbroken row of five stones horizontally, vertically, or diagonally. (so-calle five-in-a row)
@@ -96,31 +97,25 @@ class DiscreteWrapper2d(spaces.Discrete):
 
 
 # Environment
-class GomokuEnv(gym.Env):
+class GomokuTurnEnv(gym.Env):
     '''
-    GomokuEnv environment. Play against a fixed opponent.
+    Two-player GomokuEnv without an opponent: every step places a stone for the
+    player to move, and the observation is encoded for the next player to move
     '''
     metadata = {"render.modes": ["human", "ansi"]}
 
-    def __init__(self, player_color, opponent, board_size, random_reset=False):
+    def __init__(self, board_size, random_reset=False):
         """
         Args:
-            player_color: Stone color for the agent. Either 'black' or 'white'
-            opponent: Name of the opponent policy, e.g. random, beginner, medium, expert
             board_size: board_size of the board to use
+            random_reset: start from as many random black and white stones,
+                black to move, drawn from the python random module
         """
         # Below attribute is used for randome_reset
         self.action_list = range(board_size * board_size)
         self.random_reset = random_reset
 
         self.board_size = board_size
-        self.player_color = player_color
-
-        self._seed()
-
-        # opponentopponent_policy
-        self.opponent_policy = None
-        self.opponent = opponent
 
         # Observation space on board
         # board_size * board_size
@@ -129,22 +124,13 @@ class GomokuEnv(gym.Env):
         # One action for each board position
         self.action_space = DiscreteWrapper2d(self.board_size)
 
-        # Keep track of the moves
-        # self.moves = []
-
         # Empty State
         self.state = None
+        # State before the last move
+        self.prev_state = None
+        self.done = False
 
-        # reset the board during initialization
-        # self._reset()
-
-    def _seed(self, seed=None):
-        self.np_random, seed1 = seeding.np_random(seed)
-        # Derive a random seed.
-        seed2 = seeding.hash_seed(seed1 + 1) % 2**32
-        return [seed1, seed2]
-
-    def _reset(self, custom_opponent_policy=None):
+    def _reset(self):
         if self.random_reset:
             while(True):
                 self.state = GomokuState(
@@ -183,34 +169,151 @@ class GomokuEnv(gym.Env):
             # reset action_space
             self.action_space = DiscreteWrapper2d(self.board_size)
 
+        self.prev_state = None
+        self.done = self.state.board.is_terminal()
+        return self.state.encode()
+
+    def _close(self):
+        self.state = None
+        self.prev_state = None
+
+    def _render(self, mode="human", close=False):
+        if close:
+            return
+        outfile = StringIO() if mode == 'ansi' else sys.stdout
+        outfile.write(repr(self.state) + '\n')
+        return outfile
+
+    def legal_mask(self):
+        '''Return: np array
+            np.array(board_size * board_size) of bool, True on the empty intersections
+        '''
+        return self.action_space.invalid_mask == 0
+
+    def _step(self, action):
+        '''
+        Args:
+            action:
+                value: 0 -> num_actions
+                type: int
+        Return:
+            observation:
+                board encoding for the next player to move, for the
+                same player after an invalid move
+            reward:
+                reward of the player who took action,
+                type: float
+                value:
+                    1: win
+                    -1: action is invalid
+                    0: draw or nothing
+            done:
+                type: boolean
+                value:
+                    True: game is finish or invalid move is taken
+                    False: vice versa
+            info: dict
+                state: GomokuState after the move
+                legal_mask: legal moves of the next player, see legal_mask
+        '''
+        # If already terminal, then don't do anything
+        if self.done:
+            return self.state.encode(), 0., True, self._info()
+
+        # check if it's illegal move
+        # if the space is fill
+        if self.action_space.invalid_mask[action]:
+            self.done = True
+            return self.state.encode(), -1., True, self._info()
+
+        self.prev_state = self.state
+        self.state = self.state.act(action)
+        # remove current action from action_space
+        self.action_space.remove(action)
+
+        # Reward: if nonterminal, there is no 5 in a row, then the reward is 0
+        if not self.state.board.is_terminal():
+            return self.state.encode(), 0., False, self._info()
+
+        self.done = True
+        exist, win_color = gomoku_util.check_five_in_row(
+            self.state.board.board_state)  # 'empty', 'black', 'white'
+        reward = 0.
+        if win_color != "empty":
+            reward = 1. if self.prev_state.color == win_color else -1.
+        return self.state.encode(), reward, True, self._info()
+
+    def _info(self):
+        return {'state': self.state, 'legal_mask': self.legal_mask()}
+
+
+class GomokuEnv(gym.Env):
+    '''
+    GomokuEnv environment. Play against a fixed opponent.
+    A GomokuTurnEnv where the opponent policy plays the moves of the other color.
+    '''
+    metadata = {"render.modes": ["human", "ansi"]}
+
+    def __init__(self, player_color, opponent, board_size, random_reset=False):
+        """
+        Args:
+            player_color: Stone color for the agent. Either 'black' or 'white'
+            opponent: Name of the opponent policy, e.g. random, beginner, medium, expert
+            board_size: board_size of the board to use
+        """
+        self.game = GomokuTurnEnv(board_size, random_reset)
+
+        self.board_size = board_size
+        self.player_color = player_color
+
+        self._seed()
+
+        # opponentopponent_policy
+        self.opponent_policy = None
+        self.opponent = opponent
+
+        self.observation_space = self.game.observation_space
+
+    @property
+    def state(self):
+        return self.game.state
+
+    @property
+    def action_space(self):
+        return self.game.action_space
+
+    @property
+    def done(self):
+        return self.game.done
+
+    def _seed(self, seed=None):
+        self.np_random, seed1 = seeding.np_random(seed)
+        # Derive a random seed.
+        seed2 = seeding.hash_seed(seed1 + 1) % 2**32
+        return [seed1, seed2]
+
+    def _reset(self, custom_opponent_policy=None):
+        observation = self.game.reset()
+
         # (re-initialize) the opponent,
         self._reset_opponent(custom_opponent_policy)
-        # self.moves = []
 
         # Let the opponent play if it's not the agent's turn, there is no resign in Gomoku
         if self.state.color != self.player_color:
             opponent_action = self._exec_opponent_play(
                 self.state, None, None)
-            self.state = self.state.act(opponent_action)
-            self.action_space.remove(opponent_action)
-            # self.moves.append(self.state.board.last_coord)
+            observation, _, _, _ = self.game.step(opponent_action)
 
-        # We should be back to the agent color
-        assert self.state.color == self.player_color
-
-        self.done = self.state.board.is_terminal()
-        return self.state.encode()
+        # We should be back to the agent color, unless the opening was on a stone
+        assert self.state.color == self.player_color, 'the opponent opened on an occupied intersection'
+        return observation
 
     def _close(self):
         self.opponent_policy = None
-        self.state = None
+        self.game.close()
 
     def _render(self, mode="human", close=False):
-        if close:
-            return
-        outfile = StringIO() if mode == 'ansi' else sys.stdout
-        outfile.write(repr(self.state) + '\n')
-        return outfile
+        return self.game.render(mode=mode, close=close)
 
     def _step(self, action):
         '''
@@ -234,7 +337,7 @@ class GomokuEnv(gym.Env):
                 value:
                     True: game is finish or invalid move is taken
                     False: vice versa
-            info: state dict
+            info: state dict, see GomokuTurnEnv._step
         Raise:
             Illegal Move action, basically the position on board is not empty
 
@@ -248,58 +351,22 @@ class GomokuEnv(gym.Env):
             return self._reset(custom_opponent_policy=action)
 
         assert self.state.color == self.player_color  # it's the player's turn
-        # If already terminal, then don't do anything
-        if self.done:
-            return self.state.encode(), 0., True, {'state': self.state}
 
-        # check if it's illegal move
-        # if the space is fill
-        if self.action_space.invalid_mask[action]:
-            return self.state.encode(), -1., True, {'state': self.state}
-
-        # Player play
+        # Player play: win, draw or invalid move end the game
         prev_state = self.state
-        self.state = self.state.act(action)
-        # self.moves.append(self.state.board.last_coord)
-        # remove current action from action_space
-        self.action_space.remove(action)
+        observation, reward, done, info = self.game.step(action)
+        if done:
+            return observation, reward, done, info
 
         # Opponent play
-        if not self.state.board.is_terminal():
-            opponent_action = self._exec_opponent_play(
-                self.state, prev_state, action)
-            # check if it's illegal move
-            # if the space is fill
-            if self.action_space.invalid_mask[opponent_action]:
-                return self.state.encode(), 0., True, {'state': self.state}
-
-            self.state = self.state.act(opponent_action)
-            # self.moves.append(self.state.board.last_coord)
-            # remove opponent action from action_space
-            self.action_space.remove(opponent_action)
+        opponent_action = self._exec_opponent_play(
+            self.state, prev_state, action)
+        observation, reward, done, info = self.game.step(opponent_action)
+        if not done:
             # After opponent play, we should be back to the original color
             assert self.state.color == self.player_color
-
-        # Reward: if nonterminal, there is no 5 in a row, then the reward is 0
-        if not self.state.board.is_terminal():
-            self.done = False
-            return self.state.encode(), 0., False, {'state': self.state}
-
-        # We're in a terminal state. Reward is 1 if won, -1 if lost
-        assert self.state.board.is_terminal(), 'The game is terminal'
-        self.done = True
-
-        # Check Fianl wins
-        exist, win_color = gomoku_util.check_five_in_row(
-            self.state.board.board_state)  # 'empty', 'black', 'white'
-        reward = 0.
-        if win_color == "empty":  # draw
-            reward = 0.
-        else:
-            # check if player_color is the win_color
-            player_wins = (self.player_color == win_color)
-            reward = 1. if player_wins else -1.
-        return self.state.encode(), reward, True, {'state': self.state}
+        # Opponent win is a loss, opponent's invalid move (-1) is worth 0
+        return observation, -reward if reward > 0 else 0., done, info
 
     def _exec_opponent_play(self, curr_state, prev_state, prev_action):
         '''There is no resign in gomoku'''
@@ -311,10 +378,6 @@ class GomokuEnv(gym.Env):
     def _state(self):
         return self.state
 
-    # @property
-    # def _moves(self):
-    #     return self.moves
-
     def _reset_opponent(self, custom_opponent_policy=None):
         if self.opponent == 'beginner':
             self.opponent_policy = make_beginner_policy(self.np_random)
@@ -325,6 +388,103 @@ class GomokuEnv(gym.Env):
                 'Unrecognized opponent policy {}'.format(self.opponent))
 
 
+class GomokuVecEnv(object):
+    '''
+    num_envs GomokuTurnEnv games stepped together with numpy, one move of
+    every game per step. A finished game is started again at once, as in the
+    vectorized envs of baselines.
+    '''
+
+    def __init__(self, num_envs, board_size, random_reset=False, seed=None):
+        """
+        Args:
+            num_envs: number of games
+            board_size: board_size of the board to use
+            random_reset: start from as many random black and white stones,
+                black to move, with the same distribution as GomokuTurnEnv
+            seed: seed of the random resets
+        """
+        self.num_envs = num_envs
+        self.board_size = board_size
+        self.random_reset = random_reset
+        self.np_random = np.random.RandomState(seed)
+
+        shape = (board_size, board_size, 3)
+        self.observation_space = spaces.Box(np.zeros(shape), np.ones(shape))
+        self.action_space = spaces.Discrete(board_size * board_size)
+
+        # color_dict values of the stones and of the player to move
+        self.boards = np.zeros((num_envs, board_size, board_size), dtype=np.int8)
+        self.to_move = np.full(num_envs, gomoku_util.color_dict['black'], dtype=np.int8)
+
+    def _reset_games(self, games):
+        black, white = gomoku_util.color_dict['black'], gomoku_util.color_dict['white']
+        num_cells = self.board_size * self.board_size
+        for k in games:
+            board = self.boards[k].reshape(-1)
+            while True:
+                board[:] = gomoku_util.color_dict['empty']
+                if self.random_reset:
+                    num_stones = self.np_random.randint(0, (num_cells - 1) // 3 + 1)
+                    cells = self.np_random.choice(num_cells, 2 * num_stones, replace=False)
+                    board[cells[:num_stones]] = black
+                    board[cells[num_stones:]] = white
+                if not (has_five(self.boards[k:k + 1], 'black')[0] or has_five(self.boards[k:k + 1], 'white')[0]):
+                    break
+            self.to_move[k] = black
+
+    def reset(self):
+        '''Start every game again
+            Return: np.array(num_envs, board_size, board_size, 3)
+        '''
+        self._reset_games(range(self.num_envs))
+        return encode_boards(self.boards, self.to_move)
+
+    def legal_mask(self):
+        '''Return: np array
+            np.array(num_envs, board_size * board_size) of bool, True on the empty intersections
+        '''
+        return self.boards.reshape(self.num_envs, -1) == gomoku_util.color_dict['empty']
+
+    def step(self, actions):
+        '''
+        Args:
+            actions: np.array(num_envs) of int, move of the player to move in every game
+        Return:
+            observations: np.array(num_envs, board_size, board_size, 3) for the
+                next player to move, the first position of the new game if done
+            rewards: np.array(num_envs) reward of the player who moved, as
+                GomokuTurnEnv
+            dones: np.array(num_envs) of bool
+            info: dict
+                color: np.array(num_envs) color_dict value of the player who moved
+                final_observation: np.array(num_envs, board_size, board_size, 3)
+                    observations GomokuTurnEnv returns, before finished
+                    games are started again
+                legal_mask: legal moves of the next player, see legal_mask
+        '''
+        actions = np.asarray(actions)
+        games = np.arange(self.num_envs)
+        flat = self.boards.reshape(self.num_envs, -1)
+        movers = self.to_move.copy()
+
+        legal = flat[games, actions] == gomoku_util.color_dict['empty']
+        flat[games[legal], actions[legal]] = movers[legal]
+        five = np.where(movers == gomoku_util.color_dict['black'],
+                        has_five(self.boards, 'black'), has_five(self.boards, 'white'))
+        full = np.all(flat != gomoku_util.color_dict['empty'], axis=1)
+        dones = ~legal | five | full
+        rewards = np.where(~legal, -1., np.where(five, 1., 0.))
+
+        # black 1 <-> white 2, finished games are reset to black below
+        self.to_move = np.where(legal, 3 - movers, movers).astype(np.int8)
+        final_observation = encode_boards(self.boards, self.to_move)
+        self._reset_games(np.flatnonzero(dones))
+        info = {'color': movers, 'final_observation': final_observation,
+                'legal_mask': self.legal_mask()}
+        return encode_boards(self.boards, self.to_move), rewards, dones, info
+
+
 class Board(object):
     '''
     Basic Implementation of a Go Board, natural action are int [0,board_size**2)
@@ -182,6 +182,180 @@ class GomokuUtil(object):
 gomoku_util = GomokuUtil()
 # Rule.other_color('black')
 
+### Patterns ###
+
+
+def four_patterns(color):
+    '''Four stones of color and the empty cell that makes five
+    '''
+    pattern_four_a = [
+        0] + [gomoku_util.color_dict[color]] * 4  # [0,1,1,1,1]
+    pattern_four_b = [
+        gomoku_util.color_dict[color]] * 4 + [0]  # [1,1,1,1,0]
+    return [pattern_four_a, pattern_four_b]
+
+
+def three_patterns(color):
+    '''Open three and broken threes of color
+    '''
+    pattern_three_a = [
+        0] + [gomoku_util.color_dict[color]] * 3 + [0]  # [0,1,1,1,0]
+    pattern_three_b = [gomoku_util.color_dict[color]] * 2 + \
+        [0] + [gomoku_util.color_dict[color]] * 1  # [1,1,0,1]
+    pattern_three_c = [gomoku_util.color_dict[color]] * 1 + \
+        [0] + [gomoku_util.color_dict[color]] * 2  # [1,0,1,1]
+    return [pattern_three_a, pattern_three_b, pattern_three_c]
+
+
+def defend_patterns(opponent_color):
+    '''Patterns of the opponent to block, most urgent first
+    '''
+    return four_patterns(opponent_color) + three_patterns(opponent_color)
+
+
+def strike_patterns(player_color):
+    '''Patterns of the player to extend, most promising first
+    '''
+    pattern_two = [0] + [gomoku_util.color_dict[player_color]
+                         ] * 2 + [0]  # [0,1,1,0]
+    return four_patterns(player_color) + three_patterns(player_color) + [pattern_two]
+
+
+### Batched board functions ###
+# boards: np.array(n, board_size, board_size) of color_dict values
+
+# Rows, columns, diagonals and anti-diagonals, each line read in the same
+# order as GomokuUtil.iterator so that asymmetric patterns match the same way
+DIRECTIONS = [(0, 1), (1, 0), (1, 1), (-1, 1)]
+
+
+def _offset(planes, di, dj, fill):
+    '''out[:, i, j] = planes[:, i + di, j + dj], fill off the board
+    '''
+    n, size, _ = planes.shape
+    out = np.full(planes.shape, fill, dtype=planes.dtype)
+    if abs(di) >= size or abs(dj) >= size:
+        return out
+    out[:, max(-di, 0):size - max(di, 0), max(-dj, 0):size - max(dj, 0)] = \
+        planes[:, max(di, 0):size - max(-di, 0), max(dj, 0):size - max(-dj, 0)]
+    return out
+
+
+def _line_lengths(size):
+    '''Length of the line through each cell along each direction
+        Return: np.array(4, board_size, board_size)
+    '''
+    i, j = np.indices((size, size))
+    diagonal = size - np.abs(i - j)
+    anti_diagonal = size - np.abs(i + j - (size - 1))
+    return np.stack([np.full((size, size), size), np.full((size, size), size),
+                     diagonal, anti_diagonal])
+
+
+def match_pattern(boards, pattern):
+    '''Where pattern starts along each direction, on the lines of 5 cells or
+    more only, as GomokuUtil.check_pattern
+        Return: np.array(n, 4, board_size, board_size) of bool
+    '''
+    line_lengths = _line_lengths(boards.shape[1])
+    matches = []
+    for d, (di, dj) in enumerate(DIRECTIONS):
+        match = np.broadcast_to(line_lengths[d] >= 5, boards.shape).copy()
+        for m, value in enumerate(pattern):
+            match &= _offset(boards, m * di, m * dj, -1) == value
+        matches.append(match)
+    return np.stack(matches, axis=1)
+
+
+def pattern_moves(boards, patterns):
+    '''Empty cells inside a match of any of the patterns, the moves connect_line
+    of make_beginner_policy chooses from
+        Return: np.array(n, board_size, board_size) of bool
+    '''
+    moves = np.zeros(boards.shape, dtype=bool)
+    for pattern in patterns:
+        matches = match_pattern(boards, pattern)
+        for d, (di, dj) in enumerate(DIRECTIONS):
+            for m, value in enumerate(pattern):
+                if value == 0:
+                    moves |= _offset(matches[:, d], -m * di, -m * dj, False)
+    return moves
+
+
+def has_five(boards, color):
+    '''Whether color has five in a row (or more) on each board
+    '''
+    pattern = [gomoku_util.color_dict[color]] * 5
+    return match_pattern(boards, pattern).reshape(len(boards), -1).any(axis=1)
+
+
+def winning_moves(boards, color):
+    '''Empty cells where a stone of color makes five in a row (or more)
+        Return: np.array(n, board_size, board_size) of bool
+    '''
+    same = boards == gomoku_util.color_dict[color]
+    wins = np.zeros(boards.shape, dtype=bool)
+    for di, dj in DIRECTIONS:
+        run = np.ones(boards.shape, dtype=np.int32)
+        for sign in [1, -1]:
+            alive = np.ones(boards.shape, dtype=bool)
+            for m in range(1, 5):
+                alive &= _offset(same, sign * m * di, sign * m * dj, False)
+                run += alive
+        wins |= run >= 5
+    return wins & (boards == gomoku_util.color_dict['empty'])
+
+
+def encode_boards(boards, colors):
+    '''Batched GomokuState.encode
+    Args:
+        boards: np.array(n, board_size, board_size)
+        colors: np.array(n) color_dict value of the player to move
+    Return:
+        np.array(n, board_size, board_size, 3)
+    '''
+    obs = np.zeros(boards.shape + (3,), dtype=np.int32)
+    obs[:, :, :, 0] = (np.asarray(colors) - 1)[:, None, None]
+    obs[:, :, :, 1] = boards == gomoku_util.color_dict['black']
+    obs[:, :, :, 2] = boards == gomoku_util.color_dict['white']
+    return obs
+
+def parse_board(board_string):
+    '''Flat board of a board string of digits, 0 empty, 1 black, 2 white,
+    in row-major order, as sent to main.py --serve and the inference server
+    '''
+    board = np.frombuffer(board_string.encode('ascii'), dtype=np.uint8) - ord('0')
+    if not np.all(board <= gomoku_util.color_dict['white']):
+        raise ValueError('a board is a string of 0, 1 and 2')
+    return board
+
+
+def side_to_move(board):
+    '''color_dict value of the player to move, black plays first'''
+    black, white = gomoku_util.color_dict['black'], gomoku_util.color_dict['white']
+    return black if np.count_nonzero(board == black) == np.count_nonzero(board == white) else white
+
+
+def parse_move_request(request):
+    '''Flat board and side to move of a move request, the board string
+    alone or an object {"board": "0102...", "color": "black"} where color
+    (a name or a color_dict value) is optional
+    Raises:
+        ValueError, KeyError, TypeError or AttributeError if the request
+        is malformed, the color unknown or the board full
+    '''
+    board = parse_board(request['board'] if isinstance(request, dict) else request)
+    if not np.any(board == gomoku_util.color_dict['empty']):
+        raise ValueError('the board is full')
+    color = request.get('color') if isinstance(request, dict) else None
+    if color is None:
+        return board, side_to_move(board)
+    if isinstance(color, str):
+        color = gomoku_util.color_dict[color]
+    if color not in (gomoku_util.color_dict['black'], gomoku_util.color_dict['white']):
+        raise ValueError('unknown color {!r}'.format(color))
+    return board, color
+
 ### Opponent policies ###
 
 
@@ -209,18 +383,7 @@ def make_beginner_policy(np_random):
         lines, start, next_move = None, None, None  # initialization
 
         # List all the defend patterns
-        pattern_four_a = [
-            0] + [gomoku_util.color_dict[opponent_color]] * 4  # [0,1,1,1,1]
-        pattern_four_b = [
-            gomoku_util.color_dict[opponent_color]] * 4 + [0]  # [1,1,1,1,0]
-        pattern_three_a = [
-            0] + [gomoku_util.color_dict[opponent_color]] * 3 + [0]  # [0,1,1,1,0]
-        pattern_three_b = [gomoku_util.color_dict[opponent_color]] * 2 + \
-            [0] + [gomoku_util.color_dict[opponent_color]] * 1  # [1,1,0,1]
-        pattern_three_c = [gomoku_util.color_dict[opponent_color]] * 1 + \
-            [0] + [gomoku_util.color_dict[opponent_color]] * 2  # [1,0,1,1]
-        patterns = [pattern_four_a, pattern_four_b,
-                    pattern_three_a, pattern_three_b, pattern_three_c]
+        patterns = defend_patterns(opponent_color)
 
         for p in patterns:
             action = connect_line(b, p)
@@ -284,7 +447,15 @@ def make_beginner_policy(np_random):
         all_legal_moves = b.get_legal_move()
 
         if not prev_state:
-            return b.coord_to_action(b.size // 2, b.size // 2)
+            # Open in the center, unless a stone of a random reset is there
+            if b.board_state[b.size // 2][b.size // 2] == 0:
+                return b.coord_to_action(b.size // 2, b.size // 2)
+            for p in strike_patterns(curr_state.color):
+                action = connect_line(b, p)
+                if (action):
+                    return action
+            # No previous move to play around, a random legal move
+            return None
 
         # last action taken by the oppenent
         last_action = prev_state.board.last_action
@@ -292,20 +463,7 @@ def make_beginner_policy(np_random):
         player_color = curr_state.color
 
         # List all the strike patterns
-        pattern_four_a = [
-            0] + [gomoku_util.color_dict[player_color]] * 4  # [0,1,1,1,1]
-        pattern_four_b = [
-            gomoku_util.color_dict[player_color]] * 4 + [0]  # [1,1,1,1,0]
-        pattern_three_a = [
-            0] + [gomoku_util.color_dict[player_color]] * 3 + [0]  # [0,1,1,1,0]
-        pattern_three_b = [gomoku_util.color_dict[player_color]] * 2 + \
-            [0] + [gomoku_util.color_dict[player_color]] * 1  # [1,1,0,1]
-        pattern_three_c = [gomoku_util.color_dict[player_color]] * 1 + \
-            [0] + [gomoku_util.color_dict[player_color]] * 2  # [1,0,1,1]
-        pattern_two = [0] + [gomoku_util.color_dict[player_color]
-                             ] * 2 + [0]  # [0,1,1,0]
-        patterns = [pattern_four_a, pattern_four_b, pattern_three_a,
-                    pattern_three_b, pattern_three_c, pattern_two]
+        patterns = strike_patterns(player_color)
 
         for p in patterns:
             action = connect_line(b, p)
@@ -0,0 +1,97 @@
+"""Average float32 vectors across local processes through shared memory
+
+Every replica writes its vector into its own slot, then each replica
+averages one contiguous chunk of all the slots into a shared result, then
+all replicas copy the result out. Two barriers per call, no data goes
+through pipes or sockets. The block is a shared_params.SharedBlock, a
+file in /dev/shm, so that it works on python 3.7.
+
+Every replica gets a bitwise identical result, so replicas that start from
+the same weights and apply the averaged gradients stay identical.
+"""
+import numpy as np
+
+from baselines.common.shared_params import SharedBlock
+
+
+class SharedMemoryAllReduce(object):
+    def __init__(self, name, size, rank, world_size, barrier):
+        """Must be created by all the replicas, rank 0 allocates the shared memory.
+
+        Parameters
+        ----------
+        name: str
+            name of the shared memory block (see SharedBlock), the same for
+            all replicas
+        size: int
+            number of elements of the reduced vectors
+        rank: int
+            index of this replica in [0, world_size)
+        world_size: int
+            number of replicas
+        barrier: multiprocessing.Barrier
+            barrier shared by the world_size replicas
+        """
+        self.rank = rank
+        self.world_size = world_size
+        self.size = size
+        self._barrier = barrier
+        nbytes = (world_size + 1) * size * 4
+        if rank == 0:
+            self._shm = SharedBlock(name, size=nbytes, create=True)
+            self._barrier.wait()
+        else:
+            self._barrier.wait()
+            self._shm = SharedBlock(name)
+        buffers = np.ndarray((world_size + 1, size),
+                             dtype=np.float32, buffer=self._shm.buf)
+        self._slots = buffers[:world_size]
+        self._result = buffers[world_size]
+        bounds = np.linspace(0, size, world_size + 1).astype(np.int64)
+        self._chunk = slice(bounds[rank], bounds[rank + 1])
+
+    def allreduce_mean(self, flat, out=None):
+        """Mean of `flat` over all the replicas, every replica must call it
+
+        Returns
+        -------
+        mean: np.array
+            float32 array of shape (size,), written into out if given
+        """
+        if out is None:
+            out = np.empty(self.size, dtype=np.float32)
+        self._slots[self.rank] = flat
+        self._barrier.wait()
+        np.mean(self._slots[:, self._chunk], axis=0,
+                out=self._result[self._chunk])
+        self._barrier.wait()
+        np.copyto(out, self._result)
+        return out
+
+    def broadcast(self, flat=None, out=None):
+        """Value of `flat` on rank 0, every replica must call it
+
+        Returns
+        -------
+        flat: np.array
+            float32 array of shape (size,), written into out if given
+        """
+        if out is None:
+            out = np.empty(self.size, dtype=np.float32)
+        # Wait for everyone to be done with the result of a previous call
+        self._barrier.wait()
+        if self.rank == 0:
+            self._result[:] = flat
+        self._barrier.wait()
+        np.copyto(out, self._result)
+        self._barrier.wait()
+        return out
+
+    def close(self):
+        """Every replica must call it, rank 0 frees the shared memory"""
+        self._slots = None
+        self._result = None
+        self._barrier.wait()
+        self._shm.close()
+        if self.rank == 0:
+            self._shm.unlink()
@@ -0,0 +1,237 @@
+"""Lean checkpoints: a JSON spec and the raw variable values in one file
+
+The file is an uncompressed zip, readable by np.load as an .npz, with
+
+    spec.json       free form JSON description (e.g. the model spec)
+    <name>.npy      one member per variable, named after the variable
+
+It is written in one streaming pass, without temporary directory or
+in-memory archive, and read by memory mapping the file: the variable
+arrays are views into the mapping, nothing is copied until they are
+loaded into the session. AsyncCheckpointWriter writes them in the
+background.
+"""
+import concurrent.futures
+import io
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import weakref
+import zipfile
+
+import numpy as np
+import tensorflow as tf
+
+import baselines.common.tf_util as U
+from baselines.common.misc_util import LatencyStats
+
+SPEC_MEMBER = "spec.json"
+# Assign ops of assign_variables by graph and variable name
+_assign_ops = weakref.WeakKeyDictionary()
+# Fixed part of a zip local file header, see the zip APPNOTE 4.3.7
+_LOCAL_HEADER = struct.Struct("<4sHHHHHIIIHH")
+
+
+def _member_name(var_name):
+    # "deepq/q_func/w:0" -> "deepq/q_func/w.npy"
+    return var_name.split(":")[0] + ".npy"
+
+
+def variable_values(var_list):
+    """Values of var_list in the default session, with one Session.run
+
+    Returns
+    -------
+    values: {str: np.array}
+        value of every variable by variable name
+    """
+    return dict(zip([v.name for v in var_list], U.get_session().run(var_list)))
+
+
+def assign_variables(var_list, values):
+    """Load values (by variable name) into var_list, with one Session.run"""
+    feed_dict = {}
+    assign_ops = []
+    for var in var_list:
+        value = values[var.name]
+        assert tuple(value.shape) == tuple(var.get_shape().as_list()), \
+            "shape mismatch for {}".format(var.name)
+        ph, assign_op = _assign_op(var)
+        assign_ops.append(assign_op)
+        feed_dict[ph] = value
+    U.get_session().run(assign_ops, feed_dict=feed_dict)
+
+
+def _assign_op(var):
+    """Placeholder and assign op loading a value into var, built once per
+    variable so that loading again does not grow the graph"""
+    ops = _assign_ops.setdefault(var.graph, {})
+    if var.name not in ops:
+        with var.graph.as_default():
+            ph = tf.placeholder(var.dtype.base_dtype, var.get_shape())
+            ops[var.name] = (ph, tf.assign(var, ph))
+    return ops[var.name]
+
+
+def is_checkpoint(path):
+    """Whether path is a lean checkpoint (and not e.g. a legacy pickle)"""
+    if not zipfile.is_zipfile(path):
+        return False
+    with zipfile.ZipFile(path) as zf:
+        return SPEC_MEMBER in zf.namelist()
+
+
+def write_checkpoint(path, spec, values):
+    """Write a checkpoint, atomically replacing path
+
+    Parameters
+    ----------
+    path: str
+        checkpoint file
+    spec: dict
+        JSON serializable description
+    values: {str: np.array}
+        variable values by variable name, see variable_values
+    """
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        with zipfile.ZipFile(f, "w", compression=zipfile.ZIP_STORED) as zf:
+            zf.writestr(SPEC_MEMBER, json.dumps(spec, indent=2, sort_keys=True))
+            for name, value in sorted(values.items()):
+                with zf.open(_member_name(name), "w", force_zip64=True) as member:
+                    # np.require keeps the shape of scalars, e.g. deepq/eps:0
+                    np.lib.format.write_array(
+                        member, np.require(value, requirements="C"), allow_pickle=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def read_checkpoint(path):
+    """Read a checkpoint without copying the arrays
+
+    Returns
+    -------
+    spec: dict
+        the spec given to write_checkpoint
+    values: {str: np.array}
+        read only arrays by variable name, views into a memory mapping of the file
+    """
+    with open(path, "rb") as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    with zipfile.ZipFile(path) as zf:
+        spec = json.loads(zf.read(SPEC_MEMBER).decode("utf-8"))
+        infos = [info for info in zf.infolist() if info.filename != SPEC_MEMBER]
+    values = {}
+    for info in infos:
+        assert info.compress_type == zipfile.ZIP_STORED, "compressed member {}".format(
+            info.filename)
+        fields = _LOCAL_HEADER.unpack_from(buf, info.header_offset)
+        name_length, extra_length = fields[-2], fields[-1]
+        data_offset = info.header_offset + _LOCAL_HEADER.size + name_length + extra_length
+        header = io.BytesIO(buf[data_offset:data_offset + min(info.file_size, 1 << 16)])
+        version = np.lib.format.read_magic(header)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(header)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(header)
+        values[info.filename[:-len(".npy")] + ":0"] = np.ndarray(
+            shape, dtype=dtype, buffer=buf, offset=data_offset + header.tell(),
+            order="F" if fortran_order else "C")
+    return spec, values
+
+
+class AsyncCheckpointWriter(object):
+    def __init__(self, max_in_flight=2):
+        """Write checkpoints on a background thread.
+
+        save() only copies the variable values out of the session (one
+        Session.run), the serialization, fsync and atomic rename happen on
+        the writer thread so the caller does not stall on the disk.
+
+        Parameters
+        ----------
+        max_in_flight: int
+            max number of checkpoints copied but not written yet, save()
+            blocks when it is reached so that memory stays bounded
+        """
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._futures = []
+        self._snapshot_latency = LatencyStats()
+        self._write_latency = LatencyStats()
+        self._blocked_time = 0.
+
+    def _write(self, path, spec, values):
+        try:
+            start = time.time()
+            write_checkpoint(path, spec, values)
+            self._write_latency.add(time.time() - start)
+        finally:
+            self._slots.release()
+
+    def _check(self):
+        """Re-raise the error of a finished write, if any"""
+        futures, self._futures = self._futures, []
+        for future in futures:
+            if future.done():
+                future.result()
+            else:
+                self._futures.append(future)
+
+    def save(self, path, spec, var_list):
+        """Snapshot var_list in the default session and write it to path in
+        the background, see write_checkpoint"""
+        self._check()
+        start = time.time()
+        self._slots.acquire()
+        self._blocked_time += time.time() - start
+        try:
+            start = time.time()
+            values = variable_values(var_list)
+            self._snapshot_latency.add(time.time() - start)
+            self._futures.append(self._executor.submit(self._write, path, spec, values))
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def save_values(self, path, spec, values):
+        """Write values already copied out of the session (see
+        variable_values) to path in the background"""
+        self._check()
+        start = time.time()
+        self._slots.acquire()
+        self._blocked_time += time.time() - start
+        try:
+            self._futures.append(self._executor.submit(self._write, path, spec, values))
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def wait(self):
+        """Block until every checkpoint handed to save is on disk"""
+        for future in self._futures:
+            future.result()
+        self._futures = []
+
+    def close(self):
+        self.wait()
+        self._executor.shutdown()
+
+    def metrics(self):
+        """Snapshot and write latencies
+
+        Returns
+        -------
+        metrics: {str: float}
+        """
+        return {
+            "checkpoint snapshot p50 (ms)": self._snapshot_latency.percentile(50) * 1000,
+            "checkpoint write p50 (ms)": self._write_latency.percentile(50) * 1000,
+            "checkpoint write p99 (ms)": self._write_latency.percentile(99) * 1000,
+            "checkpoint in flight": len([f for f in self._futures if not f.done()]),
+            "checkpoint blocked (s)": self._blocked_time,
+        }
@@ -0,0 +1,209 @@
+"""History of checkpoints stored as full snapshots plus compressed deltas
+
+Consecutive checkpoints of a run differ little: the sign, the exponent and
+the high mantissa bits of most weights do not change between two saves. A
+delta is the XOR of the raw bytes of a checkpoint with the previous one,
+byte-shuffled (all first bytes, then all second bytes, ...) so that the
+unchanged bytes form long runs of zeros, then zlib compressed. XOR is exact,
+the rebuilt checkpoint is bitwise identical.
+
+Every `full_every` checkpoints a full lean checkpoint (see checkpoint.py) is
+written, so rebuilding any step applies at most full_every - 1 deltas.
+
+Directory layout:
+
+    index.json              [{"step", "kind": "full" or "delta"}] in step order
+    step-<step>.npz         full checkpoint
+    step-<step>.delta       zip of spec.json and one zlib member per variable
+"""
+import json
+import os
+import zipfile
+import zlib
+
+import numpy as np
+
+from baselines.common import checkpoint
+
+_INDEX = "index.json"
+
+
+def _shuffle(data, itemsize):
+    """Group the bytes of the items by position in the item"""
+    return np.ascontiguousarray(data.reshape(-1, itemsize).T)
+
+
+def _unshuffle(data, itemsize):
+    return np.ascontiguousarray(data.reshape(itemsize, -1).T).reshape(-1)
+
+
+def _xor_bytes(a, b):
+    return np.bitwise_xor(np.ascontiguousarray(a).view(np.uint8).reshape(-1),
+                          np.ascontiguousarray(b).view(np.uint8).reshape(-1))
+
+
+class CheckpointStore(object):
+    def __init__(self, directory, full_every=10, level=6):
+        """Open or create a checkpoint history in directory.
+
+        Parameters
+        ----------
+        directory: str
+            where the checkpoints are stored
+        full_every: int
+            write a full checkpoint every full_every checkpoints, deltas in between
+        level: int
+            zlib compression level of the deltas
+        """
+        os.makedirs(directory, exist_ok=True)
+        self._directory = directory
+        self._full_every = full_every
+        self._level = level
+        index_file = os.path.join(directory, _INDEX)
+        if os.path.exists(index_file):
+            with open(index_file) as f:
+                self._index = json.load(f)
+        else:
+            self._index = []
+        # Values of the last added checkpoint, base of the next delta
+        self._last = None
+        # Last rebuilt checkpoint, so that walking the steps in order
+        # applies one delta per step
+        self._cached = None
+
+    def steps(self):
+        """Steps of the stored checkpoints, in increasing order"""
+        return [entry["step"] for entry in self._index]
+
+    def latest(self):
+        """Step of the most recent checkpoint, None if there is none"""
+        return self._index[-1]["step"] if self._index else None
+
+    def _path(self, step, kind):
+        return os.path.join(self._directory, "step-{}.{}".format(
+            step, "npz" if kind == "full" else "delta"))
+
+    def _write_index(self):
+        temp_path = os.path.join(self._directory, _INDEX + ".tmp")
+        with open(temp_path, "w") as f:
+            json.dump(self._index, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, os.path.join(self._directory, _INDEX))
+
+    def _since_full(self):
+        for i, entry in enumerate(reversed(self._index)):
+            if entry["kind"] == "full":
+                return i
+        return None
+
+    def add(self, step, spec, values):
+        """Store a checkpoint
+
+        Parameters
+        ----------
+        step: int
+            greater than the step of every stored checkpoint
+        spec: dict
+            JSON serializable description, see checkpoint.write_checkpoint
+        values: {str: np.array}
+            variable values by name, see checkpoint.variable_values
+
+        Returns
+        -------
+        kind: str
+            "full" or "delta"
+        """
+        assert not self._index or step > self._index[-1]["step"]
+        values = {name: np.array(value) for name, value in values.items()}
+        if self._last is None and self._index:
+            self._last = self._rebuild(len(self._index) - 1)[1]
+        since_full = self._since_full()
+        full = (self._last is None or since_full is None or
+                since_full + 1 >= self._full_every or
+                sorted(self._last) != sorted(values) or
+                any(self._last[name].shape != value.shape or self._last[name].dtype != value.dtype
+                    for name, value in values.items()))
+        if full:
+            checkpoint.write_checkpoint(self._path(step, "full"), spec, values)
+        else:
+            self._write_delta(self._path(step, "delta"), spec, values, self._last)
+        self._index.append({"step": step, "kind": "full" if full else "delta"})
+        self._write_index()
+        self._last = values
+        return self._index[-1]["kind"]
+
+    def _write_delta(self, path, spec, values, base):
+        arrays = {}
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as f:
+            with zipfile.ZipFile(f, "w", compression=zipfile.ZIP_STORED) as zf:
+                for i, (name, value) in enumerate(sorted(values.items())):
+                    member = "{}.xor".format(i)
+                    arrays[name] = {"member": member, "shape": list(value.shape),
+                                    "dtype": value.dtype.str}
+                    xor = _shuffle(_xor_bytes(value, base[name]), value.dtype.itemsize)
+                    zf.writestr(member, zlib.compress(xor.tobytes(), self._level))
+                zf.writestr(checkpoint.SPEC_MEMBER, json.dumps(
+                    {"spec": spec, "arrays": arrays}, sort_keys=True))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+
+    def _apply_delta(self, path, base):
+        with zipfile.ZipFile(path) as zf:
+            meta = json.loads(zf.read(checkpoint.SPEC_MEMBER).decode("utf-8"))
+            values = {}
+            for name, array in meta["arrays"].items():
+                dtype = np.dtype(array["dtype"])
+                xor = np.frombuffer(zlib.decompress(zf.read(array["member"])), dtype=np.uint8)
+                data = np.bitwise_xor(_unshuffle(xor, dtype.itemsize),
+                                      np.ascontiguousarray(base[name]).view(np.uint8).reshape(-1))
+                values[name] = data.view(dtype).reshape(array["shape"])
+        return meta["spec"], values
+
+    def _rebuild(self, position):
+        """Spec and values of the checkpoint at position in the index"""
+        start = position
+        while self._index[start]["kind"] != "full":
+            start -= 1
+        if (self._cached is not None and start <= self._cached[0] <= position):
+            # Continue from the cached checkpoint of the same chain
+            start, (spec, values) = self._cached[0], self._cached[1:]
+        else:
+            spec, values = checkpoint.read_checkpoint(
+                self._path(self._index[start]["step"], "full"))
+        for i in range(start + 1, position + 1):
+            spec, values = self._apply_delta(
+                self._path(self._index[i]["step"], "delta"), values)
+        self._cached = (position, spec, values)
+        return spec, values
+
+    def get(self, step):
+        """Rebuild the checkpoint of step
+
+        Returns
+        -------
+        spec: dict
+        values: {str: np.array}
+            read only arrays, they may be views of a memory mapped file
+        """
+        steps = self.steps()
+        if step not in steps:
+            raise KeyError("no checkpoint at step {}, stored steps: {}".format(step, steps))
+        return self._rebuild(steps.index(step))
+
+    def stats(self):
+        """Number of checkpoints and bytes used by the full ones and the deltas"""
+        full_bytes = delta_bytes = 0
+        for entry in self._index:
+            size = os.path.getsize(self._path(entry["step"], entry["kind"]))
+            if entry["kind"] == "full":
+                full_bytes += size
+            else:
+                delta_bytes += size
+        return {
+            "checkpoints": len(self._index),
+            "full MB": full_bytes / 2 ** 20,
+            "delta MB": delta_bytes / 2 ** 20,
+        }
@@ -1,3 +1,4 @@
+import collections
 import gym
 import numpy as np
 import os
@@ -154,6 +155,41 @@ class RunningAvg(object):
         return self._value
 
 
+class LatencyStats(object):
+    def __init__(self, window=1000):
+        """Keep the most recent latencies to report percentiles.
+
+        Parameters
+        ----------
+        window: int
+            number of most recent measurements the percentiles are computed on.
+        """
+        self._samples = collections.deque(maxlen=window)
+        self._count = 0
+
+    def add(self, seconds):
+        """Record one measurement in seconds."""
+        self._samples.append(seconds)
+        self._count += 1
+
+    @property
+    def count(self):
+        """Number of measurements recorded so far, including the ones out of the window"""
+        return self._count
+
+    def percentile(self, q):
+        """q-th percentile of the measurements in the window, nan if there is none"""
+        if len(self._samples) == 0:
+            return float('nan')
+        return float(np.percentile(self._samples, q))
+
+    def mean(self):
+        """Mean of the measurements in the window, nan if there is none"""
+        if len(self._samples) == 0:
+            return float('nan')
+        return float(np.mean(self._samples))
+
+
 class SimpleMonitor(gym.Wrapper):
     def __init__(self, env):
         """Adds two qunatities to info returned by every step:
@@ -0,0 +1,248 @@
+"""Broadcast flat parameter vectors between processes through shared memory
+
+The learner writes the flattened Q-function variables (see tf_util.GetFlat)
+into a named shared memory block, readers in other processes (evaluators,
+servers, actors) map the same block and load the vector with
+tf_util.SetFromFlat. Nothing goes through the disk or a pickle.
+
+Block layout: a 64 byte header of int64 [seq, version, active, size]
+followed by two float32 buffers of `size` elements. There is a single
+writer. It fills the inactive buffer, then flips `active` between two
+increments of `seq` (seqlock), so `seq` is odd while the buffers are being
+switched. A reader retries whenever `seq` was odd or changed while it was
+reading.
+
+A write or a read is one copy of the vector, so it is bound by memory
+bandwidth, not by any synchronization: sub-millisecond for a few hundred
+thousand parameters, but test/test_shared_params.py measures about 10 ms
+to write and 10-15 ms to read 4.7M floats (19 MB) on a single CPU host
+where a plain np.copyto of that size takes 4.5 ms. ParamSubscriber loads
+the shared buffer into the session without the intermediate copy of read.
+
+The block is a file in /dev/shm (see SharedBlock) rather than a
+multiprocessing.shared_memory block, which needs python 3.8.
+"""
+import mmap
+import os
+import tempfile
+
+import numpy as np
+
+import baselines.common.tf_util as U
+
+_HEADER_BYTES = 64
+_SEQ, _VERSION, _ACTIVE, _SIZE = range(4)
+# tmpfs, its files live in memory only
+_SHM_DIR = "/dev/shm"
+
+
+class SharedBlock(object):
+    def __init__(self, name, size=None, create=False):
+        """Named block of memory shared between processes: a file in /dev/shm
+        mapped by every process that opens it, which unlike
+        multiprocessing.shared_memory (python 3.8) works on the python 3.7
+        learn runs on. No resource tracker is involved, only the creator
+        removes the block, with unlink.
+
+        Parameters
+        ----------
+        name: str
+            name of the block, the same in every process
+        size: int
+            size in bytes, only needed if create is True
+        create: bool
+            if True create the block, which must not exist yet, otherwise
+            map an existing one
+        """
+        directory = _SHM_DIR if os.path.isdir(_SHM_DIR) else tempfile.gettempdir()
+        self.name = name
+        self.path = os.path.join(directory, name.lstrip("/"))
+        if create:
+            assert size is not None and size > 0, "a positive size is needed to create the block"
+            fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_RDWR, 0o600)
+            try:
+                os.ftruncate(fd, size)
+            except BaseException:
+                os.close(fd)
+                os.unlink(self.path)
+                raise
+        else:
+            fd = os.open(self.path, os.O_RDWR)
+        try:
+            self.size = os.fstat(fd).st_size
+            self.buf = mmap.mmap(fd, self.size)
+        finally:
+            os.close(fd)
+
+    def close(self):
+        """Unmap the block, the arrays built on buf must be released first"""
+        self.buf.close()
+
+    def unlink(self):
+        """Remove the block, the processes that mapped it keep their mapping"""
+        os.unlink(self.path)
+
+
+class SharedFlatParams(object):
+    def __init__(self, name, size=None, create=False):
+        """Versioned float32 vector in a named shared memory block.
+
+        Parameters
+        ----------
+        name: str
+            name of the shared memory block, see SharedBlock
+        size: int
+            number of elements, only needed if create is True
+        create: bool
+            if True create the block (the writer side), otherwise attach to
+            an existing one (the reader side)
+        """
+        if create:
+            assert size is not None, "size is needed to create the block"
+            self._shm = SharedBlock(name, size=_HEADER_BYTES + 2 * size * 4, create=True)
+            self._header = np.ndarray(
+                (4,), dtype=np.int64, buffer=self._shm.buf)
+            self._header[:] = 0
+            self._header[_SIZE] = size
+        else:
+            self._shm = SharedBlock(name)
+            self._header = np.ndarray(
+                (4,), dtype=np.int64, buffer=self._shm.buf)
+            size = int(self._header[_SIZE])
+        self._owner = create
+        self.name = name
+        self.size = size
+        self._buffers = np.ndarray((2, size), dtype=np.float32,
+                                   buffer=self._shm.buf, offset=_HEADER_BYTES)
+
+    @property
+    def version(self):
+        """Number of vectors written so far, 0 if none"""
+        return int(self._header[_VERSION])
+
+    def write(self, flat):
+        """Publish a new vector, single writer only.
+
+        Returns
+        -------
+        version: int
+            version of the published vector
+        """
+        inactive = 1 - int(self._header[_ACTIVE])
+        np.copyto(self._buffers[inactive], flat, casting='same_kind')
+        self._header[_SEQ] += 1
+        self._header[_ACTIVE] = inactive
+        self._header[_VERSION] += 1
+        self._header[_SEQ] += 1
+        return int(self._header[_VERSION])
+
+    def consume(self, f, min_version=1):
+        """Call f on a consistent view of the latest vector without copying it.
+
+        f may run more than once if the writer publishes while it reads,
+        so it must be idempotent (e.g. SetFromFlat).
+
+        Parameters
+        ----------
+        f: np.array -> object
+            called with a read only view into the shared buffer
+        min_version: int
+            do nothing if the latest version is older than this
+
+        Returns
+        -------
+        version: int or None
+            version that was passed to f, None if f was not called
+        """
+        while True:
+            seq = int(self._header[_SEQ])
+            if seq & 1:
+                continue
+            version = int(self._header[_VERSION])
+            if version < min_version:
+                return None
+            view = self._buffers[int(self._header[_ACTIVE])]
+            view.flags.writeable = False
+            f(view)
+            if int(self._header[_SEQ]) == seq:
+                return version
+
+    def read(self, out=None):
+        """Copy the latest vector
+
+        Returns
+        -------
+        version: int
+            version of the vector, 0 if nothing was written yet
+        flat: np.array or None
+            copy of the vector (into out if given), None if nothing was written yet
+        """
+        if out is None:
+            out = np.empty(self.size, dtype=np.float32)
+        version = self.consume(lambda view: np.copyto(out, view))
+        if version is None:
+            return 0, None
+        return version, out
+
+    def close(self):
+        """Detach, and destroy the block if it was created here"""
+        self._header = None
+        self._buffers = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+
+class ParamPublisher(object):
+    def __init__(self, var_list, name):
+        """Write the values of var_list to the shared memory block `name`.
+
+        Variables are ordered by name so that a ParamSubscriber built from
+        the same model in another graph gets the same layout.
+        """
+        var_list = sorted(var_list, key=lambda v: v.name)
+        self._get_flat = U.GetFlat(var_list)
+        self._shared = SharedFlatParams(
+            name, size=int(np.sum([U.numel(v) for v in var_list])), create=True)
+
+    def publish(self):
+        """Publish the current values, runs in the default session
+
+        Returns
+        -------
+        version: int
+            version of the published parameters
+        """
+        return self._shared.write(self._get_flat())
+
+    def close(self):
+        self._shared.close()
+
+
+class ParamSubscriber(object):
+    def __init__(self, var_list, name):
+        """Load var_list from the shared memory block `name` written by a ParamPublisher."""
+        var_list = sorted(var_list, key=lambda v: v.name)
+        self._set_from_flat = U.SetFromFlat(var_list)
+        self._shared = SharedFlatParams(name)
+        assert self._shared.size == int(np.sum([U.numel(v) for v in var_list])), \
+            "published parameters do not match the variables"
+        self.version = 0
+
+    def refresh(self):
+        """Load the latest parameters into the default session if they are new
+
+        Returns
+        -------
+        updated: bool
+            whether new parameters were loaded
+        """
+        version = self._shared.consume(
+            self._set_from_flat, min_version=self.version + 1)
+        if version is None:
+            return False
+        self.version = version
+        return True
+
+    def close(self):
+        self._shared.close()
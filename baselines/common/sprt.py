@@ -0,0 +1,64 @@
+"""Sequential probability ratio test on a success rate
+
+Wald's SPRT compares H0: p = p0 against H1: p = p1 (p0 < p1) from Bernoulli
+trials observed one at a time. It keeps the log likelihood ratio of the
+trials seen so far and stops as soon as it leaves the interval
+
+    [log(beta / (1 - alpha)), log((1 - beta) / alpha)]
+
+accepting H1 above it and H0 below it, where alpha and beta bound the
+probabilities of accepting H1 when p <= p0 and H0 when p >= p1. On a rate
+far from both p0 and p1 it decides after far fewer trials than a fixed
+size test with the same error rates.
+"""
+import math
+
+
+class SPRT(object):
+    def __init__(self, p0, p1, alpha=0.05, beta=0.05):
+        """
+        Parameters
+        ----------
+        p0: float
+            success rate under H0
+        p1: float
+            success rate under H1, 0 < p0 < p1 < 1
+        alpha: float
+            max probability of accepting H1 when H0 is true
+        beta: float
+            max probability of accepting H0 when H1 is true
+        """
+        assert 0 < p0 < p1 < 1
+        self.p0 = p0
+        self.p1 = p1
+        self.lower = math.log(beta / (1 - alpha))
+        self.upper = math.log((1 - beta) / alpha)
+        self._success_llr = math.log(p1 / p0)
+        self._failure_llr = math.log((1 - p1) / (1 - p0))
+        self.llr = 0.
+        self.num_trials = 0
+        self.decision = None
+
+    @classmethod
+    def around(cls, p, delta, alpha=0.05, beta=0.05, eps=1e-3):
+        """Test p - delta against p + delta, both clipped to [eps, 1 - eps]"""
+        assert delta > eps
+        return cls(max(p - delta, eps), min(p + delta, 1 - eps), alpha=alpha, beta=beta)
+
+    def update(self, success):
+        """Add the outcome of a trial
+
+        Returns
+        -------
+        decision: bool or None
+            True once H1 is accepted, False once H0 is accepted, None while
+            the test is undecided
+        """
+        assert self.decision is None, "the test is already decided"
+        self.num_trials += 1
+        self.llr += self._success_llr if success else self._failure_llr
+        if self.llr >= self.upper:
+            self.decision = True
+        elif self.llr <= self.lower:
+            self.decision = False
+        return self.decision
@@ -5,6 +5,10 @@ import functools
 import copy
 import os
 import collections
+import contextlib
+import threading
+
+from baselines import logger
 
 data_type = tf.float32
 index_type = tf.int32
@@ -215,6 +219,47 @@ def minimize_and_clip(optimizer, objective, var_list, clip_val=10):
     return optimizer.apply_gradients(gradients)
 
 
+# ================================================================
+# XLA
+# ================================================================
+
+
+_jit_available = None
+
+
+def _probe_jit():
+    """True if a tiny jitted op compiles and runs, in a throwaway graph"""
+    try:
+        from tensorflow.contrib.compiler import jit
+        with tf.Graph().as_default() as graph:
+            x = tf.placeholder(tf.float32, [2])
+            with jit.experimental_jit_scope():
+                y = tf.reduce_sum(x * 2.)
+            with tf.Session(graph=graph, config=tf.ConfigProto(
+                    inter_op_parallelism_threads=1, intra_op_parallelism_threads=1)) as sess:
+                sess.run(y, feed_dict={x: [1., 2.]})
+    except Exception as e:
+        logger.warn("XLA JIT is not available in this tensorflow build, running without it ({})".format(e))
+        return False
+    return True
+
+
+def jit_scope(enabled=True):
+    """Returns a context manager under which created ops are marked for XLA JIT
+    compilation. Falls back to a no-op scope if disabled or if a tiny jitted op
+    fails to compile and run with this build of tensorflow (checked once).
+    """
+    global _jit_available
+    if not enabled:
+        return contextlib.ExitStack()
+    if _jit_available is None:
+        _jit_available = _probe_jit()
+    if not _jit_available:
+        return contextlib.ExitStack()
+    from tensorflow.contrib.compiler import jit
+    return jit.experimental_jit_scope()
+
+
 # ================================================================
 # Global session
 # ================================================================
@@ -224,13 +269,40 @@ def get_session():
     return tf.get_default_session()
 
 
-def make_session(num_cpu):
-    """Returns a session that will use <num_cpu> CPU's only"""
+def make_session_config(inter_op_threads, intra_op_threads, inter_op_pools=None):
+    """Returns a session config with the given thread counts
+
+    Parameters
+    ----------
+    inter_op_threads: int
+        number of threads running independent ops concurrently
+    intra_op_threads: int
+        number of threads a single op (e.g. a convolution) is split over
+    inter_op_pools: [int] or None
+        if set, one inter-op thread pool is created per entry and inter_op_threads
+        is ignored. Pool 0 is used by default, see inter_op_pool to select another.
+    """
     tf_config = tf.ConfigProto(
-        inter_op_parallelism_threads=num_cpu,
-        intra_op_parallelism_threads=num_cpu)
+        inter_op_parallelism_threads=inter_op_threads,
+        intra_op_parallelism_threads=intra_op_threads)
+    if inter_op_pools is not None:
+        for num_threads in inter_op_pools:
+            tf_config.session_inter_op_thread_pool.add(num_threads=num_threads)
     tf_config.gpu_options.allow_growth = True
-    return tf.Session(config=tf_config)
+    return tf_config
+
+
+def make_session(num_cpu, intra_op_threads=None, inter_op_pools=None, graph=None):
+    """Returns a session that will use <num_cpu> CPU's only
+
+    intra_op_threads overrides the intra-op parallelism and inter_op_pools
+    creates several inter-op thread pools (see make_session_config).
+    """
+    tf_config = make_session_config(
+        num_cpu,
+        num_cpu if intra_op_threads is None else intra_op_threads,
+        inter_op_pools=inter_op_pools)
+    return tf.Session(config=tf_config, graph=graph)
 
 
 def single_threaded_session():
@@ -238,6 +310,23 @@ def single_threaded_session():
     return make_session(1)
 
 
+_RUN_OPTIONS = threading.local()
+
+
+@contextlib.contextmanager
+def inter_op_pool(index):
+    """Functions created by `function` and called inside this context run their ops
+    on the session inter-op thread pool `index` (see make_session_config).
+    The setting is local to the calling thread.
+    """
+    previous = getattr(_RUN_OPTIONS, 'options', None)
+    _RUN_OPTIONS.options = tf.RunOptions(inter_op_thread_pool=index)
+    try:
+        yield
+    finally:
+        _RUN_OPTIONS.options = previous
+
+
 ALREADY_INITIALIZED = set()
 
 
@@ -273,8 +362,8 @@ def set_value(v, val):
 # ================================================================
 
 
-def load_state(fname):
-    saver = tf.train.Saver()
+def load_state(fname, var_list=None):
+    saver = tf.train.Saver(var_list=var_list)
     saver.restore(get_session(), fname)
 
 
@@ -456,7 +545,8 @@ class _Function(object):
         for inpt in self.givens:
             feed_dict[inpt] = feed_dict.get(inpt, self.givens[inpt])
         results = get_session().run(self.outputs_update,
-                                    feed_dict=feed_dict)[:-1]
+                                    feed_dict=feed_dict,
+                                    options=getattr(_RUN_OPTIONS, 'options', None))[:-1]
         if self.check_nan:
             if any(np.isnan(r).any() for r in results):
                 raise RuntimeError("Nan detected")
@@ -0,0 +1,125 @@
+"""Pick session thread counts by timing the real workload
+
+TF sessions split their threads in two: inter-op threads run independent ops
+concurrently and intra-op threads split a single op (e.g. a convolution).
+The best split depends on the model, the batch size and on how many other
+processes share the host, so instead of hardcoding it we time a few
+candidates on the functions that will actually run and keep the fastest.
+"""
+import json
+import multiprocessing
+import os
+import time
+
+import tensorflow as tf
+
+import baselines.common.tf_util as U
+
+
+def available_cpus():
+    """Number of cores this process may run on, fewer than the cores of the
+    host under taskset or a container cpuset"""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return multiprocessing.cpu_count()
+
+
+def default_candidates(num_cpu=None):
+    """A few (inter_op_threads, intra_op_threads) pairs that fit in num_cpu cores
+
+    Parameters
+    ----------
+    num_cpu: int or None
+        number of cores the session may use, all the cores this process may
+        run on if None (see available_cpus)
+
+    Returns
+    -------
+    candidates: [(int, int)]
+        list of (inter_op_threads, intra_op_threads)
+    """
+    if num_cpu is None:
+        num_cpu = available_cpus()
+    intra_counts = []
+    intra = 1
+    while intra < num_cpu:
+        intra_counts.append(intra)
+        intra *= 2
+    intra_counts.append(num_cpu)
+
+    candidates = []
+    for inter in [1, 2, 4]:
+        if inter > num_cpu:
+            break
+        for intra in intra_counts:
+            if inter * intra <= 2 * num_cpu:
+                candidates.append((inter, intra))
+    return candidates
+
+
+def autotune(benchmarks, candidates=None, num_iters=20, num_warmup=3, graph=None):
+    """Time every benchmark function under every thread configuration
+
+    Each candidate gets a fresh session on `graph` with freshly initialized
+    variables, so this must run before the real session is created and
+    before any variable is restored.
+
+    Parameters
+    ----------
+    benchmarks: {str: () -> object}
+        functions to time, e.g. the act and train functions with a fixed batch.
+        They are called with the candidate session as default session.
+    candidates: [(int, int)] or None
+        (inter_op_threads, intra_op_threads) pairs, default_candidates() if None
+    num_iters: int
+        number of timed calls per benchmark and candidate
+    num_warmup: int
+        number of untimed calls before timing
+    graph: tf.Graph or None
+        graph holding the benchmarked ops, the default graph if None
+
+    Returns
+    -------
+    best: {str: (int, int)}
+        fastest (inter_op_threads, intra_op_threads) for each benchmark
+    timings: {str: {(int, int): float}}
+        mean seconds per call for each benchmark and candidate
+    """
+    if candidates is None:
+        candidates = default_candidates()
+    if graph is None:
+        graph = tf.get_default_graph()
+    with graph.as_default():
+        init_op = tf.variables_initializer(tf.global_variables())
+
+    timings = {name: {} for name in benchmarks}
+    for inter, intra in candidates:
+        config = U.make_session_config(inter, intra)
+        with tf.Session(config=config, graph=graph) as sess, sess.as_default():
+            sess.run(init_op)
+            for name, f in benchmarks.items():
+                for _ in range(num_warmup):
+                    f()
+                start = time.time()
+                for _ in range(num_iters):
+                    f()
+                timings[name][(inter, intra)] = (
+                    time.time() - start) / num_iters
+
+    best = {name: min(timing, key=timing.get)
+            for name, timing in timings.items()}
+    return best, timings
+
+
+def save_choice(path, best, timings):
+    """Record the tuning result as json so runs can be compared afterwards"""
+    with open(path, "w") as f:
+        json.dump({
+            'best': {name: {'inter_op_threads': inter, 'intra_op_threads': intra}
+                     for name, (inter, intra) in best.items()},
+            'timings': {name: [{'inter_op_threads': inter, 'intra_op_threads': intra, 'seconds': seconds}
+                               for (inter, intra), seconds in sorted(timing.items())]
+                        for name, timing in timings.items()},
+            'num_cpu': available_cpus(),
+            'pid': os.getpid(),
+        }, f, indent=2)
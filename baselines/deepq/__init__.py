@@ -1,5 +1,7 @@
 from baselines.deepq import models  # noqa
-from baselines.deepq.build_graph import build_act, build_train  # noqa
+from baselines.deepq.build_graph import build_act, build_q_values, build_train  # noqa
 
 from baselines.deepq.simple import learn, load  # noqa
 from baselines.deepq.replay_buffer import ReplayBuffer, PrioritizedReplayBuffer  # noqa
+from baselines.deepq.replay_buffer import MemmapReplayBuffer, PrioritizedMemmapReplayBuffer  # noqa
+from baselines.deepq.replay_buffer import TieredReplayBuffer, PrioritizedTieredReplayBuffer  # noqa
@@ -48,6 +48,21 @@ The functions in this file can are used to create the following functions:
     every element of the batch.
 
 
+======= q_values ========
+
+    Function to evaluate the Q-values the act function chooses from
+
+    Parameters
+    ----------
+    observation: object
+        Observation that can be feed into the output of make_obs_ph
+
+    Returns
+    -------
+    Tensor of shape (BATCH_SIZE, num_actions) with the Q-value of every action, the
+    invalid actions below every valid one if the act function filters them.
+
+
 ======= train =======
 
     Function that takes a transition (s,a,r,s') and optimizes Bellman equation's error:
@@ -136,7 +151,7 @@ def default_param_noise_filter(var):
 
 
 def build_act(make_obs_ph, q_func, num_actions, scope="deepq", reuse=None,
-              random_filter=False, deterministic_filter=False):
+              random_filter=False, deterministic_filter=False, jit=False):
     """Creates the act function:
 
     Parameters
@@ -159,6 +174,8 @@ def build_act(make_obs_ph, q_func, num_actions, scope="deepq", reuse=None,
         optional scope for variable_scope.
     reuse: bool or None
         whether or not the variables should be reused. To be able to reuse the scope must be given.
+    jit: bool
+        if true the Q-network evaluation is compiled with XLA (see tf_util.jit_scope).
 
     Returns
     -------
@@ -177,14 +194,16 @@ def build_act(make_obs_ph, q_func, num_actions, scope="deepq", reuse=None,
         eps = tf.get_variable(
             "eps", (), dtype=U.data_type, initializer=tf.constant_initializer(0))
 
-        q_values = q_func(observations_ph.get(), num_actions, scope="q_func")
+        with U.jit_scope(jit):
+            q_values = q_func(observations_ph.get(),
+                              num_actions, scope="q_func")
 
-        if deterministic_filter:
-            q_values = build_q_filter(
-                q_values, invalid_masks)
+            if deterministic_filter:
+                q_values = build_q_filter(
+                    q_values, invalid_masks)
 
-        deterministic_actions = tf.argmax(
-            q_values, axis=1, output_type=U.index_type)
+            deterministic_actions = tf.argmax(
+                q_values, axis=1, output_type=U.index_type)
 
         batch_size = tf.shape(observations_ph.get())[0]
         random_actions = tf.random_uniform(
@@ -210,8 +229,48 @@ def build_act(make_obs_ph, q_func, num_actions, scope="deepq", reuse=None,
         return act
 
 
+def build_q_values(make_obs_ph, q_func, num_actions, scope="deepq", reuse=True,
+                   deterministic_filter=False, jit=False):
+    """Creates the q_values function of an act function built by build_act
+
+    Parameters
+    ----------
+    make_obs_ph: str -> tf.placeholder or TfInput
+        a function that take a name and creates a placeholder of input with that name
+    q_func: (tf.Variable, int, str, bool) -> tf.Variable
+        the model, see build_act
+    num_actions: int
+        number of actions.
+    scope: str or VariableScope
+        scope of the act function, whose variables are reused.
+    reuse: bool or None
+        whether or not the variables should be reused.
+    deterministic_filter: bool
+        same as the act function, push the Q-values of the occupied
+        intersections below the other ones
+    jit: bool
+        if true the Q-network evaluation is compiled with XLA (see tf_util.jit_scope).
+
+    Returns
+    -------
+    q_values: (np.array) -> np.array
+        function to evaluate the Q-values of a batch of observations.
+`       See the top of the file for details.
+    """
+    with tf.variable_scope(scope, reuse=reuse):
+        observations_ph = U.ensure_tf_input(make_obs_ph("q_values_observation"))
+        with U.jit_scope(jit):
+            q_values = q_func(observations_ph.get(),
+                              num_actions, scope="q_func")
+            if deterministic_filter:
+                q_values = build_q_filter(
+                    q_values, build_invalid_masks(observations_ph.get()))
+        return U.function(inputs=[observations_ph], outputs=q_values)
+
+
 def build_act_with_param_noise(make_obs_ph, q_func, num_actions, scope="deepq", reuse=None,
-                               param_noise_filter_func=None, random_filter=False, deterministic_filter=False):
+                               param_noise_filter_func=None, random_filter=False, deterministic_filter=False,
+                               jit=False):
     """Creates the act function with support for parameter space noise exploration (https://arxiv.org/abs/1706.01905):
 
     Parameters
@@ -237,6 +296,8 @@ def build_act_with_param_noise(make_obs_ph, q_func, num_actions, scope="deepq",
     param_noise_filter_func: tf.Variable -> bool
         function that decides whether or not a variable should be perturbed. Only applicable
         if param_noise is True. If set to None, default_param_noise_filter is used by default.
+    jit: bool
+        if true the Q-network evaluations are compiled with XLA (see tf_util.jit_scope).
 
     Returns
     -------
@@ -267,16 +328,18 @@ def build_act_with_param_noise(make_obs_ph, q_func, num_actions, scope="deepq",
         param_noise_threshold = tf.get_variable(
             "param_noise_threshold", (), initializer=tf.constant_initializer(0.05), trainable=False)
 
-        # Unmodified Q.
-        q_values = q_func(observations_ph.get(), num_actions, scope="q_func")
+        with U.jit_scope(jit):
+            # Unmodified Q.
+            q_values = q_func(observations_ph.get(),
+                              num_actions, scope="q_func")
 
-        # Perturbable Q used for the actual rollout.
-        q_values_perturbed = q_func(
-            observations_ph.get(), num_actions, scope="perturbed_q_func")
+            # Perturbable Q used for the actual rollout.
+            q_values_perturbed = q_func(
+                observations_ph.get(), num_actions, scope="perturbed_q_func")
 
-        if deterministic_filter:
-            q_values_perturbed = build_q_filter(
-                q_values_perturbed, invalid_masks)
+            if deterministic_filter:
+                q_values_perturbed = build_q_filter(
+                    q_values_perturbed, invalid_masks)
         # We have to wrap this code into a function due to the way tf.cond() works. See
         # https://stackoverflow.com/questions/37063952/confused-by-the-behavior-of-tf-cond for
         # a more detailed discussion.
@@ -302,8 +365,9 @@ def build_act_with_param_noise(make_obs_ph, q_func, num_actions, scope="deepq",
         # Set up functionality to re-compute `param_noise_scale`. This perturbs yet another copy
         # of the network and measures the effect of that perturbation in action space. If the perturbation
         # is too big, reduce scale of perturbation, otherwise increase.
-        q_values_adaptive = q_func(
-            observations_ph.get(), num_actions, scope="adaptive_q_func")
+        with U.jit_scope(jit):
+            q_values_adaptive = q_func(
+                observations_ph.get(), num_actions, scope="adaptive_q_func")
 
         perturb_for_adaption = perturb_vars(
             original_scope="q_func", perturbed_scope="adaptive_q_func")
@@ -362,7 +426,8 @@ def build_act_with_param_noise(make_obs_ph, q_func, num_actions, scope="deepq",
 
 
 def build_train(make_obs_ph, q_func, num_actions, optimizer, grad_norm_clipping=None, gamma=1.0, deterministic_filter=False, random_filter=False,
-                double_q=True, scope="deepq", reuse=None, param_noise=False, param_noise_filter_func=None):
+                double_q=True, scope="deepq", reuse=None, param_noise=False, param_noise_filter_func=None, jit=False,
+                data_parallel=False):
     """Creates the train function:
 
     Parameters
@@ -401,6 +466,13 @@ def build_train(make_obs_ph, q_func, num_actions, optimizer, grad_norm_clipping=
     param_noise_filter_func: tf.Variable -> bool
         function that decides whether or not a variable should be perturbed. Only applicable
         if param_noise is True. If set to None, default_param_noise_filter is used by default.
+    jit: bool
+        if true the Q-network evaluations, the loss and the gradient update of both
+        the act and the train functions are compiled with XLA (see tf_util.jit_scope).
+    data_parallel: bool
+        if true also build the compute_gradients and apply_gradients functions
+        (returned in the debug dict) which split train in two, so that gradients
+        can be averaged across replicas in between (see deepq/data_parallel.py).
 
     Returns
     -------
@@ -415,13 +487,21 @@ def build_train(make_obs_ph, q_func, num_actions, optimizer, grad_norm_clipping=
 `       See the top of the file for details.
     debug: {str: function}
         a bunch of functions to print debug data like q_values.
+        With data_parallel it also holds
+            compute_gradients: same inputs as train, returns td_error, weighted_error,
+                total_error and the flat vector of clipped gradients without applying it,
+                in the layout of U.GetFlat over the q_func variables.
+            apply_gradients: (np.array) -> ()
+                applies a flat gradient vector with the optimizer.
     """
     if param_noise:
         act_f = build_act_with_param_noise(make_obs_ph, q_func, num_actions, scope=scope, reuse=reuse,
-                                           param_noise_filter_func=param_noise_filter_func, deterministic_filter=deterministic_filter, random_filter=random_filter)
+                                           param_noise_filter_func=param_noise_filter_func, deterministic_filter=deterministic_filter, random_filter=random_filter,
+                                           jit=jit)
     else:
         act_f = build_act(make_obs_ph, q_func, num_actions,
-                          scope=scope, reuse=reuse, deterministic_filter=deterministic_filter, random_filter=random_filter)
+                          scope=scope, reuse=reuse, deterministic_filter=deterministic_filter, random_filter=random_filter,
+                          jit=jit)
 
     with tf.variable_scope(scope, reuse=reuse):
         # set up placeholders
@@ -442,60 +522,61 @@ def build_train(make_obs_ph, q_func, num_actions, optimizer, grad_norm_clipping=
         if deterministic_filter:
             invalid_masks_tp1 = build_invalid_masks(obs_tp1)
 
-        # q network evaluation
-        q_t = q_func(obs_t, num_actions, scope="q_func",
-                     reuse=True)  # reuse parameters from act
-        q_func_vars = U.scope_vars(U.absolute_scope_name("q_func"))
-
-        # target q network evalution
-        q_tp1 = q_func(obs_tp1, num_actions, scope="target_q_func")
-        target_q_func_vars = U.scope_vars(
-            U.absolute_scope_name("target_q_func"))
-
-        # q scores for actions which we know were selected in the given state.
-        q_t_selected = tf.reduce_sum(
-            q_t * tf.one_hot(act_t, num_actions, dtype=U.data_type), axis=1)
-
-        # compute estimate of best possible value starting from state at t + 1
-        if double_q:
-            q_tp1_using_online_net = q_func(
-                obs_tp1, num_actions, scope="q_func", reuse=True)
-
-            if deterministic_filter:
-                q_tp1_using_online_net = build_q_filter(
-                    q_tp1_using_online_net, invalid_masks_tp1)
-
-            q_tp1_best_using_online_net = tf.argmax(
-                q_tp1_using_online_net, 1, output_type=U.index_type)
-            q_tp1_best = tf.reduce_sum(
-                q_tp1 * tf.one_hot(q_tp1_best_using_online_net, num_actions, dtype=U.data_type), 1)
-        else:
-            if deterministic_filter:
-                q_tp1 = build_q_filter(q_tp1, invalid_masks_tp1)
-
-            q_tp1_best = tf.reduce_max(q_tp1, axis=1)
-        q_tp1_best_masked = (1.0 - done_mask_ph) * q_tp1_best
-
-        # compute RHS of bellman equation
-        q_t_selected_target = rew_t_ph + gamma * q_tp1_best_masked
-
-        # compute the error (potentially clipped)
-        td_error = q_t_selected - tf.stop_gradient(q_t_selected_target)
-        weighted_error = tf.reduce_mean(
-            importance_weights_ph * U.huber_loss(td_error))
-        regularizer = tf.add_n([tf.nn.l2_loss(var)
-                                for var in q_func_vars]) * 0.0001
-        total_error = weighted_error + regularizer
-
-        # compute optimization op (potentially with gradient clipping)
-        if grad_norm_clipping is not None:
-            optimize_expr = U.minimize_and_clip(optimizer,
-                                                total_error,
-                                                var_list=q_func_vars,
-                                                clip_val=grad_norm_clipping)
-        else:
-            optimize_expr = optimizer.minimize(
-                total_error, var_list=q_func_vars)
+        # q network evaluation, loss and update, optionally compiled with XLA
+        with U.jit_scope(jit):
+            q_t = q_func(obs_t, num_actions, scope="q_func",
+                         reuse=True)  # reuse parameters from act
+            q_func_vars = U.scope_vars(U.absolute_scope_name("q_func"))
+
+            # target q network evalution
+            q_tp1 = q_func(obs_tp1, num_actions, scope="target_q_func")
+            target_q_func_vars = U.scope_vars(
+                U.absolute_scope_name("target_q_func"))
+
+            # q scores for actions which we know were selected in the given state.
+            q_t_selected = tf.reduce_sum(
+                q_t * tf.one_hot(act_t, num_actions, dtype=U.data_type), axis=1)
+
+            # compute estimate of best possible value starting from state at t + 1
+            if double_q:
+                q_tp1_using_online_net = q_func(
+                    obs_tp1, num_actions, scope="q_func", reuse=True)
+
+                if deterministic_filter:
+                    q_tp1_using_online_net = build_q_filter(
+                        q_tp1_using_online_net, invalid_masks_tp1)
+
+                q_tp1_best_using_online_net = tf.argmax(
+                    q_tp1_using_online_net, 1, output_type=U.index_type)
+                q_tp1_best = tf.reduce_sum(
+                    q_tp1 * tf.one_hot(q_tp1_best_using_online_net, num_actions, dtype=U.data_type), 1)
+            else:
+                if deterministic_filter:
+                    q_tp1 = build_q_filter(q_tp1, invalid_masks_tp1)
+
+                q_tp1_best = tf.reduce_max(q_tp1, axis=1)
+            q_tp1_best_masked = (1.0 - done_mask_ph) * q_tp1_best
+
+            # compute RHS of bellman equation
+            q_t_selected_target = rew_t_ph + gamma * q_tp1_best_masked
+
+            # compute the error (potentially clipped)
+            td_error = q_t_selected - tf.stop_gradient(q_t_selected_target)
+            weighted_error = tf.reduce_mean(
+                importance_weights_ph * U.huber_loss(td_error))
+            regularizer = tf.add_n([tf.nn.l2_loss(var)
+                                    for var in q_func_vars]) * 0.0001
+            total_error = weighted_error + regularizer
+
+            # compute optimization op (potentially with gradient clipping)
+            if grad_norm_clipping is not None:
+                optimize_expr = U.minimize_and_clip(optimizer,
+                                                    total_error,
+                                                    var_list=q_func_vars,
+                                                    clip_val=grad_norm_clipping)
+            else:
+                optimize_expr = optimizer.minimize(
+                    total_error, var_list=q_func_vars)
 
         # update_target_fn will be called periodically to copy Q network to target Q network
         update_target_expr = []
@@ -520,5 +601,39 @@ def build_train(make_obs_ph, q_func, num_actions, optimizer, grad_norm_clipping=
         update_target = U.function([], [], updates=[update_target_expr])
 
         q_values = U.function([obs_t_input], q_t)
+        debug = {'q_values': q_values}
 
-        return act_f, train, update_target, {'q_values': q_values}
+        if data_parallel:
+            # The flat vector follows the order of q_func_vars, with zeros for the
+            # variables without gradient (e.g. batch norm statistics), so it has
+            # the layout of U.GetFlat(q_func_vars)
+            grads_and_vars = optimizer.compute_gradients(
+                total_error, var_list=q_func_vars)
+            if grad_norm_clipping is not None:
+                grads_and_vars = [(None if grad is None else tf.clip_by_norm(grad, grad_norm_clipping), var)
+                                  for grad, var in grads_and_vars]
+            flat_grads = tf.concat([tf.reshape(tf.zeros_like(var) if grad is None else grad, [-1])
+                                    for grad, var in grads_and_vars], axis=0)
+            sizes = [U.numel(var) for _, var in grads_and_vars]
+            flat_grads_ph = tf.placeholder(
+                U.data_type, [sum(sizes)], name="flat_grads")
+            apply_expr = optimizer.apply_gradients([
+                (tf.reshape(flat_grad, var.get_shape()), var)
+                for flat_grad, (grad, var) in zip(tf.split(flat_grads_ph, sizes), grads_and_vars)
+                if grad is not None])
+
+            debug['compute_gradients'] = U.function(
+                inputs=[
+                    obs_t_input,
+                    act_t_ph,
+                    rew_t_ph,
+                    obs_tp1_input,
+                    done_mask_ph,
+                    importance_weights_ph
+                ],
+                outputs=[td_error, weighted_error, total_error, flat_grads]
+            )
+            debug['apply_gradients'] = U.function(
+                [flat_grads_ph], [], updates=[apply_expr])
+
+        return act_f, train, update_target, debug
@@ -0,0 +1,123 @@
+"""Synchronous data parallel training over local processes
+
+Each replica is a full `learn` process with its own env, actor and replay
+buffer (its shard of the experience). At every update the replicas compute
+gradients on their own batch, average them through shared memory (see
+baselines/common/allreduce.py) and all apply the same averaged update, so
+their weights stay identical. Replica 0 validates, keeps the best model and
+saves the result.
+
+Processes are spawned, so the env, validation env and model factories must
+be picklable, e.g. functools.partial of module level functions:
+
+    learn(num_workers=4,
+          make_env=functools.partial(adversarial_gym.make, 'Gomoku9x9-training-camp-v0'),
+          make_q_func=functools.partial(deepq.models.cnn_to_mlp,
+                                        convs=[(256, 3, 1)] * 8, hiddens=[256]),
+          save_path='kaithy_9_model.pkl',
+          max_timesteps=100000)
+"""
+import multiprocessing
+import os
+import queue
+import time
+
+from baselines.common.allreduce import SharedMemoryAllReduce
+from baselines.common.misc_util import set_global_seeds
+
+
+class Replica(object):
+    def __init__(self, rank, world_size, barrier, name):
+        """Identity of one replica, passed to deepq.learn(data_parallel=...)
+
+        Parameters
+        ----------
+        rank: int
+            index of the replica in [0, world_size)
+        world_size: int
+            number of replicas
+        barrier: multiprocessing.Barrier
+            barrier shared by all the replicas
+        name: str
+            name of the shared memory block used to average gradients
+        """
+        self.rank = rank
+        self.world_size = world_size
+        self.barrier = barrier
+        self.name = name
+
+    def make_allreduce(self, size):
+        return SharedMemoryAllReduce(self.name, size, self.rank, self.world_size, self.barrier)
+
+
+def _worker(replica, make_env, make_val_env, make_q_func, seed, save_path, learn_kwargs, result_queue):
+    # Imported here so that the parent process does not need to load tensorflow
+    from baselines.deepq.simple import learn as learn_replica
+
+    set_global_seeds(seed + replica.rank)
+    env = make_env()
+    val_env = make_val_env() if (
+        make_val_env is not None and replica.rank == 0) else None
+    start_time = time.time()
+    act = learn_replica(env, val_env, make_q_func(),
+                        data_parallel=replica, **learn_kwargs)
+    if replica.rank == 0 and save_path is not None:
+        act.save(save_path)
+    result_queue.put((replica.rank, time.time() - start_time))
+
+
+def learn(num_workers, make_env, make_q_func, make_val_env=None, save_path=None, seed=0, **learn_kwargs):
+    """Train a deepq model with num_workers synchronous data parallel replicas.
+
+    Parameters
+    ----------
+    num_workers: int
+        number of learner processes
+    make_env: () -> gym.Env
+        picklable factory of the training env, called once per replica
+    make_q_func: () -> q_func
+        picklable factory of the model, see deepq.models
+    make_val_env: () -> gym.Env or None
+        picklable factory of the validation env, only replica 0 validates
+    save_path: str or None
+        where replica 0 saves the trained act function
+    seed: int
+        replica i is seeded with seed + i
+    learn_kwargs:
+        other arguments of deepq.learn, the same for every replica.
+        num_cpu should be set to share the host between the replicas.
+
+    Returns
+    -------
+    wall_times: [float]
+        training time in seconds of each replica
+    """
+    ctx = multiprocessing.get_context('spawn')
+    barrier = ctx.Barrier(num_workers)
+    result_queue = ctx.Queue()
+    name = 'deepq_allreduce_{}'.format(os.getpid())
+    processes = []
+    for rank in range(num_workers):
+        replica = Replica(rank, num_workers, barrier, name)
+        process = ctx.Process(target=_worker, args=(
+            replica, make_env, make_val_env, make_q_func, seed, save_path, learn_kwargs, result_queue))
+        process.start()
+        processes.append(process)
+
+    wall_times = [None] * num_workers
+    num_done = 0
+    while num_done < num_workers:
+        try:
+            rank, wall_time = result_queue.get(timeout=1.)
+        except queue.Empty:
+            # A crashed replica would leave the others waiting at the barrier
+            if any(process.exitcode not in (None, 0) for process in processes):
+                for process in processes:
+                    process.terminate()
+                raise RuntimeError("A data parallel replica crashed")
+            continue
+        wall_times[rank] = wall_time
+        num_done += 1
+    for process in processes:
+        process.join()
+    return wall_times
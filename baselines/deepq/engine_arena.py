@@ -0,0 +1,322 @@
+"""Matches between external engines, played with asyncio
+
+An engine is a persistent subprocess speaking the line protocol of main.py:
+for every move the arena writes one line, the board as a JSON string of
+board_size * board_size digits in row-major order (0 empty, 1 black,
+2 white, the side to move is black when both have as many stones), and the
+engine answers with one line holding the index of its move. The engine has
+to flush its answer, and keep reading lines until stdin is closed.
+
+A move request carries the whole board, so any process of an engine can
+answer it. EnginePool keeps a few processes of the same command and lends
+one to every move, and many games run concurrently on GomokuTurnEnv boards
+while the engines think.
+
+An engine that does not answer within the time limit, crashes, or answers
+something that is not a legal move loses the game. A process that timed out
+or crashed is killed and started again, so that a late answer is never read
+as the answer to the next board.
+"""
+import asyncio
+import json
+import time
+
+import numpy as np
+
+from adversarial_gym.gym_gomoku.envs import GomokuTurnEnv
+from baselines.common.misc_util import LatencyStats
+
+
+class EngineError(Exception):
+    pass
+
+
+class Engine(object):
+    def __init__(self, command, cwd=None, start_time=30.):
+        """One engine subprocess
+
+        Parameters
+        ----------
+        command: [str]
+            command line of the engine
+        cwd: str or None
+            working directory of the engine
+        start_time: float
+            seconds a new process has for its first answer, which includes
+            loading the engine (a model, say)
+        """
+        self.command = command
+        self.cwd = cwd
+        self.start_time = start_time
+        self.num_starts = 0
+        self._process = None
+        self._started = False
+
+    async def start(self):
+        self._process = await asyncio.create_subprocess_exec(
+            *self.command, cwd=self.cwd,
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE)
+        self.num_starts += 1
+        self._started = False
+
+    async def move(self, board, timeout):
+        """Index of the engine's move on board
+
+        Parameters
+        ----------
+        board: np.array
+            board_state, color_dict values
+        timeout: float
+            seconds the engine has to answer, start_time if it is the first
+            answer of the process
+
+        Raises
+        ------
+        EngineError
+            if the engine times out, exits or answers something else than
+            an integer. The process is killed and started again.
+        """
+        if self._process is None or self._process.returncode is not None:
+            await self.start()
+        line = json.dumps("".join(str(v) for v in np.reshape(board, -1))) + "\n"
+        try:
+            self._process.stdin.write(line.encode("ascii"))
+            await self._process.stdin.drain()
+            answer = await asyncio.wait_for(
+                self._process.stdout.readline(), timeout if self._started else max(timeout, self.start_time))
+        except asyncio.TimeoutError:
+            await self._restart("timeout")
+        except (BrokenPipeError, ConnectionResetError):
+            await self._restart("crash")
+        if not answer:
+            await self._restart("crash")
+        try:
+            action = int(answer.decode("ascii"))
+        except (UnicodeDecodeError, ValueError):
+            await self._restart("invalid answer {!r}".format(answer))
+        self._started = True
+        return action
+
+    async def _restart(self, reason):
+        """Start a new process and raise EngineError(reason)"""
+        await self.kill()
+        await self.start()
+        raise EngineError(reason)
+
+    async def kill(self):
+        if self._process is not None and self._process.returncode is None:
+            self._process.kill()
+            await self._process.wait()
+        self._process = None
+
+    async def close(self):
+        """Close stdin and wait for the engine to exit, kill it after a second"""
+        if self._process is None or self._process.returncode is not None:
+            return
+        self._process.stdin.close()
+        try:
+            await asyncio.wait_for(self._process.wait(), 1.)
+        except asyncio.TimeoutError:
+            await self.kill()
+
+
+class EnginePool(object):
+    def __init__(self, name, command, num_processes=1, cwd=None, start_time=30.):
+        """Processes of the same engine, one lent to every move
+
+        Parameters
+        ----------
+        name: str
+        command: [str]
+            command line of the engine
+        num_processes: int
+            number of processes, the number of moves thought about at once
+        cwd: str or None
+            working directory of the engine
+        start_time: float
+            see Engine
+        """
+        self.name = name
+        self._engines = [Engine(command, cwd=cwd, start_time=start_time) for _ in range(num_processes)]
+        self._idle = None
+        self.latency = LatencyStats()
+        self.errors = {}
+
+    async def start(self):
+        """Start every process at once, before the first move"""
+        self._idle = asyncio.Queue()
+        for engine in self._engines:
+            await engine.start()
+            self._idle.put_nowait(engine)
+
+    async def move(self, board, timeout):
+        """See Engine.move, waits for an idle process first"""
+        engine = await self._idle.get()
+        try:
+            start = time.time()
+            action = await engine.move(board, timeout)
+            self.latency.add(time.time() - start)
+            return action
+        except EngineError as e:
+            reason = str(e).split(" ")[0]
+            self.errors[reason] = self.errors.get(reason, 0) + 1
+            raise
+        finally:
+            self._idle.put_nowait(engine)
+
+    @property
+    def num_restarts(self):
+        return sum(max(engine.num_starts - 1, 0) for engine in self._engines)
+
+    async def close(self):
+        await asyncio.gather(*[engine.close() for engine in self._engines])
+
+
+def _random_move(board, rng):
+    empty = np.flatnonzero(np.reshape(board, -1) == 0)
+    return int(empty[rng.randint(len(empty))])
+
+
+async def play_game(black, white, board_size, move_time, opening_moves=0, seed=0):
+    """Play one game between two engine pools
+
+    Parameters
+    ----------
+    black, white: EnginePool
+    board_size: int
+    move_time: float
+        seconds every engine has for every move
+    opening_moves: int
+        number of random plies at the start of the game
+    seed: int
+        seed of the random opening
+
+    Returns
+    -------
+    winner: str
+        'black', 'white' or 'empty' for a draw
+    reason: str
+        'five', 'draw', 'illegal', 'timeout', 'crash' or 'invalid'
+    num_moves: int
+    """
+    env = GomokuTurnEnv(board_size)
+    env.reset()
+    rng = np.random.RandomState(seed % 2 ** 32)
+    while True:
+        color = env.state.color
+        other = 'white' if color == 'black' else 'black'
+        board = env.state.board.board_state
+        if env.state.board.move < opening_moves:
+            action = _random_move(board, rng)
+        else:
+            try:
+                action = await (black if color == 'black' else white).move(board, move_time)
+            except EngineError as e:
+                return other, str(e).split(" ")[0], env.state.board.move
+            if not 0 <= action < board_size * board_size:
+                return other, 'illegal', env.state.board.move
+        _, reward, done, _ = env.step(action)
+        if done:
+            if reward == 1.:
+                return color, 'five', env.state.board.move
+            if reward == -1.:
+                return other, 'illegal', env.state.board.move
+            return 'empty', 'draw', env.state.board.move
+
+
+async def run_match(a, b, board_size, num_games, move_time=1., concurrency=32,
+                    opening_moves=2, seed=0, callback=None):
+    """Play num_games between the engine pools a and b, num_games / 2 with
+    each colour. The two games of a pair share their random opening.
+
+    Parameters
+    ----------
+    a, b: EnginePool
+        started pools
+    board_size: int
+    num_games: int
+    move_time: float
+        seconds every engine has for every move
+    concurrency: int
+        number of games played at once
+    opening_moves: int
+        number of random plies at the start of every game
+    seed: int
+    callback: (dict) -> None or None
+        called with every finished game, as
+        {"game": i, "black": name, "white": name, "winner": name or None,
+        "reason": str, "moves": int}
+
+    Returns
+    -------
+    result: dict
+        a_win, b_win and draw, and the reasons games ended with
+    """
+    limit = asyncio.Semaphore(concurrency)
+    result = {"a_win": 0, "b_win": 0, "draw": 0, "reasons": {}}
+
+    async def game(i):
+        black, white = (a, b) if i % 2 == 0 else (b, a)
+        async with limit:
+            winner, reason, moves = await play_game(
+                black, white, board_size, move_time, opening_moves, seed + i // 2)
+        winner = {'black': black, 'white': white}.get(winner)
+        if winner is a:
+            result["a_win"] += 1
+        elif winner is b:
+            result["b_win"] += 1
+        else:
+            result["draw"] += 1
+        result["reasons"][reason] = result["reasons"].get(reason, 0) + 1
+        if callback is not None:
+            callback({"game": i, "black": black.name, "white": white.name,
+                      "winner": None if winner is None else winner.name,
+                      "reason": reason, "moves": moves})
+
+    await asyncio.gather(*[game(i) for i in range(num_games)])
+    return result
+
+
+def play_engines(a, b, board_size, num_games, num_processes=4, cwd=None, start_time=30., **kwargs):
+    """Start two engines, play a match with run_match and stop them
+
+    Parameters
+    ----------
+    a, b: (str, [str])
+        name and command line of each engine
+    num_processes: int
+        number of processes of each engine
+    cwd: str or None
+        working directory of the engines
+    start_time: float
+        see Engine
+    kwargs:
+        arguments of run_match
+
+    Returns
+    -------
+    result: dict
+        see run_match, with the latency percentiles, errors and restarts of
+        each engine
+    """
+    async def main():
+        pools = [EnginePool(name, command, num_processes, cwd=cwd, start_time=start_time)
+                 for name, command in [a, b]]
+        try:
+            for pool in pools:
+                await pool.start()
+            start = time.time()
+            result = await run_match(pools[0], pools[1], board_size, num_games, **kwargs)
+            result["time (s)"] = time.time() - start
+        finally:
+            await asyncio.gather(*[pool.close() for pool in pools])
+        for key, pool in zip(["a", "b"], pools):
+            result[key] = {"name": pool.name,
+                           "moves": pool.latency.count,
+                           "move p50 (ms)": pool.latency.percentile(50) * 1000,
+                           "move p99 (ms)": pool.latency.percentile(99) * 1000,
+                           "errors": pool.errors,
+                           "restarts": pool.num_restarts}
+        return result
+
+    return asyncio.run(main())
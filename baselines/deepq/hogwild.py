@@ -0,0 +1,135 @@
+import threading
+
+
+class HogwildLearner(object):
+    def __init__(self, sess, train_step, num_threads, periodic=(), ready=None):
+        """Run gradient steps on num_threads threads against the same variables.
+
+        The threads share the session and the variables, and apply their
+        updates without any locking between them (Hogwild!, Niu et al., 2011).
+        TensorFlow releases the GIL while running the train op, so the updates
+        of several threads overlap on a many-core host.
+
+        Parameters
+        ----------
+        sess: tf.Session
+            session holding the variables, made the default session of every thread
+        train_step: (int) -> (float, float)
+            called with the env step last set by set_env_step, samples a batch
+            (e.g. with the importance sampling exponent of that step), runs the
+            train function and updates the priorities, returns base error and
+            total error. Called from several threads at once, so the replay
+            buffer must be thread safe.
+        num_threads: int
+            number of learner threads
+        periodic: [(int, () -> None)]
+            (freq, f) pairs, f is called once every freq updates counted over
+            all the threads, e.g. to update the target network
+        ready: (float) -> bool or None
+            if set, called with a timeout in seconds before every step, the
+            step only runs if it returns True (e.g.
+            ReplayRatioController.wait_for_experience)
+        """
+        self._sess = sess
+        self._train_step = train_step
+        self._num_threads = num_threads
+        self._periodic = list(periodic)
+        self._ready = ready
+
+        self._count_lock = threading.Lock()
+        self._num_updates = 0
+        self._env_step = 0
+        self.last_errors = None
+
+        # Threads wait on the gate while paused, pause() waits until no
+        # step is running
+        self._gate = threading.Condition()
+        self._paused = False
+        self._stopped = False
+        self._num_running = 0
+        self._error = None
+        self._threads = []
+
+    @property
+    def num_updates(self):
+        """Number of updates applied by all the threads so far"""
+        return self._num_updates
+
+    def set_env_step(self, t):
+        """Env step the next train steps are called with, set by the acting loop"""
+        with self._count_lock:
+            self._env_step = t
+
+    @property
+    def started(self):
+        return len(self._threads) > 0
+
+    def start(self):
+        for i in range(self._num_threads):
+            thread = threading.Thread(target=self._run, name="hogwild-{}".format(i))
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def _run(self):
+        with self._sess.as_default():
+            while True:
+                # Wait outside of the gate so that pause() does not wait for it
+                if self._ready is not None and not self._ready(0.1):
+                    if self._stopped:
+                        return
+                    continue
+                with self._gate:
+                    while self._paused and not self._stopped:
+                        self._gate.wait()
+                    if self._stopped:
+                        return
+                    self._num_running += 1
+                try:
+                    with self._count_lock:
+                        env_step = self._env_step
+                    self.last_errors = self._train_step(env_step)
+                    with self._count_lock:
+                        self._num_updates += 1
+                        num_updates = self._num_updates
+                    for freq, f in self._periodic:
+                        if num_updates % freq == 0:
+                            f()
+                except Exception as e:
+                    with self._gate:
+                        self._error = e
+                        self._stopped = True
+                    raise
+                finally:
+                    with self._gate:
+                        self._num_running -= 1
+                        self._gate.notify_all()
+
+    def check(self):
+        """Re-raise in the calling thread the error that stopped a learner thread"""
+        if self._error is not None:
+            raise RuntimeError("Hogwild learner thread failed") from self._error
+
+    def pause(self):
+        """Block new steps and wait for the running ones to finish, e.g. to
+        validate or save settled weights"""
+        with self._gate:
+            self._paused = True
+            while self._num_running > 0:
+                self._gate.wait()
+        self.check()
+
+    def resume(self):
+        with self._gate:
+            self._paused = False
+            self._gate.notify_all()
+
+    def stop(self):
+        """Finish the running steps and join the threads"""
+        with self._gate:
+            self._stopped = True
+            self._gate.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self.check()
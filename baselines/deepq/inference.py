@@ -0,0 +1,121 @@
+import threading
+import time
+
+import numpy as np
+import tensorflow as tf
+
+import baselines.common.tf_util as U
+from baselines.common.misc_util import LatencyStats
+from baselines.deepq.build_graph import build_act, build_act_with_param_noise
+
+
+class InferenceCopy(object):
+    def __init__(self, act_params, num_cpu=1, param_noise=False, scope="deepq"):
+        """Inference only copy of the Q-network living in its own graph and session.
+
+        Acting through the copy never waits for a gradient step running in the
+        training session, and the other way around. The training side calls
+        `publish` to snapshot its weights, the acting side picks the latest
+        snapshot up before its next call.
+
+        Must be created while the training graph is the default graph.
+
+        Parameters
+        ----------
+        act_params: dict
+            arguments of build_act, the same as the ones saved by ActWrapper
+        num_cpu: int
+            number of cpus the inference session may use
+        param_noise: bool
+            build the act function with parameter space noise
+        scope: str
+            scope of the act and train functions in the training graph
+        """
+        # Flattened weights of the online Q-network in the training graph
+        source_vars = sorted(U.scope_vars(scope + "/q_func"),
+                             key=lambda v: v.name)
+        self._source_names = [v.name for v in source_vars]
+        self._get_flat = U.GetFlat(source_vars)
+
+        self._graph = tf.Graph()
+        with self._graph.as_default():
+            if param_noise:
+                self._act = build_act_with_param_noise(scope=scope, **act_params)
+            else:
+                self._act = build_act(scope=scope, **act_params)
+            target_vars = sorted(U.scope_vars(scope + "/q_func"),
+                                 key=lambda v: v.name)
+            assert [v.name for v in source_vars] == [v.name for v in target_vars]
+            self._set_from_flat = U.SetFromFlat(target_vars)
+            init_op = tf.global_variables_initializer()
+        self._sess = U.make_session(num_cpu=num_cpu, graph=self._graph)
+        self._sess.run(init_op)
+
+        self._lock = threading.Lock()
+        self._pending = None
+        self._synced_step = None
+        self._synced_time = None
+        self._latency = LatencyStats()
+
+    def publish(self, step, values=None):
+        """Snapshot the training weights for the acting side.
+
+        Runs in the training session, so it has to be the default session of
+        the calling thread, unless values is given. Only the most recent
+        snapshot is kept.
+
+        Parameters
+        ----------
+        step: int
+            number of updates the weights went through, used for the sync lag
+        values: {str: np.array} or None
+            weights to publish by variable name (see
+            checkpoint.variable_values) instead of the current training weights
+        """
+        if values is None:
+            flat = self._get_flat()
+        else:
+            flat = np.concatenate([np.reshape(values[name], -1) for name in self._source_names])
+        with self._lock:
+            self._pending = (flat, step, time.time())
+
+    def _apply_pending(self):
+        with self._lock:
+            pending, self._pending = self._pending, None
+        if pending is not None:
+            flat, step, published_time = pending
+            with self._sess.as_default():
+                self._set_from_flat(flat)
+            self._synced_step = step
+            self._synced_time = published_time
+
+    def __call__(self, *args, **kwargs):
+        """Same as the act function, run on the latest published weights"""
+        self._apply_pending()
+        start = time.time()
+        with self._sess.as_default():
+            actions = self._act(*args, **kwargs)
+        self._latency.add(time.time() - start)
+        return actions
+
+    def metrics(self, step):
+        """Sync lag and act latency
+
+        Parameters
+        ----------
+        step: int
+            current number of updates of the training weights
+
+        Returns
+        -------
+        metrics: {str: float}
+        """
+        return {
+            "inference sync lag (updates)": float('nan') if self._synced_step is None else step - self._synced_step,
+            "inference sync lag (s)": float('nan') if self._synced_time is None else time.time() - self._synced_time,
+            "inference act p50 (ms)": self._latency.percentile(50) * 1000,
+            "inference act p99 (ms)": self._latency.percentile(99) * 1000,
+        }
+
+    def close(self):
+        self._sess.close()
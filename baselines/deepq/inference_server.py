@@ -0,0 +1,218 @@
+"""Socket server answering the moves of many concurrent games in batches
+
+Clients connect over TCP or a Unix socket and send move requests, one JSON
+value per line, as to main.py --serve: the board string alone, answered with
+the move index alone, or an object
+
+    {"board": "0102...", "color": "black", "q_values": true}
+
+answered with {"move": 12} (and "q_values" if asked). {"stats": true} is
+answered with the metrics of the server (see InferenceServer.metrics).
+
+Requests of all the connections go to one queue. The batcher takes the first
+waiting request, waits at most `window` seconds for more, up to
+max_batch_size, and evaluates the Q-values of the whole batch with one call
+of ActWrapper.q_values, in a thread so that the server keeps reading
+requests meanwhile. The moves are the best valid ones: occupied
+intersections are filtered out of the Q-values as by the deterministic
+filter of build_act, also for models trained without it. Malformed requests
+and full boards are answered with {"error": "..."}.
+
+A connection sends its next request once it has its answer, so a client
+plays many games at once by opening a connection per game.
+"""
+import asyncio
+import json
+import time
+
+import numpy as np
+
+from adversarial_gym.gym_gomoku.envs.util import encode_boards, gomoku_util, parse_move_request
+from baselines.common.misc_util import LatencyStats
+
+
+class Histogram(object):
+    def __init__(self, edges):
+        """Counts of the values between consecutive edges, the first and last
+        buckets also count the values below and above the edges
+
+        Parameters
+        ----------
+        edges: [float]
+            increasing bucket edges
+        """
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.counts = np.zeros(len(self.edges) + 1, dtype=np.int64)
+
+    def add(self, values):
+        np.add.at(self.counts, np.searchsorted(self.edges, values, side='right'), 1)
+
+    def as_dict(self):
+        return {"edges": self.edges.tolist(), "counts": self.counts.tolist()}
+
+
+def filter_q_values(q_values, boards):
+    """Q-values of the occupied intersections below every other one, as
+    build_graph.build_q_filter"""
+    occupied = boards.reshape(len(boards), -1) != gomoku_util.color_dict['empty']
+    worst = q_values.min(axis=1, keepdims=True)
+    return np.where(occupied, worst - 1., q_values)
+
+
+class InferenceServer(object):
+    def __init__(self, act, board_size, window=0.002, max_batch_size=64):
+        """
+        Parameters
+        ----------
+        act: ActWrapper
+            model to evaluate, loaded with deepq.load(isolated=True) since
+            it is called from a worker thread
+        board_size: int
+            board size of the requests
+        window: float
+            seconds the batcher waits for more requests after the first one
+        max_batch_size: int
+            a batch is evaluated at once when it has that many requests
+        """
+        self._act = act
+        self.board_size = board_size
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self._queue = None
+        self._batcher_task = None
+
+        # Queueing delay of every request in ms: from the time it was read to
+        # the start of the evaluation of its batch
+        self.queue_delay = Histogram([0.1, 0.2, 0.5, 1., 2., 5., 10., 20., 50., 100.])
+        self.batch_size = Histogram([1, 2, 4, 8, 16, 32, 64, 128, 256])
+        self.latency = LatencyStats()
+        self.evaluation_time = LatencyStats()
+        self.num_requests = 0
+        self.num_batches = 0
+        self._start_time = time.time()
+        self._rate_time, self._rate_requests = self._start_time, 0
+
+    async def start(self, host="127.0.0.1", port=0, path=None):
+        """Listen on host:port, or on the Unix socket path if given
+
+        Returns
+        -------
+        server: asyncio.AbstractServer
+        """
+        self._queue = asyncio.Queue()
+        self._batcher_task = asyncio.ensure_future(self._batcher())
+        if path is not None:
+            return await asyncio.start_unix_server(self._handle, path=path)
+        return await asyncio.start_server(self._handle, host=host, port=port)
+
+    async def close(self):
+        if self._batcher_task is not None:
+            self._batcher_task.cancel()
+
+    async def move(self, board, color, q_values=False):
+        """Move (and Q-values if q_values) on a flat board, evaluated in the
+        next batch"""
+        future = asyncio.get_event_loop().create_future()
+        self._queue.put_nowait((board, color, future, time.time()))
+        move, values = await future
+        return move, values.tolist() if q_values else None
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    answer = await self._answer(json.loads(line.decode("utf-8")))
+                except (ValueError, KeyError, AttributeError, TypeError, UnicodeDecodeError) as e:
+                    answer = json.dumps({"error": "invalid request: {}".format(e)})
+                writer.write((answer + "\n").encode("utf-8"))
+                await writer.drain()
+        except (ConnectionResetError, BrokenPipeError):
+            pass
+        finally:
+            writer.close()
+
+    async def _answer(self, request):
+        start = time.time()
+        if isinstance(request, dict) and request.get("stats"):
+            return json.dumps(self.metrics())
+        board, color = parse_move_request(request)
+        if len(board) != self.board_size * self.board_size:
+            return json.dumps({"error": "the board must have {} intersections".format(
+                self.board_size * self.board_size)})
+        want_q_values = isinstance(request, dict) and request.get("q_values", False)
+        move, q_values = await self.move(board, color, q_values=want_q_values)
+        self.latency.add(time.time() - start)
+        if not isinstance(request, dict):
+            return str(move)
+        answer = {"move": move}
+        if q_values is not None:
+            answer["q_values"] = q_values
+        return json.dumps(answer)
+
+    async def _batcher(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            start = time.time()
+            self.queue_delay.add([(start - queued) * 1000 for _, _, _, queued in batch])
+            self.batch_size.add(len(batch))
+            boards = np.stack([board for board, _, _, _ in batch]).reshape(
+                len(batch), self.board_size, self.board_size)
+            colors = np.array([color for _, color, _, _ in batch])
+            try:
+                q_values = await loop.run_in_executor(None, self._evaluate, boards, colors)
+            except Exception as e:
+                for _, _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.evaluation_time.add(time.time() - start)
+            moves = q_values.argmax(axis=1)
+            for i, (_, _, future, _) in enumerate(batch):
+                if not future.done():
+                    future.set_result((int(moves[i]), q_values[i]))
+            self.num_requests += len(batch)
+            self.num_batches += 1
+
+    def _evaluate(self, boards, colors):
+        q_values = self._act.q_values(encode_boards(boards, colors))
+        return filter_q_values(np.asarray(q_values), boards)
+
+    def metrics(self):
+        """Throughput, batch sizes, queueing delays and latencies
+
+        Returns
+        -------
+        metrics: dict
+            requests/s is measured since the previous call, the histograms
+            and the totals since the start
+        """
+        now = time.time()
+        rate = (self.num_requests - self._rate_requests) / max(now - self._rate_time, 1e-9)
+        self._rate_time, self._rate_requests = now, self.num_requests
+        return {
+            "requests": self.num_requests,
+            "batches": self.num_batches,
+            "requests/s": rate,
+            "mean batch size": self.num_requests / max(self.num_batches, 1),
+            "batch size histogram": self.batch_size.as_dict(),
+            "queue delay histogram (ms)": self.queue_delay.as_dict(),
+            "latency p50 (ms)": self.latency.percentile(50) * 1000,
+            "latency p99 (ms)": self.latency.percentile(99) * 1000,
+            "evaluation p50 (ms)": self.evaluation_time.percentile(50) * 1000,
+            "evaluation p99 (ms)": self.evaluation_time.percentile(99) * 1000,
+        }
@@ -4,6 +4,32 @@ import tensorflow.contrib.layers as layers
 normalizer_fn = layers.batch_norm
 
 
+def _with_spec(q_func, name, **kwargs):
+    """Attach the JSON serializable description used by from_spec"""
+    q_func.spec = {'name': name, 'kwargs': kwargs}
+    return q_func
+
+
+def from_spec(spec):
+    """Rebuild a q_func from its `spec` attribute, e.g. after a JSON round trip
+
+    Parameters
+    ----------
+    spec: dict
+        {'name': model builder of this module, 'kwargs': its arguments}
+
+    Returns
+    -------
+    q_func: function
+        q_function for DQN algorithm.
+    """
+    builders = {'mlp': mlp, 'cnn_to_mlp': cnn_to_mlp, 'cnn_to_fcn': cnn_to_fcn}
+    kwargs = dict(spec['kwargs'])
+    if 'convs' in kwargs:
+        kwargs['convs'] = [tuple(conv) for conv in kwargs['convs']]
+    return builders[spec['name']](**kwargs)
+
+
 def _mlp(hiddens, inpt, num_actions, scope, reuse=False, layer_norm=False):
     with tf.variable_scope(scope, reuse=reuse):
         out = inpt
@@ -31,7 +57,8 @@ def mlp(hiddens=[], layer_norm=False):
     q_func: function
         q_function for DQN algorithm.
     """
-    return lambda *args, **kwargs: _mlp(hiddens, layer_norm=layer_norm, *args, **kwargs)
+    return _with_spec(lambda *args, **kwargs: _mlp(hiddens, layer_norm=layer_norm, *args, **kwargs),
+                      'mlp', hiddens=list(hiddens), layer_norm=layer_norm)
 
 
 def _cnn_to_mlp(convs, hiddens, dueling, inpt, num_actions, scope, reuse=False, layer_norm=False):
@@ -99,4 +126,77 @@ def cnn_to_mlp(convs, hiddens, dueling=False, layer_norm=False):
         q_function for DQN algorithm.
     """
 
-    return lambda *args, **kwargs: _cnn_to_mlp(convs, hiddens, dueling, layer_norm=layer_norm, *args, **kwargs)
+    return _with_spec(lambda *args, **kwargs: _cnn_to_mlp(convs, hiddens, dueling, layer_norm=layer_norm, *args, **kwargs),
+                      'cnn_to_mlp', convs=[list(conv) for conv in convs], hiddens=list(hiddens),
+                      dueling=dueling, layer_norm=layer_norm)
+
+
+def _cnn_to_fcn(convs, hiddens, dueling, inpt, num_actions, scope, reuse=False, layer_norm=False):
+    with tf.variable_scope(scope, reuse=reuse):
+        out = inpt
+        with tf.variable_scope("convnet"):
+            for num_outputs, kernel_size, stride in convs:
+                assert stride == 1, "fully convolutional head needs stride 1 to keep one output per cell"
+                out = layers.convolution2d(out,
+                                           normalizer_fn=normalizer_fn,
+                                           num_outputs=num_outputs,
+                                           kernel_size=kernel_size,
+                                           stride=stride,
+                                           activation_fn=tf.nn.relu)
+        with tf.variable_scope("action_value"):
+            # 1x1 convolution gives one Q-value per board cell, so the number
+            # of weights does not depend on the board size
+            action_scores = layers.convolution2d(out,
+                                                 num_outputs=1,
+                                                 kernel_size=1,
+                                                 stride=1,
+                                                 activation_fn=None)
+            action_scores = layers.flatten(action_scores)
+
+        if dueling:
+            with tf.variable_scope("state_value"):
+                state_out = tf.reduce_mean(out, axis=[1, 2])
+                for hidden in hiddens:
+                    state_out = layers.fully_connected(
+                        state_out, num_outputs=hidden, activation_fn=None)
+                    if layer_norm:
+                        state_out = layers.layer_norm(
+                            state_out, center=True, scale=True)
+                    state_out = tf.nn.relu(state_out)
+                state_score = layers.fully_connected(
+                    state_out, num_outputs=1, activation_fn=None)
+            action_scores_mean = tf.reduce_mean(action_scores, 1)
+            action_scores_centered = action_scores - \
+                tf.expand_dims(action_scores_mean, 1)
+            q_out = state_score + action_scores_centered
+        else:
+            q_out = action_scores
+        return q_out
+
+
+def cnn_to_fcn(convs, hiddens=[], dueling=False, layer_norm=False):
+    """This model takes as input an observation and returns values of all actions.
+    Unlike cnn_to_mlp it has no dense layer sized for one board, so the same
+    weights can be used on any board size (one action per board cell).
+
+    Parameters
+    ----------
+    convs: [(int, int int)]
+        list of convolutional layers in form of
+        (num_outputs, kernel_size, stride), stride must be 1
+    hiddens: [int]
+        list of sizes of hidden layers of the state value head,
+        only used if dueling is true
+    dueling: bool
+        if true add a state value head computed from the globally
+        average pooled conv features
+
+    Returns
+    -------
+    q_func: function
+        q_function for DQN algorithm.
+    """
+
+    return _with_spec(lambda *args, **kwargs: _cnn_to_fcn(convs, hiddens, dueling, layer_norm=layer_norm, *args, **kwargs),
+                      'cnn_to_fcn', convs=[list(conv) for conv in convs], hiddens=list(hiddens),
+                      dueling=dueling, layer_norm=layer_norm)
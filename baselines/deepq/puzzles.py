@@ -0,0 +1,192 @@
+"""Tactical puzzles: labelled positions to score a model in a few batched calls
+
+Three kinds of positions, built from the patterns of make_beginner_policy
+(see gym_gomoku/envs/util.py):
+
+    win-in-one      the player to move has a four, the answers are the
+                    moves that make five
+    block-four      the opponent has a four with a single winning cell and
+                    the player to move has no four, the answer is that cell
+    block-three     the opponent has a three (open or broken), nobody has a
+                    four and the player to move has no three, the answers are
+                    the empty cells of the three
+
+A puzzle file is an .npz with
+
+    boards      int8 (n, size, size), color_dict values
+    to_move     int8 (n,), color_dict value of the player to move
+    answers     uint8 (n, ceil(size * size / 8)), np.packbits of the mask
+                of the correct moves
+    kinds       int8 (n,), index in KINDS
+"""
+import collections
+
+import numpy as np
+
+from adversarial_gym.gym_gomoku.envs import util
+
+KINDS = ['win-in-one', 'block-four', 'block-three']
+
+Puzzles = collections.namedtuple('Puzzles', ['boards', 'to_move', 'answers', 'kinds'])
+
+_BLACK = util.gomoku_util.color_dict['black']
+_WHITE = util.gomoku_util.color_dict['white']
+
+
+def _color(value):
+    return util.gomoku_util.color_dict_rev[value]
+
+
+def _plant(rng, size, pattern):
+    """Board with pattern on a random line, and the cells it covers"""
+    board = np.zeros((size, size), dtype=np.int8)
+    di, dj = util.DIRECTIONS[rng.randint(len(util.DIRECTIONS))]
+    length = len(pattern)
+    # Start so that the whole pattern fits on the board
+    rows = range(max(0, -(length - 1) * di), size - max(0, (length - 1) * di))
+    cols = range(max(0, -(length - 1) * dj), size - max(0, (length - 1) * dj))
+    i, j = rows[rng.randint(len(rows))], cols[rng.randint(len(cols))]
+    covered = np.zeros((size, size), dtype=bool)
+    for m, value in enumerate(pattern):
+        board[i + m * di, j + m * dj] = value
+        covered[i + m * di, j + m * dj] = True
+    return board, covered
+
+
+def _fill(rng, board, covered, to_move, max_extra):
+    """Add random stones outside of covered so that to_move is to play:
+    as many black as white stones if black is to move, one more otherwise"""
+    num_black = int((board == _BLACK).sum())
+    num_white = int((board == _WHITE).sum())
+    extra = rng.randint(max_extra + 1)
+    if to_move == _BLACK:
+        target_white = max(num_black, num_white) + extra
+        target_black = target_white
+    else:
+        target_white = max(num_black - 1, num_white) + extra
+        target_black = target_white + 1
+    free = np.flatnonzero(~covered.reshape(-1) & (board.reshape(-1) == 0))
+    cells = rng.permutation(free)
+    new_black = target_black - num_black
+    new_white = target_white - num_white
+    if new_black + new_white > len(cells):
+        return None
+    flat = board.reshape(-1)
+    flat[cells[:new_black]] = _BLACK
+    flat[cells[new_black:new_black + new_white]] = _WHITE
+    return board
+
+
+def _candidates(rng, size, kind, num, max_extra):
+    boards, to_move = [], []
+    while len(boards) < num:
+        color = _BLACK if rng.randint(2) == 0 else _WHITE
+        own, other = _color(color), util.gomoku_util.other_color(_color(color))
+        if kind == 'win-in-one':
+            patterns = util.four_patterns(own)
+        elif kind == 'block-four':
+            patterns = util.four_patterns(other)
+        else:
+            patterns = util.three_patterns(other)
+        board, covered = _plant(rng, size, patterns[rng.randint(len(patterns))])
+        board = _fill(rng, board, covered, color, max_extra)
+        if board is not None:
+            boards.append(board)
+            to_move.append(color)
+    return np.array(boards), np.array(to_move, dtype=np.int8)
+
+
+def _label(boards, to_move, kind):
+    """Mask of the correct moves and whether each position is a valid puzzle"""
+    black_moves = to_move == _BLACK
+    black_wins, white_wins = util.winning_moves(boards, 'black'), util.winning_moves(boards, 'white')
+    own_wins = np.where(black_moves[:, None, None], black_wins, white_wins)
+    other_wins = np.where(black_moves[:, None, None], white_wins, black_wins)
+    num_own = own_wins.reshape(len(boards), -1).sum(axis=1)
+    num_other = other_wins.reshape(len(boards), -1).sum(axis=1)
+    valid = ~util.has_five(boards, 'black') & ~util.has_five(boards, 'white')
+    if kind == 'win-in-one':
+        return own_wins, valid & (num_own > 0)
+    if kind == 'block-four':
+        return other_wins, valid & (num_own == 0) & (num_other == 1)
+    black_threes = util.pattern_moves(boards, util.three_patterns('black'))
+    white_threes = util.pattern_moves(boards, util.three_patterns('white'))
+    own_threes = np.where(black_moves[:, None, None], black_threes, white_threes)
+    other_threes = np.where(black_moves[:, None, None], white_threes, black_threes)
+    valid &= (num_own == 0) & (num_other == 0) & ~own_threes.reshape(len(boards), -1).any(axis=1)
+    return other_threes, valid & other_threes.reshape(len(boards), -1).any(axis=1)
+
+
+def generate_puzzles(board_size, num_puzzles, seed=0, max_extra_stones=None, batch_size=512):
+    """Build num_puzzles puzzles, as many of each kind
+
+    Parameters
+    ----------
+    board_size: int
+    num_puzzles: int
+    seed: int
+    max_extra_stones: int or None
+        max number of random stones of each colour around the pattern,
+        a sixth of the board if None
+    batch_size: int
+        number of candidate positions labelled at once
+
+    Returns
+    -------
+    puzzles: Puzzles
+    """
+    rng = np.random.RandomState(seed)
+    if max_extra_stones is None:
+        max_extra_stones = board_size * board_size // 6
+    per_kind = [num_puzzles // len(KINDS) + (k < num_puzzles % len(KINDS)) for k in range(len(KINDS))]
+    boards, to_move, answers, kinds = [], [], [], []
+    for k, kind in enumerate(KINDS):
+        found = 0
+        while found < per_kind[k]:
+            candidates, candidate_to_move = _candidates(rng, board_size, kind, batch_size, max_extra_stones)
+            correct, valid = _label(candidates, candidate_to_move, kind)
+            keep = np.flatnonzero(valid)[:per_kind[k] - found]
+            boards.append(candidates[keep])
+            to_move.append(candidate_to_move[keep])
+            answers.append(np.packbits(correct[keep].reshape(len(keep), -1), axis=1))
+            kinds.append(np.full(len(keep), k, dtype=np.int8))
+            found += len(keep)
+    return Puzzles(np.concatenate(boards).astype(np.int8), np.concatenate(to_move),
+                   np.concatenate(answers), np.concatenate(kinds))
+
+
+def save_puzzles(path, puzzles):
+    np.savez_compressed(path, **puzzles._asdict())
+
+
+def load_puzzles(path):
+    with np.load(path) as data:
+        return Puzzles(**{field: data[field] for field in Puzzles._fields})
+
+
+def score_puzzles(act, puzzles, batch_size=1024):
+    """Share of puzzles the greedy policy of act solves
+
+    Parameters
+    ----------
+    act: ActWrapper or act function
+    puzzles: Puzzles
+    batch_size: int
+        number of positions per act call
+
+    Returns
+    -------
+    scores: {str: float}
+        solved share of every kind and of all the puzzles
+    """
+    num_puzzles, board_size = puzzles.boards.shape[:2]
+    obs = util.encode_boards(puzzles.boards, puzzles.to_move)
+    actions = np.concatenate([
+        np.asarray(act(obs[i:i + batch_size], stochastic=False))
+        for i in range(0, num_puzzles, batch_size)])
+    answers = np.unpackbits(puzzles.answers, axis=1)[:, :board_size * board_size]
+    solved = answers[np.arange(num_puzzles), actions].astype(bool)
+    scores = {"puzzles {}".format(kind): float(solved[puzzles.kinds == k].mean())
+              for k, kind in enumerate(KINDS) if np.any(puzzles.kinds == k)}
+    scores["puzzles all"] = float(solved.mean())
+    return scores
@@ -1,6 +1,16 @@
+import collections
+import lzma
 import numpy as np
+import os
+import pickle
+import queue
 import random
+import threading
+import time
+import zlib
 
+from baselines import logger
+from baselines.common.misc_util import LatencyStats
 from baselines.common.segment_tree import SumSegmentTree, MinSegmentTree
 
 
@@ -17,6 +27,8 @@ class ReplayBuffer(object):
         self._storage = []
         self._maxsize = size
         self._next_idx = 0
+        # add, sample and update_priorities may be called from several threads
+        self._lock = threading.RLock()
 
     def __len__(self):
         return len(self._storage)
@@ -24,11 +36,12 @@ class ReplayBuffer(object):
     def add(self, obs_t, action, reward, obs_tp1, done):
         data = (obs_t, action, reward, obs_tp1, done)
 
-        if self._next_idx >= len(self._storage):
-            self._storage.append(data)
-        else:
-            self._storage[self._next_idx] = data
-        self._next_idx = (self._next_idx + 1) % self._maxsize
+        with self._lock:
+            if self._next_idx >= len(self._storage):
+                self._storage.append(data)
+            else:
+                self._storage[self._next_idx] = data
+            self._next_idx = (self._next_idx + 1) % self._maxsize
 
     def _encode_sample(self, idxes):
         obses_t, actions, rewards, obses_tp1, dones = [], [], [], [], []
@@ -64,13 +77,43 @@ class ReplayBuffer(object):
             done_mask[i] = 1 if executing act_batch[i] resulted in
             the end of an episode and 0 otherwise.
         """
-        idxes = [random.randint(0, len(self._storage) - 1)
-                 for _ in range(batch_size)]
-        return self._encode_sample(idxes)
+        with self._lock:
+            idxes = [random.randint(0, len(self) - 1)
+                     for _ in range(batch_size)]
+            return self._encode_sample(idxes)
+
+    def get_state(self):
+        """Contents of the buffer, to be saved and given to set_state
+
+        Returns
+        -------
+        arrays: {str: np.array}
+            one array per transition field, in slot order (the subclasses
+            save their storage as it is)
+        meta: dict
+            position in the ring and other small state
+        """
+        with self._lock:
+            obses_t, actions, rewards, obses_tp1, dones = self._encode_sample(
+                range(len(self)))
+            arrays = {'obs_t': obses_t, 'action': actions, 'reward': rewards,
+                      'obs_tp1': obses_tp1, 'done': dones}
+            return arrays, {'next_idx': self._next_idx}
+
+    def set_state(self, arrays, meta):
+        """Refill an empty buffer with the output of get_state. The arrays
+        may be memory mapped, they are read once."""
+        with self._lock:
+            assert len(self) == 0, "set_state needs an empty buffer"
+            assert len(arrays['action']) <= self._maxsize
+            for i in range(len(arrays['action'])):
+                self.add(arrays['obs_t'][i], arrays['action'][i], arrays['reward'][i],
+                         arrays['obs_tp1'][i], arrays['done'][i])
+            self._next_idx = meta['next_idx']
 
 
 class PrioritizedReplayBuffer(ReplayBuffer):
-    def __init__(self, size, alpha):
+    def __init__(self, size, alpha, **kwargs):
         """Create Prioritized Replay buffer.
 
         Parameters
@@ -82,16 +125,20 @@ class PrioritizedReplayBuffer(ReplayBuffer):
             how much prioritization is used
             (0 - no prioritization, 1 - full prioritization)
 
+        kwargs:
+            passed on to the storage, e.g. the arguments of MemmapReplayBuffer
+            for PrioritizedMemmapReplayBuffer
+
         See Also
         --------
         ReplayBuffer.__init__
         """
-        super(PrioritizedReplayBuffer, self).__init__(size)
+        super(PrioritizedReplayBuffer, self).__init__(size, **kwargs)
         assert alpha > 0
         self._alpha = alpha
 
         it_capacity = 1
-        while it_capacity < size:
+        while it_capacity < self._maxsize:
             it_capacity *= 2
 
         self._it_sum = SumSegmentTree(it_capacity)
@@ -100,16 +147,17 @@ class PrioritizedReplayBuffer(ReplayBuffer):
 
     def add(self, *args, **kwargs):
         """See ReplayBuffer.store_effect"""
-        idx = self._next_idx
-        super().add(*args, **kwargs)
-        self._it_sum[idx] = self._max_priority ** self._alpha
-        self._it_min[idx] = self._max_priority ** self._alpha
+        with self._lock:
+            idx = self._next_idx
+            super().add(*args, **kwargs)
+            self._it_sum[idx] = self._max_priority ** self._alpha
+            self._it_min[idx] = self._max_priority ** self._alpha
 
     def _sample_proportional(self, batch_size):
         res = []
         for _ in range(batch_size):
             # TODO(szymon): should we ensure no repeats?
-            mass = random.random() * self._it_sum.sum(0, len(self._storage) - 1)
+            mass = random.random() * self._it_sum.sum(0, len(self) - 1)
             idx = self._it_sum.find_prefixsum_idx(mass)
             res.append(idx)
         return res
@@ -152,18 +200,19 @@ class PrioritizedReplayBuffer(ReplayBuffer):
         """
         assert beta > 0
 
-        idxes = self._sample_proportional(batch_size)
+        with self._lock:
+            idxes = self._sample_proportional(batch_size)
 
-        weights = []
-        p_min = self._it_min.min() / self._it_sum.sum()
-        max_weight = (p_min * len(self._storage)) ** (-beta)
+            weights = []
+            p_min = self._it_min.min() / self._it_sum.sum()
+            max_weight = (p_min * len(self)) ** (-beta)
 
-        for idx in idxes:
-            p_sample = self._it_sum[idx] / self._it_sum.sum()
-            weight = (p_sample * len(self._storage)) ** (-beta)
-            weights.append(weight / max_weight)
-        weights = np.array(weights)
-        encoded_sample = self._encode_sample(idxes)
+            for idx in idxes:
+                p_sample = self._it_sum[idx] / self._it_sum.sum()
+                weight = (p_sample * len(self)) ** (-beta)
+                weights.append(weight / max_weight)
+            weights = np.array(weights)
+            encoded_sample = self._encode_sample(idxes)
         return tuple(list(encoded_sample) + [weights, idxes])
 
     def update_priorities(self, idxes, priorities):
@@ -182,10 +231,452 @@ class PrioritizedReplayBuffer(ReplayBuffer):
             variable `idxes`.
         """
         assert len(idxes) == len(priorities)
-        for idx, priority in zip(idxes, priorities):
-            assert priority > 0
-            assert 0 <= idx < len(self._storage)
-            self._it_sum[idx] = priority ** self._alpha
-            self._it_min[idx] = priority ** self._alpha
+        with self._lock:
+            for idx, priority in zip(idxes, priorities):
+                assert priority > 0
+                assert 0 <= idx < len(self)
+                self._it_sum[idx] = priority ** self._alpha
+                self._it_min[idx] = priority ** self._alpha
+
+                self._max_priority = max(self._max_priority, priority)
+
+    def get_state(self):
+        """See ReplayBuffer.get_state, also holds the priorities"""
+        with self._lock:
+            arrays, meta = super(PrioritizedReplayBuffer, self).get_state()
+            arrays['priority'] = np.array(
+                [self._it_sum[idx] for idx in range(len(self))], dtype=np.float64)
+            meta['max_priority'] = self._max_priority
+            return arrays, meta
+
+    def set_state(self, arrays, meta):
+        """See ReplayBuffer.set_state"""
+        with self._lock:
+            super(PrioritizedReplayBuffer, self).set_state(arrays, meta)
+            for idx, priority in enumerate(arrays['priority']):
+                self._it_sum[idx] = float(priority)
+                self._it_min[idx] = float(priority)
+            self._max_priority = meta['max_priority']
+
+
+class MemmapReplayBuffer(ReplayBuffer):
+    def __init__(self, size, obs_shape, directory, obs_dtype=np.int8, prefetch_batches=0):
+        """Replay buffer stored in memory mapped files, for buffers larger than RAM.
+
+        Every transition is a fixed size record: obs_t and obs_tp1 side by side
+        in obs.npy, and action, reward and done in their own column files. The
+        files are created (overwritten) in directory and only the pages being
+        used stay in memory.
+
+        Parameters
+        ----------
+        size: int
+            Max number of transitions to store in the buffer. When the buffer
+            overflows the old memories are dropped.
+        obs_shape: tuple
+            shape of one observation
+        directory: str
+            where to create the files
+        obs_dtype: np.dtype
+            dtype the observations are stored with, np.int8 fits board planes
+        prefetch_batches: int
+            if positive, a background thread draws the indexes of up to this
+            many uniform batches ahead and asks the kernel to read their pages
+            in (posix_fadvise), so that sample does not wait on the disk. Only
+            used by the uniform sample, not by PrioritizedMemmapReplayBuffer.
+        """
+        super(MemmapReplayBuffer, self).__init__(size)
+        os.makedirs(directory, exist_ok=True)
+        self._directory = directory
+        self._obses = np.lib.format.open_memmap(
+            os.path.join(directory, "obs.npy"), mode='w+', dtype=obs_dtype,
+            shape=(size, 2) + tuple(obs_shape))
+        self._actions = np.lib.format.open_memmap(
+            os.path.join(directory, "action.npy"), mode='w+', dtype=np.int64, shape=(size,))
+        self._rewards = np.lib.format.open_memmap(
+            os.path.join(directory, "reward.npy"), mode='w+', dtype=np.float32, shape=(size,))
+        self._dones = np.lib.format.open_memmap(
+            os.path.join(directory, "done.npy"), mode='w+', dtype=np.float32, shape=(size,))
+        self._num_stored = 0
+
+        if prefetch_batches > 0 and not hasattr(os, 'posix_fadvise'):
+            logger.warn("posix_fadvise is not available, replay prefetching is disabled")
+            prefetch_batches = 0
+        self._prefetch_batches = prefetch_batches
+        # Descriptor the prefetch thread gives its read-ahead advice on
+        self._obs_fd = os.open(os.path.join(directory, "obs.npy"), os.O_RDONLY) if prefetch_batches > 0 else None
+        self._prefetched = queue.Queue(maxsize=max(1, prefetch_batches))
+        self._prefetch_batch_size = None
+        self._prefetch_thread = None
+        self._prefetch_error = None
+        self._closed = False
+
+    def __len__(self):
+        return self._num_stored
+
+    def add(self, obs_t, action, reward, obs_tp1, done):
+        with self._lock:
+            idx = self._next_idx
+            self._obses[idx, 0] = obs_t
+            self._obses[idx, 1] = obs_tp1
+            self._actions[idx] = action
+            self._rewards[idx] = reward
+            self._dones[idx] = done
+            self._num_stored = max(self._num_stored, idx + 1)
+            self._next_idx = (self._next_idx + 1) % self._maxsize
+
+    def _encode_sample(self, idxes):
+        # Read the records in file order, then put them back in sample order
+        idxes = np.asarray(idxes)
+        order = np.argsort(idxes, kind='mergesort')
+        sorted_idxes = idxes[order]
+        inverse = np.empty_like(order)
+        inverse[order] = np.arange(len(order))
+        obses = self._obses[sorted_idxes][inverse]
+        return (obses[:, 0], self._actions[sorted_idxes][inverse], self._rewards[sorted_idxes][inverse],
+                obses[:, 1], self._dones[sorted_idxes][inverse])
+
+    def _warm(self, idxes):
+        """Ask the kernel to read in the pages of the obs records of idxes"""
+        record_bytes = self._obses[0].nbytes
+        # The records start after the .npy header
+        for idx in np.unique(idxes):
+            os.posix_fadvise(self._obs_fd, self._obses.offset + int(idx) * record_bytes, record_bytes,
+                             os.POSIX_FADV_WILLNEED)
+
+    def _prefetch(self):
+        try:
+            while not self._closed:
+                idxes = np.random.randint(0, len(self), size=self._prefetch_batch_size)
+                self._warm(idxes)
+                while not self._closed:
+                    try:
+                        self._prefetched.put(idxes, timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+        except Exception as e:
+            # Re-raised by sample, which would otherwise wait forever
+            self._prefetch_error = e
+
+    def sample(self, batch_size):
+        """Sample a batch of experiences, see ReplayBuffer.sample"""
+        if self._prefetch_batches <= 0:
+            return super(MemmapReplayBuffer, self).sample(batch_size)
+        if len(self) == 0:
+            raise ValueError("cannot sample from an empty replay buffer")
+        if self._prefetch_thread is None:
+            self._prefetch_batch_size = batch_size
+            self._prefetch_thread = threading.Thread(target=self._prefetch)
+            self._prefetch_thread.daemon = True
+            self._prefetch_thread.start()
+        assert batch_size == self._prefetch_batch_size, \
+            "prefetching needs a constant batch size"
+        while True:
+            if self._prefetch_error is not None:
+                raise RuntimeError("Replay prefetching failed") from self._prefetch_error
+            try:
+                idxes = self._prefetched.get(timeout=0.1)
+                break
+            except queue.Empty:
+                pass
+        with self._lock:
+            return self._encode_sample(idxes)
+
+    def get_state(self):
+        """See ReplayBuffer.get_state. The arrays are the stored part of the
+        memory mapped files, flushed, so that saving them copies the files
+        without gathering the transitions in memory. They are views valid
+        until the next add."""
+        with self._lock:
+            self.flush()
+            n = len(self)
+            arrays = {'obs': self._obses[:n], 'action': self._actions[:n],
+                      'reward': self._rewards[:n], 'done': self._dones[:n]}
+            return arrays, {'next_idx': self._next_idx}
+
+    def set_state(self, arrays, meta):
+        """See ReplayBuffer.set_state, the arrays are copied into the files
+        at once"""
+        with self._lock:
+            if 'obs' not in arrays:
+                # Saved by another buffer class
+                return super(MemmapReplayBuffer, self).set_state(arrays, meta)
+            assert len(self) == 0, "set_state needs an empty buffer"
+            n = len(arrays['action'])
+            assert n <= self._maxsize
+            self._obses[:n] = arrays['obs']
+            self._actions[:n] = arrays['action']
+            self._rewards[:n] = arrays['reward']
+            self._dones[:n] = arrays['done']
+            self._num_stored = n
+            self._next_idx = meta['next_idx']
+
+    def flush(self):
+        """Write the dirty pages back to the files"""
+        with self._lock:
+            for array in (self._obses, self._actions, self._rewards, self._dones):
+                array.flush()
+
+    def close(self):
+        """Stop the prefetch thread and unmap the files"""
+        self._closed = True
+        if self._prefetch_thread is not None:
+            self._prefetch_thread.join()
+            self._prefetch_thread = None
+        if self._obs_fd is not None:
+            os.close(self._obs_fd)
+            self._obs_fd = None
+        self._obses = self._actions = self._rewards = self._dones = None
+
+
+class PrioritizedMemmapReplayBuffer(PrioritizedReplayBuffer, MemmapReplayBuffer):
+    """PrioritizedReplayBuffer stored in memory mapped files, takes the
+    arguments of both:
+
+        PrioritizedMemmapReplayBuffer(size, alpha, obs_shape=..., directory=...)
+    """
+    pass
+
+
+class TieredReplayBuffer(ReplayBuffer):
+    def __init__(self, size, hot_size, chunk_size=256, compression='zlib', cache_chunks=16):
+        """Replay buffer keeping old transitions compressed.
+
+        Transitions are grouped in chunks of chunk_size consecutive slots. The
+        chunks holding the hot_size most recent transitions stay as they are,
+        older chunks are stored as columns (obs_t, action, reward, obs_tp1,
+        done) compressed together. A compressed chunk is decompressed when it
+        is sampled, the cache_chunks most recently used ones are kept.
+
+        Parameters
+        ----------
+        size: int
+            Max number of transitions to store in the buffer, rounded up to a
+            multiple of chunk_size. When the buffer overflows the old memories
+            are dropped.
+        hot_size: int
+            number of most recent transitions kept uncompressed
+        chunk_size: int
+            number of transitions compressed together
+        compression: str
+            'zlib' (fast) or 'lzma' (smaller, slower)
+        cache_chunks: int
+            number of decompressed chunks cached
+        """
+        size = (size + chunk_size - 1) // chunk_size * chunk_size
+        super(TieredReplayBuffer, self).__init__(size)
+        assert compression in ('zlib', 'lzma')
+        self._compression = compression
+        self._hot_size = hot_size
+        self._chunk_size = chunk_size
+        if compression == 'zlib':
+            self._compress, self._decompress = zlib.compress, zlib.decompress
+        else:
+            self._compress, self._decompress = lzma.compress, lzma.decompress
+        self._cache_chunks = cache_chunks
+
+        # A chunk is a list of transitions (hot) or compressed bytes (cold)
+        self._chunks = [None] * (size // chunk_size)
+        self._hot_chunks = collections.deque()
+        self._cache = collections.OrderedDict()
+        self._num_stored = 0
+        self._chunk_bytes = {}
+
+        self._hot_latency = LatencyStats()
+        self._cold_latency = LatencyStats()
+        self._num_cache_hits = 0
+        self._num_cache_misses = 0
+
+    def __len__(self):
+        return self._num_stored
+
+    def _freeze(self, chunk_idx):
+        """Compress a full hot chunk"""
+        obses_t, actions, rewards, obses_tp1, dones = zip(*self._chunks[chunk_idx])
+        columns = (np.array(obses_t), np.array(actions), np.array(rewards),
+                   np.array(obses_tp1), np.array(dones))
+        raw = pickle.dumps(columns, protocol=pickle.HIGHEST_PROTOCOL)
+        self._chunks[chunk_idx] = self._compress(raw)
+        self._chunk_bytes[chunk_idx] = (len(raw), len(self._chunks[chunk_idx]))
+
+    def _thaw(self, chunk_idx):
+        """Columns of a cold chunk, through the cache"""
+        columns = self._cache.pop(chunk_idx, None)
+        if columns is None:
+            self._num_cache_misses += 1
+            columns = pickle.loads(self._decompress(self._chunks[chunk_idx]))
+            if len(self._cache) >= self._cache_chunks:
+                self._cache.popitem(last=False)
+        else:
+            self._num_cache_hits += 1
+        self._cache[chunk_idx] = columns
+        return columns
+
+    def _unfreeze(self, chunk_idx):
+        """Turn a cold chunk back into a list of transitions"""
+        self._chunks[chunk_idx] = list(zip(*self._thaw(chunk_idx)))
+        self._cache.pop(chunk_idx)
+        del self._chunk_bytes[chunk_idx]
+
+    def add(self, obs_t, action, reward, obs_tp1, done):
+        data = (obs_t, action, reward, obs_tp1, done)
+
+        with self._lock:
+            chunk_idx, offset = divmod(self._next_idx, self._chunk_size)
+            if offset == 0:
+                if isinstance(self._chunks[chunk_idx], bytes):
+                    # Wrapped around: the old transitions of the chunk stay
+                    # sampleable until they are overwritten
+                    self._unfreeze(chunk_idx)
+                elif self._chunks[chunk_idx] is None:
+                    self._chunks[chunk_idx] = []
+                elif chunk_idx in self._hot_chunks:
+                    # Wrapped around a buffer that is all hot
+                    self._hot_chunks.remove(chunk_idx)
+                self._hot_chunks.append(chunk_idx)
+            chunk = self._chunks[chunk_idx]
+            if offset < len(chunk):
+                chunk[offset] = data
+            else:
+                chunk.append(data)
+            self._num_stored = max(self._num_stored, self._next_idx + 1)
+            self._next_idx = (self._next_idx + 1) % self._maxsize
+
+            # Only full chunks get compressed, the one being written stays hot
+            while (len(self._hot_chunks) - 1) * self._chunk_size > self._hot_size:
+                self._freeze(self._hot_chunks.popleft())
+
+    def _encode_sample(self, idxes):
+        hot_time = cold_time = 0.
+        touched_hot = touched_cold = False
+        obses_t, actions, rewards, obses_tp1, dones = [], [], [], [], []
+        for i in idxes:
+            start = time.time()
+            chunk_idx, offset = divmod(i, self._chunk_size)
+            chunk = self._chunks[chunk_idx]
+            if isinstance(chunk, bytes):
+                columns = self._thaw(chunk_idx)
+                obs_t, action, reward, obs_tp1, done = (column[offset] for column in columns)
+            else:
+                obs_t, action, reward, obs_tp1, done = chunk[offset]
+            obses_t.append(np.array(obs_t, copy=False))
+            actions.append(np.array(action, copy=False))
+            rewards.append(reward)
+            obses_tp1.append(np.array(obs_tp1, copy=False))
+            dones.append(done)
+            if isinstance(chunk, bytes):
+                cold_time += time.time() - start
+                touched_cold = True
+            else:
+                hot_time += time.time() - start
+                touched_hot = True
+        if touched_hot:
+            self._hot_latency.add(hot_time)
+        if touched_cold:
+            self._cold_latency.add(cold_time)
+        return np.array(obses_t), np.array(actions), np.array(rewards), np.array(obses_tp1), np.array(dones)
+
+    def get_state(self):
+        """See ReplayBuffer.get_state. The cold chunks are saved compressed as
+        they are, one after another in the cold array, only the transitions
+        of the hot chunks are gathered."""
+        with self._lock:
+            cold_idxes = sorted(self._chunk_bytes)
+            hot_idxes = [i for i in range(len(self))
+                         if i // self._chunk_size not in self._chunk_bytes]
+            obses_t, actions, rewards, obses_tp1, dones = [], [], [], [], []
+            for i in hot_idxes:
+                obs_t, action, reward, obs_tp1, done = self._chunks[i // self._chunk_size][i % self._chunk_size]
+                obses_t.append(np.array(obs_t, copy=False))
+                actions.append(np.array(action, copy=False))
+                rewards.append(reward)
+                obses_tp1.append(np.array(obs_tp1, copy=False))
+                dones.append(done)
+            # Chunk index, end offset in cold and uncompressed size of every
+            # cold chunk
+            cold_chunks = []
+            end = 0
+            for chunk_idx in cold_idxes:
+                end += len(self._chunks[chunk_idx])
+                cold_chunks.append((chunk_idx, end, self._chunk_bytes[chunk_idx][0]))
+            arrays = {
+                'obs_t': np.array(obses_t), 'action': np.array(actions), 'reward': np.array(rewards),
+                'obs_tp1': np.array(obses_tp1), 'done': np.array(dones),
+                'hot_idx': np.array(hot_idxes, dtype=np.int64),
+                'cold': np.frombuffer(b''.join(self._chunks[i] for i in cold_idxes), dtype=np.uint8),
+                'cold_chunk': np.array(cold_chunks, dtype=np.int64).reshape(-1, 3),
+            }
+            meta = {'next_idx': self._next_idx, 'num_stored': self._num_stored,
+                    'hot_chunks': list(self._hot_chunks), 'compression': self._compression}
+            return arrays, meta
+
+    def set_state(self, arrays, meta):
+        """See ReplayBuffer.set_state"""
+        with self._lock:
+            if 'cold' in arrays:
+                self._set_chunks(arrays, meta)
+                return
+            super(TieredReplayBuffer, self).set_state(arrays, meta)
+            # The next add may land in the middle of a chunk, it has to be hot
+            chunk_idx, offset = divmod(self._next_idx, self._chunk_size)
+            if offset != 0 and isinstance(self._chunks[chunk_idx], bytes):
+                self._unfreeze(chunk_idx)
+                self._hot_chunks.append(chunk_idx)
+
+    def _set_chunks(self, arrays, meta):
+        """Refill an empty buffer with the chunks saved by get_state"""
+        assert len(self) == 0, "set_state needs an empty buffer"
+        assert meta['compression'] == self._compression, "the chunks were compressed with {}".format(
+            meta['compression'])
+        assert meta['num_stored'] <= self._maxsize
+        cold = arrays['cold']
+        start = 0
+        for chunk_idx, end, raw_bytes in arrays['cold_chunk']:
+            self._chunks[chunk_idx] = cold[start:end].tobytes()
+            self._chunk_bytes[int(chunk_idx)] = (int(raw_bytes), int(end - start))
+            start = end
+        for k, i in enumerate(arrays['hot_idx']):
+            chunk_idx = i // self._chunk_size
+            if self._chunks[chunk_idx] is None:
+                self._chunks[chunk_idx] = []
+            # The slots of a hot chunk are saved in order from its first one
+            self._chunks[chunk_idx].append((arrays['obs_t'][k], arrays['action'][k], arrays['reward'][k],
+                                            arrays['obs_tp1'][k], arrays['done'][k]))
+        self._hot_chunks.extend(meta['hot_chunks'])
+        self._num_stored = meta['num_stored']
+        self._next_idx = meta['next_idx']
+
+    def stats(self):
+        """Size of the tiers, compression ratio, cache hit rate and the time
+        a sampled batch spends gathering from each tier
+
+        Returns
+        -------
+        stats: {str: float}
+        """
+        with self._lock:
+            num_cold = len(self._chunk_bytes) * self._chunk_size
+            raw_bytes = sum(raw for raw, _ in self._chunk_bytes.values())
+            compressed_bytes = sum(compressed for _, compressed in self._chunk_bytes.values())
+            num_lookups = self._num_cache_hits + self._num_cache_misses
+            return {
+                "replay hot transitions": self._num_stored - num_cold,
+                "replay cold transitions": num_cold,
+                "replay compression ratio": raw_bytes / compressed_bytes if compressed_bytes else float('nan'),
+                "replay cold MB": compressed_bytes / 2 ** 20,
+                "replay cache hit rate": self._num_cache_hits / num_lookups if num_lookups else float('nan'),
+                "replay hot sample p50 (ms)": self._hot_latency.percentile(50) * 1000,
+                "replay hot sample p99 (ms)": self._hot_latency.percentile(99) * 1000,
+                "replay cold sample p50 (ms)": self._cold_latency.percentile(50) * 1000,
+                "replay cold sample p99 (ms)": self._cold_latency.percentile(99) * 1000,
+            }
+
+
+class PrioritizedTieredReplayBuffer(PrioritizedReplayBuffer, TieredReplayBuffer):
+    """PrioritizedReplayBuffer with the storage of TieredReplayBuffer, takes the
+    arguments of both:
 
-            self._max_priority = max(self._max_priority, priority)
+        PrioritizedTieredReplayBuffer(size, alpha, hot_size=...)
+    """
+    pass
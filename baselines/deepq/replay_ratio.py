@@ -0,0 +1,163 @@
+"""Pace gradient updates to incoming experience
+
+The replay ratio is the number of sampled transitions per collected
+transition, updates * batch_size / env_steps. With a synchronous loop it is
+batch_size / train_freq, but with asynchronous actors, several actors or
+learner threads nothing ties the two rates together, and the learner either
+starves or overfits stale data.
+
+ReplayRatioController keeps the two counters and lets each side wait for the
+other: the learner waits while it is ahead of the target ratio, and, if
+throttle_actors is set, actors wait while the learner is behind it. A
+synchronous loop asks how many updates are due after every env step
+instead of waiting.
+
+Actors and learners in other processes share the counters if the controller
+is built with a multiprocessing context and passed to them when they start:
+
+    controller = ReplayRatioController(8., batch_size=32, ctx=multiprocessing.get_context('spawn'))
+"""
+import threading
+import time
+
+_ENV_STEPS, _UPDATES, _ACTOR_WAIT, _LEARNER_WAIT, _CLOSED = range(5)
+
+
+class ReplayRatioController(object):
+    def __init__(self, replay_ratio, batch_size, learning_starts=0, tolerance=0.1,
+                 throttle_actors=False, ctx=None):
+        """
+        Parameters
+        ----------
+        replay_ratio: float
+            target number of sampled transitions per collected transition
+        batch_size: int
+            number of transitions sampled by one update
+        learning_starts: int
+            env steps collected before the first update, not counted in the ratio
+        tolerance: float
+            relative slack around the target before a side has to wait
+        throttle_actors: bool
+            if True wait_for_learner blocks actors while the learner is behind
+        ctx: multiprocessing context or None
+            if set the counters live in shared memory so that actors and
+            learners in other processes can use the controller
+        """
+        assert replay_ratio > 0
+        self.replay_ratio = replay_ratio
+        self.batch_size = batch_size
+        self.learning_starts = learning_starts
+        self.tolerance = tolerance
+        self.throttle_actors = throttle_actors
+        if ctx is None:
+            self._cond = threading.Condition()
+            self._counts = [0.] * 5
+        else:
+            self._cond = ctx.Condition()
+            self._counts = ctx.Array('d', 5, lock=False)
+        self._queues = {}
+
+    def _target_updates(self):
+        steps = max(0., self._counts[_ENV_STEPS] - self.learning_starts)
+        return steps * self.replay_ratio / self.batch_size
+
+    def add_env_steps(self, n=1):
+        """Actor side, count n collected transitions"""
+        with self._cond:
+            self._counts[_ENV_STEPS] += n
+            self._cond.notify_all()
+
+    def add_updates(self, n=1):
+        """Learner side, count n gradient updates"""
+        with self._cond:
+            self._counts[_UPDATES] += n
+            self._cond.notify_all()
+
+    def updates_due(self):
+        """Number of updates a synchronous loop should run now to reach the target"""
+        with self._cond:
+            return max(0, int(self._target_updates()) - int(self._counts[_UPDATES]))
+
+    def _wait(self, predicate, wait_index, timeout):
+        start = time.time()
+        with self._cond:
+            ok = self._cond.wait_for(
+                lambda: self._counts[_CLOSED] or predicate(), timeout)
+            self._counts[wait_index] += time.time() - start
+            return bool(ok) and not self._counts[_CLOSED]
+
+    def wait_for_experience(self, timeout=None):
+        """Learner side, block while one more update would exceed the target ratio
+
+        Returns
+        -------
+        ready: bool
+            False if it timed out or the controller was closed
+        """
+        return self._wait(
+            lambda: self._counts[_UPDATES] + 1 <= self._target_updates() * (1 + self.tolerance),
+            _LEARNER_WAIT, timeout)
+
+    def wait_for_learner(self, timeout=None):
+        """Actor side, block while the learner is behind the target ratio.
+        Returns at once if throttle_actors is False.
+
+        Returns
+        -------
+        ready: bool
+            False if it timed out or the controller was closed
+        """
+        if not self.throttle_actors:
+            return True
+        # The first update is only due after learning_starts env steps
+        return self._wait(
+            lambda: self._counts[_UPDATES] + 1 >= self._target_updates() * (1 - self.tolerance),
+            _ACTOR_WAIT, timeout)
+
+    def register_queue(self, name, depth):
+        """Report the depth of a queue (e.g. pending transitions of an actor or
+        the replay buffer size) with the metrics
+
+        Parameters
+        ----------
+        name: str
+        depth: () -> int
+        """
+        self._queues[name] = depth
+
+    def close(self):
+        """Wake up and release everyone waiting"""
+        with self._cond:
+            self._counts[_CLOSED] = 1
+            self._cond.notify_all()
+
+    def metrics(self):
+        """Achieved ratio, backlog, waiting times and queue depths
+
+        Returns
+        -------
+        metrics: {str: float}
+        """
+        with self._cond:
+            env_steps = self._counts[_ENV_STEPS]
+            updates = self._counts[_UPDATES]
+            target_updates = self._target_updates()
+            actor_wait = self._counts[_ACTOR_WAIT]
+            learner_wait = self._counts[_LEARNER_WAIT]
+        steps = env_steps - self.learning_starts
+        metrics = {
+            "replay ratio": updates * self.batch_size / steps if steps > 0 else float('nan'),
+            "target replay ratio": self.replay_ratio,
+            "update backlog": target_updates - updates,
+            "actor wait (s)": actor_wait,
+            "learner wait (s)": learner_wait,
+        }
+        for name, depth in self._queues.items():
+            metrics["queue depth " + name] = depth()
+        return metrics
+
+    def __getstate__(self):
+        # Queue depth callbacks are local to the process that registered them
+        state = self.__dict__.copy()
+        state['_queues'] = {}
+        return state
@@ -0,0 +1,337 @@
+"""Replay buffer served by its own process to several actors and learners
+
+The transitions live in one named shared memory block (a
+shared_params.SharedBlock, which works on python 3.7) laid out as column
+arrays (obs_t, action, reward, obs_tp1, done). Only the bookkeeping goes
+through the socket: clients ask the server for slots, write the
+transitions straight into the shared arrays and commit them; samplers ask
+for indexes (and importance weights) and gather the batch straight from the
+shared arrays. Observations never go through a pipe or a pickle.
+
+The server process owns the ring index and the priority segment trees,
+requests are handled one at a time so clients need no locking. A slot is
+not sampled between the time it is reserved and the time it is committed.
+Every slot has a generation counter, bumped each time the slot is reserved,
+so a sampler whose slots got overwritten while it gathered them retries.
+
+    server = ReplayServer(50000, env.observation_space.shape, obs_dtype=np.int8, alpha=0.6)
+    # in any process, server.info is picklable
+    replay_buffer = ReplayClient(server.info)
+    deepq.learn(env, val_env, q_func, prioritized_replay=True, replay_buffer=replay_buffer)
+    ...
+    server.close()
+"""
+import collections
+import multiprocessing
+import os
+import queue
+import random
+import threading
+from multiprocessing import connection
+
+import numpy as np
+
+from baselines.common.segment_tree import SumSegmentTree, MinSegmentTree
+from baselines.common.shared_params import SharedBlock
+
+ReplayServerInfo = collections.namedtuple(
+    'ReplayServerInfo', ['address', 'authkey', 'shm_name', 'size', 'obs_shape', 'obs_dtype', 'prioritized'])
+
+
+def _layout(size, obs_shape, obs_dtype):
+    """Offsets of the column arrays in the shared memory block
+
+    Returns
+    -------
+    columns: {str: (int, np.dtype, tuple)}
+        offset, dtype and shape of every column
+    nbytes: int
+        size of the block
+    """
+    columns = collections.OrderedDict([
+        ('obs_t', (np.dtype(obs_dtype), (size,) + tuple(obs_shape))),
+        ('obs_tp1', (np.dtype(obs_dtype), (size,) + tuple(obs_shape))),
+        ('action', (np.dtype(np.int64), (size,))),
+        ('reward', (np.dtype(np.float32), (size,))),
+        ('done', (np.dtype(np.float32), (size,))),
+        ('generation', (np.dtype(np.int64), (size,))),
+    ])
+    offset = 0
+    layout = {}
+    for name, (dtype, shape) in columns.items():
+        layout[name] = (offset, dtype, shape)
+        nbytes = dtype.itemsize * int(np.prod(shape))
+        # Keep every column cache line aligned
+        offset += (nbytes + 63) // 64 * 64
+    return layout, offset
+
+
+def _map_columns(shm, layout):
+    return {name: np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+            for name, (offset, dtype, shape) in layout.items()}
+
+
+class _ReplayState(object):
+    def __init__(self, size, alpha, generation):
+        """Ring index and priorities, only touched by the server process"""
+        self._size = size
+        self._alpha = alpha
+        self._generation = generation
+        it_capacity = 1
+        while it_capacity < size:
+            it_capacity *= 2
+        self._it_sum = SumSegmentTree(it_capacity)
+        self._it_min = MinSegmentTree(it_capacity)
+        self._max_priority = 1.0
+        self._valid = np.zeros(size, dtype=bool)
+        self._num_valid = 0
+        self._next_idx = 0
+
+    def __len__(self):
+        return self._num_valid
+
+    def _priority(self, priority):
+        # Uniform sampling when alpha is None
+        return 1.0 if self._alpha is None else priority ** self._alpha
+
+    def reserve(self, n):
+        assert 0 < n <= self._size
+        idxes = (self._next_idx + np.arange(n)) % self._size
+        self._next_idx = (self._next_idx + n) % self._size
+        for idx in idxes:
+            self._it_sum[idx] = 0.0
+            self._it_min[idx] = float('inf')
+        self._num_valid -= int(np.sum(self._valid[idxes]))
+        self._valid[idxes] = False
+        self._generation[idxes] += 1
+        return idxes
+
+    def commit(self, idxes):
+        priority = self._priority(self._max_priority)
+        for idx in idxes:
+            self._it_sum[idx] = priority
+            self._it_min[idx] = priority
+        self._num_valid += int(np.sum(~self._valid[idxes]))
+        self._valid[idxes] = True
+
+    def sample(self, batch_size, beta):
+        if self._num_valid == 0:
+            raise ValueError("cannot sample from an empty replay buffer")
+        idxes = []
+        total = self._it_sum.sum()
+        while len(idxes) < batch_size:
+            idx = self._it_sum.find_prefixsum_idx(random.random() * total)
+            # Rounding may land on a slot that is not committed
+            if idx < self._size and self._valid[idx]:
+                idxes.append(idx)
+        idxes = np.array(idxes, dtype=np.int64)
+        if beta is None:
+            weights = None
+        else:
+            assert beta > 0
+            p_min = self._it_min.min() / total
+            max_weight = (p_min * self._num_valid) ** (-beta)
+            p_samples = np.array([self._it_sum[idx] for idx in idxes]) / total
+            weights = (p_samples * self._num_valid) ** (-beta) / max_weight
+        return idxes, weights, self._generation[idxes].copy()
+
+    def update_priorities(self, idxes, priorities, generations):
+        assert len(idxes) == len(priorities) == len(generations)
+        for idx, priority, generation in zip(idxes, priorities, generations):
+            assert priority > 0
+            # Skip the slots overwritten since they were sampled
+            if not self._valid[idx] or self._generation[idx] != generation:
+                continue
+            self._it_sum[idx] = self._priority(priority)
+            self._it_min[idx] = self._priority(priority)
+            self._max_priority = max(self._max_priority, priority)
+
+
+def _serve(size, alpha, shm_name, layout, authkey, address_conn):
+    shm = SharedBlock(shm_name)
+    state = _ReplayState(size, alpha, _map_columns(shm, layout)['generation'])
+    listener = connection.Listener(family='AF_UNIX', authkey=authkey)
+    address_conn.send(listener.address)
+    address_conn.close()
+
+    new_conns = queue.Queue()
+
+    def accept():
+        while True:
+            try:
+                new_conns.put(listener.accept())
+            except connection.AuthenticationError:
+                continue
+            except Exception:
+                # The listener was closed
+                return
+
+    accept_thread = threading.Thread(target=accept)
+    accept_thread.daemon = True
+    accept_thread.start()
+
+    handlers = {
+        'reserve': state.reserve,
+        'commit': state.commit,
+        'sample': state.sample,
+        'update_priorities': state.update_priorities,
+        'len': state.__len__,
+    }
+    conns = []
+    running = True
+    while running:
+        while not new_conns.empty():
+            conns.append(new_conns.get())
+        for conn in connection.wait(conns, timeout=0.05):
+            try:
+                request = conn.recv()
+            except (EOFError, OSError):
+                conns.remove(conn)
+                conn.close()
+                continue
+            command, args = request[0], request[1:]
+            if command == 'shutdown':
+                conn.send((True, None))
+                running = False
+                break
+            try:
+                reply = (True, handlers[command](*args))
+            except Exception as e:
+                reply = (False, "{}: {}".format(type(e).__name__, e))
+            conn.send(reply)
+
+    listener.close()
+    for conn in conns:
+        conn.close()
+    shm.close()
+
+
+class ReplayServer(object):
+    def __init__(self, size, obs_shape, obs_dtype=np.float32, alpha=None):
+        """Start a replay buffer process.
+
+        Parameters
+        ----------
+        size: int
+            Max number of transitions to store in the buffer. When the buffer
+            overflows the old memories are dropped.
+        obs_shape: tuple
+            shape of one observation
+        obs_dtype: np.dtype
+            dtype the observations are stored with, e.g. np.int8 for boards
+        alpha: float or None
+            how much prioritization is used, None for uniform sampling like
+            ReplayBuffer, a positive float for prioritized sampling like
+            PrioritizedReplayBuffer
+        """
+        assert alpha is None or alpha > 0
+        layout, nbytes = _layout(size, obs_shape, obs_dtype)
+        shm_name = 'deepq_replay_{}_{}'.format(os.getpid(), id(self))
+        self._shm = SharedBlock(shm_name, size=nbytes, create=True)
+        _map_columns(self._shm, layout)['generation'][:] = 0
+        authkey = os.urandom(16)
+
+        ctx = multiprocessing.get_context('spawn')
+        address_conn, child_conn = ctx.Pipe(duplex=False)
+        self._process = ctx.Process(target=_serve, args=(
+            size, alpha, shm_name, layout, authkey, child_conn))
+        self._process.daemon = True
+        self._process.start()
+        address = address_conn.recv()
+        address_conn.close()
+
+        self.info = ReplayServerInfo(address=address, authkey=authkey, shm_name=shm_name,
+                                     size=size, obs_shape=tuple(obs_shape),
+                                     obs_dtype=np.dtype(obs_dtype).str, prioritized=alpha is not None)
+
+    def close(self):
+        """Stop the server process and free the shared memory. Clients must be
+        closed first."""
+        conn = connection.Client(self.info.address, authkey=self.info.authkey)
+        conn.send(('shutdown',))
+        conn.recv()
+        conn.close()
+        self._process.join()
+        self._shm.close()
+        self._shm.unlink()
+
+
+class ReplayClient(object):
+    def __init__(self, info):
+        """Drop-in replacement of ReplayBuffer (or PrioritizedReplayBuffer if the
+        server is prioritized) backed by a ReplayServer, usable from any process.
+
+        Parameters
+        ----------
+        info: ReplayServerInfo
+            ReplayServer.info
+        """
+        self._info = info
+        self._shm = SharedBlock(info.shm_name)
+        layout, _ = _layout(info.size, info.obs_shape, np.dtype(info.obs_dtype))
+        columns = _map_columns(self._shm, layout)
+        self._obses_t = columns['obs_t']
+        self._obses_tp1 = columns['obs_tp1']
+        self._actions = columns['action']
+        self._rewards = columns['reward']
+        self._dones = columns['done']
+        self._generation = columns['generation']
+        self._conn = connection.Client(info.address, authkey=info.authkey)
+        # The client may be shared by several learner threads
+        self._lock = threading.Lock()
+        # Generations of the last batch sampled by each thread, for update_priorities
+        self._sampled = threading.local()
+
+    def _call(self, command, *args):
+        with self._lock:
+            self._conn.send((command,) + args)
+            ok, value = self._conn.recv()
+        if not ok:
+            raise RuntimeError("replay server: {}".format(value))
+        return value
+
+    def __len__(self):
+        return self._call('len')
+
+    def add(self, obs_t, action, reward, obs_tp1, done):
+        self.add_batch([obs_t], [action], [reward], [obs_tp1], [done])
+
+    def add_batch(self, obses_t, actions, rewards, obses_tp1, dones):
+        """Add several transitions with two round trips to the server"""
+        idxes = self._call('reserve', len(actions))
+        self._obses_t[idxes] = obses_t
+        self._actions[idxes] = actions
+        self._rewards[idxes] = rewards
+        self._obses_tp1[idxes] = obses_tp1
+        self._dones[idxes] = dones
+        self._call('commit', idxes)
+
+    def sample(self, batch_size, beta=None):
+        """Sample a batch of experiences, see ReplayBuffer.sample and
+        PrioritizedReplayBuffer.sample. beta is needed if and only if the
+        server is prioritized."""
+        assert (beta is not None) == self._info.prioritized
+        while True:
+            idxes, weights, generations = self._call('sample', batch_size, beta)
+            batch = (self._obses_t[idxes], self._actions[idxes], self._rewards[idxes],
+                     self._obses_tp1[idxes], self._dones[idxes])
+            # Retry if a slot was overwritten while we copied it
+            if np.array_equal(self._generation[idxes], generations):
+                break
+        if beta is None:
+            return batch
+        self._sampled.generations = dict(zip(idxes.tolist(), generations.tolist()))
+        return batch + (weights, idxes)
+
+    def update_priorities(self, idxes, priorities):
+        """Update priorities of transitions returned by the last sample, see
+        PrioritizedReplayBuffer.update_priorities"""
+        generations = [self._sampled.generations[idx] for idx in idxes]
+        self._call('update_priorities', np.asarray(idxes),
+                   np.asarray(priorities), generations)
+
+    def close(self):
+        self._conn.close()
+        self._obses_t = self._obses_tp1 = None
+        self._actions = self._rewards = self._dones = self._generation = None
+        self._shm.close()
@@ -0,0 +1,89 @@
+"""Self-play over many games with one batched act call per ply
+
+learn plays one game against Opponent: the agent picks its move with a
+batch-1 act call, then env.step calls Opponent.policy, which picks the reply
+with another batch-1 call to the same network. BatchedSelfPlay plays
+num_games games of a GomokuVecEnv instead, whose observations are encoded
+for the colour to move in every game (plane 0 is the colour to move, see
+GomokuState.encode) and picks all the moves with a single act call.
+
+Transitions are written as learn and Opponent write them: a colour's move
+is written once it is to move again, with reward 0, and when a game ends the
+last move of both colours is written with the final reward of each colour
+and done, the final observation encoded for that colour.
+"""
+import numpy as np
+
+from adversarial_gym.gym_gomoku.envs import GomokuVecEnv, util
+
+_BLACK = util.gomoku_util.color_dict['black']
+_WHITE = util.gomoku_util.color_dict['white']
+
+
+class BatchedSelfPlay(object):
+    def __init__(self, act, replay_buffer, board_size, num_games, random_reset=True, seed=None):
+        """
+        Parameters
+        ----------
+        act: act function
+            picks the moves of both colours, called with a batch of
+            num_games observations and the arguments given to step
+        replay_buffer: ReplayBuffer
+            where the transitions of both colours are added
+        board_size: int
+        num_games: int
+            number of games played at once
+        random_reset: bool
+            start every game from random stones, as many of each colour
+            with black to move, as the training camp envs do
+        seed: int or None
+            seed of the random starting positions
+        """
+        self._act = act
+        self._replay_buffer = replay_buffer
+        self.num_games = num_games
+        self._env = GomokuVecEnv(num_games, board_size, random_reset=random_reset, seed=seed)
+        self._obs = self._env.reset()
+        # Last (obs, action) of each colour in each game, not written yet
+        self._pending = [{_BLACK: None, _WHITE: None} for _ in range(num_games)]
+
+    def step(self, **kwargs):
+        """Play one move in every game, with one act call
+
+        Parameters
+        ----------
+        kwargs:
+            extra arguments of act, e.g. update_eps
+
+        Returns
+        -------
+        rewards: [float]
+            final reward for black of every game that ended, those games
+            are started again
+        """
+        obs = self._obs
+        actions = np.asarray(self._act(obs, **kwargs))
+        self._obs, game_rewards, dones, info = self._env.step(actions)
+
+        rewards = []
+        for k in range(self.num_games):
+            color = info['color'][k]
+            other = _WHITE if color == _BLACK else _BLACK
+            pending = self._pending[k]
+            if pending[color] is not None:
+                self._replay_buffer.add(pending[color][0], pending[color][1], 0., obs[k], 0.)
+            if not dones[k]:
+                pending[color] = (obs[k], actions[k])
+                continue
+            # Win 1, draw 0, an illegal move loses the game
+            reward = game_rewards[k]
+            final = info['final_observation'][k].copy()
+            final[:, :, 0] = color - 1
+            self._replay_buffer.add(obs[k], actions[k], reward, final, 1.)
+            if pending[other] is not None:
+                final = final.copy()
+                final[:, :, 0] = other - 1
+                self._replay_buffer.add(pending[other][0], pending[other][1], -reward, final, 1.)
+            rewards.append(reward if color == _BLACK else -reward)
+            self._pending[k] = {_BLACK: None, _WHITE: None}
+        return rewards
@@ -1,3 +1,5 @@
+import concurrent.futures
+import contextlib
 import numpy as np
 import os
 import dill
@@ -11,41 +13,275 @@ import sys
 import baselines.common.tf_util as U
 
 from baselines import logger
+from baselines.common import checkpoint
+from baselines.common.checkpoint_store import CheckpointStore
+from baselines.common.sprt import SPRT
+from baselines.common import thread_tuner
+from baselines.common.shared_params import ParamPublisher
 from baselines.common.schedules import LinearSchedule
 from baselines import deepq
 from baselines.deepq.replay_buffer import ReplayBuffer, PrioritizedReplayBuffer
+from baselines.deepq.replay_buffer import MemmapReplayBuffer, PrioritizedMemmapReplayBuffer
+from baselines.deepq.replay_buffer import TieredReplayBuffer, PrioritizedTieredReplayBuffer
 from baselines.deepq.opponent import Opponent
+from baselines.deepq.inference import InferenceCopy
+from baselines.deepq.hogwild import HogwildLearner
+from baselines.deepq.replay_ratio import ReplayRatioController
+from baselines.deepq.snapshot import save_snapshot, load_snapshot
+from baselines.deepq.validation import validate, BackgroundValidator
+from baselines.deepq.puzzles import load_puzzles, score_puzzles
+from baselines.deepq.self_play import BatchedSelfPlay
 
 sys.setrecursionlimit(20000)
 
 
+def _make_obs_ph(obs_shape):
+    def make_obs_ph(name):
+        return U.BatchInput(obs_shape, name=name)
+    return make_obs_ph
+
+
+def _make_board_obs_ph(board_size):
+    return _make_obs_ph((board_size, board_size, 3))
+
+
+def _act_vars(scope="deepq"):
+    """Variables of the act function: the Q-network and the exploration rate"""
+    return [v for v in tf.global_variables()
+            if v.name.startswith(scope + "/q_func/") or v.name == scope + "/eps:0"]
+
+
+def _obs_shape(act_params):
+    """Shape of one observation of act_params, without the batch dimension"""
+    # Build the placeholder in a throwaway graph just to get its shape
+    with tf.Graph().as_default():
+        return act_params['make_obs_ph']("obs").get().get_shape().as_list()[1:]
+
+
+def _act_spec(act_params):
+    """JSON description of act_params for the lean checkpoint format, None if
+    the model can not be described (q_func not built by deepq.models)"""
+    q_func_spec = getattr(act_params['q_func'], 'spec', None)
+    if q_func_spec is None:
+        return None
+    return {
+        'model': q_func_spec,
+        'obs_shape': _obs_shape(act_params),
+        'num_actions': act_params['num_actions'],
+        'random_filter': act_params.get('random_filter', False),
+        'deterministic_filter': act_params.get('deterministic_filter', False),
+        'jit': act_params.get('jit', False),
+    }
+
+
+def _act_params_from_spec(spec):
+    return {
+        'make_obs_ph': _make_obs_ph(tuple(spec['obs_shape'])),
+        'q_func': deepq.models.from_spec(spec['model']),
+        'num_actions': spec['num_actions'],
+        'random_filter': spec['random_filter'],
+        'deterministic_filter': spec['deterministic_filter'],
+        'jit': spec['jit'],
+    }
+
+
+def _load_model_file(path, var_list=None):
+    """Restore variables from a file written by ActWrapper.save, in either format
+
+    Parameters
+    ----------
+    path: str
+        lean checkpoint or legacy act function pickle
+    var_list: [tf.Variable] or None
+        variables to restore. If None, all saveable variables for the legacy
+        format and all the variables of the file for the lean format.
+
+    Returns
+    -------
+    act_params: dict
+        arguments of build_act the file was saved with
+    """
+    if checkpoint.is_checkpoint(path):
+        spec, values = checkpoint.read_checkpoint(path)
+        if var_list is None:
+            var_list = [v for v in tf.global_variables() if v.name in values]
+        checkpoint.assign_variables(var_list, values)
+        return _act_params_from_spec(spec)
+    with open(path, "rb") as f:
+        model_data, act_params = dill.load(f)
+    _restore_model_data(model_data, var_list=var_list)
+    return act_params
+
+
+def _restore_model_data(model_data, var_list=None):
+    """Restore variables from the zipped checkpoint produced by ActWrapper.save
+
+    Parameters
+    ----------
+    model_data: bytes
+        content of the zipped checkpoint directory
+    var_list: [tf.Variable] or None
+        variables to restore, all saveable variables if None
+    """
+    with tempfile.TemporaryDirectory() as td:
+        arc_path = os.path.join(td, "packed.zip")
+        with open(arc_path, "wb") as f:
+            f.write(model_data)
+
+        zipfile.ZipFile(arc_path, 'r', zipfile.ZIP_DEFLATED).extractall(td)
+        U.load_state(os.path.join(td, "model"), var_list=var_list)
+
+
+def _autotune_threads(obs_shape, num_actions, act, train=None, batch_size=32):
+    """Pick the session thread counts for act (and train) by timing them
+    on dummy batches, see thread_tuner.autotune.
+
+    Returns
+    -------
+    best: {str: (int, int)}
+        (inter_op_threads, intra_op_threads) for 'act' and 'train'
+    """
+    obs = np.zeros((1,) + tuple(obs_shape), dtype=np.float32)
+    benchmarks = {'act': lambda: act(obs, update_eps=0.)}
+    if train is not None:
+        obses = np.zeros((batch_size,) + tuple(obs_shape), dtype=np.float32)
+        actions = np.random.randint(num_actions, size=batch_size)
+        rewards = np.zeros(batch_size, dtype=np.float32)
+        weights = np.ones(batch_size, dtype=np.float32)
+        benchmarks['train'] = lambda: train(
+            obses, actions, rewards, obses, rewards, weights)
+    best, timings = thread_tuner.autotune(benchmarks)
+    for name, (inter, intra) in sorted(best.items()):
+        logger.log("Thread autotune: {} runs fastest with {} inter-op and {} intra-op threads ({:.2f} ms)".format(
+            name, inter, intra, timings[name][(inter, intra)] * 1000))
+    if logger.get_dir() is not None:
+        thread_tuner.save_choice(os.path.join(
+            logger.get_dir(), "thread_config.json"), best, timings)
+    return best
+
+
+def _run_in_session(sess, f, *args, **kwargs):
+    with sess.as_default():
+        return f(*args, **kwargs)
+
+
+def _add_final_transitions(replay_buffer, opponent, obs, action, rew, new_obs):
+    """Write the last move of the agent (black) and of the opponent (white)
+    of a finished game, the final observation encoded for each of them"""
+    final = np.array(new_obs)
+    final[:, :, 0] = 0
+    replay_buffer.add(obs, action, rew, final, 1.)
+    if opponent.old_obs is not None:
+        # A copy, the buffer may keep a reference to the array of black
+        final = final.copy()
+        final[:, :, 0] = 1
+        replay_buffer.add(opponent.old_obs, opponent.old_action, -rew, final, 1.)
+
+
+def _in_inter_op_pool(f, index):
+    def wrapped(*args, **kwargs):
+        with U.inter_op_pool(index):
+            return f(*args, **kwargs)
+    return wrapped
+
+
 class ActWrapper(object):
-    def __init__(self, act, act_params):
+    def __init__(self, act, act_params, sess=None):
         self._act = act
         self._act_params = act_params
+        # Session of a model loaded in a graph of its own, None if the model
+        # lives in the default graph and session
+        self._sess = sess
+        # Built on the first q_values call
+        self._q_values = None
 
-    @staticmethod
-    def load(path, num_cpu=16):
-        with open(path, "rb") as f:
-            model_data, act_params = dill.load(f)
-        act = deepq.build_act(**act_params)
-        sess = U.make_session(num_cpu=num_cpu)
-        sess.__enter__()
-        with tempfile.TemporaryDirectory() as td:
-            arc_path = os.path.join(td, "packed.zip")
-            with open(arc_path, "wb") as f:
-                f.write(model_data)
+    def _scope(self):
+        """Make the graph and session of the model the default ones"""
+        stack = contextlib.ExitStack()
+        if self._sess is not None:
+            stack.enter_context(self._sess.graph.as_default())
+            stack.enter_context(self._sess.as_default())
+        return stack
 
-            zipfile.ZipFile(arc_path, 'r', zipfile.ZIP_DEFLATED).extractall(td)
-            U.load_state(os.path.join(td, "model"))
+    @staticmethod
+    def load(path, num_cpu=16, board_size=None, step=None, isolated=False):
+        lean = os.path.isdir(path) or checkpoint.is_checkpoint(path)
+        if os.path.isdir(path):
+            store = CheckpointStore(path)
+            spec, values = store.get(store.latest() if step is None else step)
+            act_params = _act_params_from_spec(spec)
+        elif lean:
+            spec, values = checkpoint.read_checkpoint(path)
+            act_params = _act_params_from_spec(spec)
+        else:
+            with open(path, "rb") as f:
+                model_data, act_params = dill.load(f)
+        if board_size is not None:
+            # Only works for board size agnostic models, see models.cnn_to_fcn
+            act_params['make_obs_ph'] = _make_board_obs_ph(board_size)
+            act_params['num_actions'] = board_size * board_size
+        graph = tf.Graph() if isolated else tf.get_default_graph()
+        with graph.as_default():
+            act = deepq.build_act(**act_params)
+            if num_cpu == 'auto':
+                inter, intra = _autotune_threads(
+                    _obs_shape(act_params), act_params['num_actions'], act)['act']
+                sess = U.make_session(num_cpu=inter, intra_op_threads=intra, graph=graph)
+            else:
+                sess = U.make_session(num_cpu=num_cpu, graph=graph)
+        if not isolated:
+            sess.__enter__()
+        wrapper = ActWrapper(act, act_params, sess=sess if isolated else None)
+        with wrapper._scope():
+            if lean:
+                checkpoint.assign_variables(_act_vars(), values)
+            else:
+                _restore_model_data(model_data)
 
-        return ActWrapper(act, act_params)
+        return wrapper
 
     def __call__(self, *args, **kwargs):
-        return self._act(*args, **kwargs)
+        with self._scope():
+            return self._act(*args, **kwargs)
+
+    def q_values(self, obs):
+        """Q-values of a batch of observations, the ones the act function
+        takes its deterministic actions from (see build_graph.build_q_values)"""
+        with self._scope():
+            if self._q_values is None:
+                params = self._act_params
+                self._q_values = deepq.build_q_values(
+                    params['make_obs_ph'], params['q_func'], params['num_actions'],
+                    deterministic_filter=params.get('deterministic_filter', False),
+                    jit=params.get('jit', False))
+            return self._q_values(obs)
+
+    def save(self, path, legacy=False, writer=None):
+        """Save model to `path`
 
-    def save(self, path):
-        """Save model to a pickle located at `path`"""
+        By default the file is a lean checkpoint (see common/checkpoint.py):
+        the model spec as JSON and the act function variables, written in one
+        pass and loaded memory mapped. Models that were not built by
+        deepq.models, or legacy=True, fall back to the dill pickle of a
+        zipped tf checkpoint and of act_params.
+
+        If writer (a checkpoint.AsyncCheckpointWriter) is given, a lean
+        checkpoint is written in the background and save returns as soon as
+        the variables are copied.
+        """
+        with self._scope():
+            self._save(path, legacy, writer)
+
+    def _save(self, path, legacy, writer):
+        spec = None if legacy else _act_spec(self._act_params)
+        if spec is not None:
+            if writer is not None:
+                writer.save(path, spec, _act_vars())
+            else:
+                checkpoint.write_checkpoint(
+                    path, spec, checkpoint.variable_values(_act_vars()))
+            return
+        assert writer is None, "only lean checkpoints are written in the background"
         with tempfile.TemporaryDirectory() as td:
             U.save_state(os.path.join(td, "model"))
             arc_name = os.path.join(td, "packed.zip")
@@ -62,15 +298,28 @@ class ActWrapper(object):
             dill.dump((model_data, self._act_params), f)
 
 
-def load(path, num_cpu=16):
+def load(path, num_cpu=16, board_size=None, step=None, isolated=False):
     """Load act function that was returned by learn function.
 
     Parameters
     ----------
     path: str
-        path to the act function pickle
-    num_cpu: int
-        number of cpus to use for executing the policy
+        path to the saved act function, or to a checkpoint history
+        directory written by learn(checkpoint_dir=...)
+    num_cpu: int or 'auto'
+        number of cpus to use for executing the policy. If 'auto' the thread
+        counts are picked by timing the policy (see thread_tuner.autotune).
+    board_size: int or None
+        if set, build the policy for a board_size x board_size board
+        instead of the board it was trained on. Only board size agnostic
+        models (see models.cnn_to_fcn) can be loaded this way.
+    step: int or None
+        step of the checkpoint to load from a checkpoint history directory,
+        the latest one if None
+    isolated: bool
+        if True the model gets a graph and a session of its own, instead of
+        being added to the default graph and entering its session, so that
+        several models can be loaded and played in one process
 
     Returns
     -------
@@ -78,29 +327,8 @@ def load(path, num_cpu=16):
         function that takes a batch of observations
         and returns actions.
     """
-    return ActWrapper.load(path, num_cpu=num_cpu)
-
-
-def validate(env, act, kwargs):
-    num_episodes = 200
-    win_count = 0
-    lose_count = 0
-
-    for i in range(num_episodes):
-        obs = env.reset()
-        while True:
-            action = act(obs[None],
-                         stochastic=False, **kwargs)[0]
-            obs, reward, done, info = env.step(action)
-            if done:
-                if reward == 1.:
-                    win_count += 1
-                elif reward == -1.:
-                    lose_count += 1
-                break
-        env.swap_role()
-
-    return win_count, lose_count, num_episodes - win_count - lose_count
+    return ActWrapper.load(path, num_cpu=num_cpu, board_size=board_size, step=step,
+                           isolated=isolated)
 
 
 def learn(env,
@@ -115,6 +343,11 @@ def learn(env,
           exploration_final_eps=0.02,
           train_freq=1,
           val_freq=1,
+          val_num_envs=1,
+          val_max_games=200,
+          val_sprt_delta=None,
+          val_sprt_error=0.05,
+          val_background=False,
           batch_size=32,
           print_freq=1,
           checkpoint_freq=10000,
@@ -131,7 +364,24 @@ def learn(env,
           callback=None,
           deterministic_filter=False,
           random_filter=False,
-          state_file=None):
+          state_file=None,
+          warm_start_file=None,
+          jit=False,
+          inference_sync_freq=None,
+          inference_num_cpu=1,
+          param_broadcast_name=None,
+          param_broadcast_freq=100,
+          data_parallel=None,
+          num_learner_threads=None,
+          replay_buffer=None,
+          replay_ratio=None,
+          buffer_dir=None,
+          buffer_hot_size=None,
+          snapshot_dir=None,
+          snapshot_freq=10000,
+          checkpoint_dir=None,
+          puzzle_file=None,
+          self_play_games=None):
     """Train a deepq model.
 
     Parameters
@@ -169,6 +419,28 @@ def learn(env,
         set to None to disable printing
     val_freq: int
         validate the model every 'val_freq' episodes
+    val_num_envs: int
+        number of validation games played at once, on val_env and copies of
+        it, with one batched act call per move (see validation.validate).
+        The counts are the same as with one game at a time.
+    val_max_games: int
+        number of validation games, or max number of them with val_sprt_delta
+    val_sprt_delta: float or None
+        if set, validation is a sequential probability ratio test (see
+        common/sprt.py) of win rate best - val_sprt_delta against best +
+        val_sprt_delta, where best is the win rate of the saved model. It
+        stops as soon as the test is decided and the model is saved if the
+        higher rate is accepted. When val_max_games are played without a
+        decision the win rates are compared as without the test.
+    val_sprt_error: float
+        max probability of saving a model worse than best - val_sprt_delta,
+        and of not saving one better than best + val_sprt_delta
+    val_background: bool
+        if True, validation runs on a background thread (see
+        validation.BackgroundValidator) on a copy of the weights taken every
+        val_freq episodes, and training does not wait for it. The best model
+        is kept when the results arrive, they are logged with the time step
+        of the weights and the evaluation lag.
     batch_size: int
         size of a batched sampled from replay buffer for training
     print_freq: int
@@ -195,11 +467,102 @@ def learn(env,
         to 1.0. If set to None equals to max_timesteps.
     prioritized_replay_eps: float
         epsilon to add to the TD errors when updating priorities.
-    num_cpu: int
-        number of cpus to use for training
+    num_cpu: int or 'auto'
+        number of cpus to use for training. If 'auto' the inter- and intra-op
+        thread counts are picked at startup by timing the act and train
+        functions (see thread_tuner.autotune). The choice is logged and saved
+        to thread_config.json in the logger directory. Act and train get their
+        own inter-op thread pool, the intra-op count is the one of train.
     callback: (locals, globals) -> None
         function called at every steps with state of the algorithm.
         If callback returns true training stops.
+    state_file: str or None
+        act function pickle to resume training from
+    warm_start_file: str or None
+        act function pickle whose Q-network weights initialize this run.
+        Unlike state_file it may come from a different board size as long
+        as q_func is board size agnostic (see models.cnn_to_fcn), e.g. to
+        start a 15x15 run from 9x9 weights. Ignored if state_file was loaded.
+    jit: bool
+        if True compile the act and train graphs with XLA JIT. Falls back to
+        the regular graphs if XLA is not available.
+    inference_sync_freq: int or None
+        if set, actions are chosen by an inference only copy of the Q-network
+        in its own session, synced from the training weights every
+        `inference_sync_freq` updates, and gradient steps run on a background
+        thread so that acting and training overlap. The sync lag and the act
+        latency are logged with the training progress.
+    inference_num_cpu: int
+        number of cpus of the inference copy session
+    param_broadcast_name: str or None
+        if set, the Q-network weights are published to the shared memory block
+        of this name (see shared_params.ParamPublisher) so that evaluators,
+        servers and actors in other processes can load them with a
+        ParamSubscriber without going through the disk.
+    param_broadcast_freq: int
+        publish the weights every `param_broadcast_freq` updates
+    data_parallel: data_parallel.Replica or None
+        if set, this process is one replica of a synchronous data parallel run
+        (see deepq/data_parallel.py). Every replica collects its own experience
+        in its own replay buffer, gradients are averaged across replicas at
+        every update and all replicas apply the same update starting from the
+        weights of replica 0. All replicas must call train the same number of
+        times, so callback must not stop a replica early.
+    num_learner_threads: int or None
+        if set, gradient steps run Hogwild style on this many background
+        threads sharing the session and the variables without locking, while
+        the main thread keeps acting. train_freq is then ignored, the threads
+        train as fast as they can from the shared replay buffer, and the
+        target network is updated every target_network_update_freq // train_freq
+        updates counted over all the threads. The threads pause while the
+        model is validated and saved.
+    replay_buffer: ReplayBuffer or None
+        replay buffer to use instead of creating one of buffer_size, e.g. a
+        replay_server.ReplayClient shared with other actors and learners. It
+        must be prioritized if and only if prioritized_replay is True.
+    replay_ratio: float or None
+        if set, updates are paced to keep updates * batch_size / env steps
+        close to this value (see replay_ratio.ReplayRatioController) instead
+        of running one update every train_freq steps. The main loop runs the
+        updates that are due after every env step; with learner threads,
+        the threads wait for experience and acting waits for the threads.
+        The achieved ratio, backlog and waiting times are logged with the
+        training progress.
+    buffer_dir: str or None
+        if set, the replay buffer is stored in memory mapped files in this
+        directory (see replay_buffer.MemmapReplayBuffer) so that buffer_size
+        can exceed the RAM.
+    buffer_hot_size: int or None
+        if set, only the buffer_hot_size most recent transitions are kept
+        uncompressed, older ones are compressed in chunks (see
+        replay_buffer.TieredReplayBuffer). The compression ratio and the
+        sample latency of both tiers are logged with the training progress.
+    snapshot_dir: str or None
+        if set, a full snapshot of the training (all variables including the
+        optimizer slots, the replay buffer, the timestep, the episode stats,
+        the best model so far and the RNG states, see deepq/snapshot.py) is
+        written atomically to this directory every snapshot_freq steps, and
+        training resumes from it if it exists. The replay buffer is not
+        refilled and exploration continues where it stopped.
+    snapshot_freq: int
+        write a snapshot every `snapshot_freq` steps
+    checkpoint_dir: str or None
+        if set, the act function is added every `checkpoint_freq` steps to a
+        checkpoint history in this directory (see
+        common/checkpoint_store.CheckpointStore), stored as periodic full
+        checkpoints and compressed deltas. Any of them can be loaded back
+        with deepq.load(checkpoint_dir, step=...), e.g. for Elo evaluation.
+    puzzle_file: str or None
+        if set, the share of the tactical puzzles of this file (see
+        deepq/puzzles.py) solved by the greedy policy is logged with the
+        training progress, a quick quality signal between validations.
+    self_play_games: int or None
+        if set, env is only used for its spaces: this many self-play games
+        are played at once (see self_play.BatchedSelfPlay), starting from
+        random stones like the training camp envs, and the moves of both
+        colours in all the games are picked with one act call per time
+        step. A time step is then one move in every game, and adds
+        self_play_games transitions to the replay buffer.
 
     Returns
     -------
@@ -209,9 +572,6 @@ def learn(env,
     """
     # Create all the functions necessary to train the model
 
-    sess = U.make_session(num_cpu=num_cpu)
-    sess.__enter__()
-
     def make_obs_ph(name):
         obs_shape = env.observation_space.shape
 
@@ -233,7 +593,9 @@ def learn(env,
         double_q=double_q,
         param_noise=param_noise,
         deterministic_filter=deterministic_filter,
-        random_filter=random_filter
+        random_filter=random_filter,
+        jit=jit,
+        data_parallel=data_parallel is not None
     )
 
     act_params = {
@@ -242,19 +604,47 @@ def learn(env,
         'num_actions': env.action_space.n,
         'random_filter': random_filter,
         'deterministic_filter': deterministic_filter,
+        'jit': jit,
     }
 
+    if num_cpu == 'auto':
+        thread_config = _autotune_threads(env.observation_space.shape, env.action_space.n,
+                                          act, train, batch_size=batch_size)
+        train_inter, train_intra = thread_config['train']
+        act_inter, _ = thread_config['act']
+        # Pool 0 (default) serves train, pool 1 serves act
+        sess = U.make_session(num_cpu=train_inter, intra_op_threads=train_intra,
+                              inter_op_pools=[train_inter, act_inter])
+        act = _in_inter_op_pool(act, 1)
+    else:
+        sess = U.make_session(num_cpu=num_cpu)
+    sess.__enter__()
+
     # Create the replay buffer
     if prioritized_replay:
-        replay_buffer = PrioritizedReplayBuffer(
-            buffer_size, alpha=prioritized_replay_alpha)
+        if replay_buffer is None and buffer_dir is not None:
+            replay_buffer = PrioritizedMemmapReplayBuffer(
+                buffer_size, alpha=prioritized_replay_alpha,
+                obs_shape=env.observation_space.shape, directory=buffer_dir)
+        elif replay_buffer is None and buffer_hot_size is not None:
+            replay_buffer = PrioritizedTieredReplayBuffer(
+                buffer_size, alpha=prioritized_replay_alpha, hot_size=buffer_hot_size)
+        elif replay_buffer is None:
+            replay_buffer = PrioritizedReplayBuffer(
+                buffer_size, alpha=prioritized_replay_alpha)
         if prioritized_replay_beta_iters is None:
             prioritized_replay_beta_iters = max_timesteps
         beta_schedule = LinearSchedule(prioritized_replay_beta_iters,
                                        initial_p=prioritized_replay_beta0,
                                        final_p=1.0)
     else:
-        replay_buffer = ReplayBuffer(buffer_size)
+        if replay_buffer is None and buffer_dir is not None:
+            replay_buffer = MemmapReplayBuffer(
+                buffer_size, env.observation_space.shape, buffer_dir, prefetch_batches=2)
+        elif replay_buffer is None and buffer_hot_size is not None:
+            replay_buffer = TieredReplayBuffer(buffer_size, buffer_hot_size)
+        elif replay_buffer is None:
+            replay_buffer = ReplayBuffer(buffer_size)
         beta_schedule = None
     # Create the schedule for exploration starting from 1.
     exploration = LinearSchedule(schedule_timesteps=int(exploration_fraction * max_timesteps),
@@ -264,32 +654,150 @@ def learn(env,
     # Initialize the parameters and copy them to the target network.
     U.initialize()
 
+    state_loaded = False
     if state_file is not None:
         try:
-            with open(state_file, "rb") as f:
-                model_data, act_params = dill.load(f)
-            with tempfile.TemporaryDirectory() as td:
-                arc_path = os.path.join(td, "packed.zip")
-                with open(arc_path, "wb") as f:
-                    f.write(model_data)
-
-                zipfile.ZipFile(
-                    arc_path, 'r', zipfile.ZIP_DEFLATED).extractall(td)
-                U.load_state(os.path.join(td, "model"))
+            act_params = _load_model_file(state_file)
+            state_loaded = True
             print('Saved model is loaded, training is resume')
         except FileNotFoundError as e:
             print('No model to loaded, training start from scratch')
 
+    if warm_start_file is not None and not state_loaded:
+        _load_model_file(warm_start_file,
+                         var_list=U.scope_vars("deepq/q_func"))
+        print('Q-network is warm started from {}'.format(warm_start_file))
+
+    if num_learner_threads is not None:
+        assert data_parallel is None and inference_sync_freq is None, \
+            "learner threads can not be combined with data parallel or inference copy training"
+
+    if data_parallel is not None:
+        assert snapshot_dir is None, "replicas can not be snapshotted"
+        assert inference_sync_freq is None, \
+            "data parallel updates must run in the main thread"
+        # Start every replica from the weights of replica 0
+        q_func_vars = U.scope_vars("deepq/q_func")
+        allreduce = data_parallel.make_allreduce(
+            int(np.sum([U.numel(v) for v in q_func_vars])))
+        U.SetFromFlat(q_func_vars)(
+            allreduce.broadcast(U.GetFlat(q_func_vars)()))
+        compute_gradients = debug['compute_gradients']
+        apply_gradients = debug['apply_gradients']
+    else:
+        allreduce = None
+
     update_target()
 
+    # Optionally act on a separate copy of the network while the gradient
+    # steps run on a background thread
+    if inference_sync_freq is not None:
+        inference_act = InferenceCopy(
+            act_params, num_cpu=inference_num_cpu, param_noise=param_noise)
+        inference_act.publish(0)
+        trainer = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        rollout_act = inference_act
+    else:
+        inference_act = None
+        trainer = None
+        rollout_act = act
+    num_updates = 0
+    pending_train = None
+
+    if param_broadcast_name is not None:
+        param_publisher = ParamPublisher(
+            U.scope_vars("deepq/q_func"), param_broadcast_name)
+        param_publisher.publish()
+    else:
+        param_publisher = None
+
+    def sample_batch(t):
+        """Sample a batch from the replay buffer, with weights and indexes"""
+        if prioritized_replay:
+            return replay_buffer.sample(batch_size, beta=beta_schedule.value(t))
+        obses_t, actions, rewards, obses_tp1, dones = replay_buffer.sample(
+            batch_size)
+        return obses_t, actions, rewards, obses_tp1, dones, np.ones_like(rewards), None
+
+    def finish_train(train_result, batch_idxes):
+        td_errors, base_error, total_error = train_result
+        if prioritized_replay:
+            new_priorities = np.abs(td_errors) + prioritized_replay_eps
+            replay_buffer.update_priorities(
+                batch_idxes, new_priorities)
+        return base_error, total_error
+
+    def wait_for_trainer(settle=False):
+        """Finish the gradient step running in background, if any, and with
+        settle the target updates and publications queued after it too"""
+        nonlocal pending_train
+        errors = None
+        if pending_train is not None:
+            future, batch_idxes = pending_train
+            pending_train = None
+            errors = finish_train(future.result(), batch_idxes)
+        if settle and trainer is not None:
+            # The trainer runs its jobs in order on one thread
+            trainer.submit(lambda: None).result()
+        return errors
+
+    if replay_ratio is not None:
+        controller = ReplayRatioController(
+            replay_ratio, batch_size, learning_starts=learning_starts,
+            throttle_actors=num_learner_threads is not None)
+        controller.register_queue("replay buffer", lambda: len(replay_buffer))
+    else:
+        controller = None
+
+    if num_learner_threads is not None:
+        def learner_step(env_step):
+            obses_t, actions, rewards, obses_tp1, dones, weights, batch_idxes = sample_batch(
+                env_step)
+            errors = finish_train(train(obses_t, actions, rewards, obses_tp1, dones, weights), batch_idxes)
+            if controller is not None:
+                controller.add_updates()
+            return errors
+
+        periodic = [(max(1, target_network_update_freq // train_freq), update_target)]
+        if param_publisher is not None:
+            periodic.append((param_broadcast_freq, param_publisher.publish))
+        learner = HogwildLearner(
+            sess, learner_step, num_learner_threads, periodic=periodic,
+            ready=None if controller is None else controller.wait_for_experience)
+    else:
+        learner = None
+
     episode_rewards = [0.0]
     saved_mean_reward = None
+    saved_num_lose = None
     saved_num_win = 1
+    saved_num_games = val_max_games
     saved_time_step = None
 
-    opponent = Opponent(flatten_obs=flatten_obs, act=act,
+    opponent = Opponent(flatten_obs=flatten_obs, act=rollout_act,
                         replay_buffer=replay_buffer)
     env.opponent_policy = opponent.policy
+    if val_env is not None:
+        val_envs = [val_env] + [copy.deepcopy(val_env) for _ in range(val_num_envs - 1)]
+    if val_env is not None and val_background:
+        validator = BackgroundValidator(
+            act_params, val_envs, num_episodes=val_max_games, sprt_delta=val_sprt_delta,
+            sprt_error=val_sprt_error, num_cpu=inference_num_cpu)
+    else:
+        validator = None
+
+    puzzles = None if puzzle_file is None else load_puzzles(puzzle_file)
+    if self_play_games is not None:
+        assert not param_noise, "batched self-play does not support parameter space noise"
+        self_play = BatchedSelfPlay(rollout_act, replay_buffer,
+                                    env.observation_space.shape[0], self_play_games)
+    else:
+        self_play = None
+
+    def episodes_reached(freq):
+        """Whether the number of episodes reached a multiple of freq at this step"""
+        return (done and freq is not None and
+                len(episode_rewards) // freq > num_episodes_before // freq)
 
     obs = env.reset()
     reset = True
@@ -299,11 +807,97 @@ def learn(env,
 
     with tempfile.TemporaryDirectory() as td:
         model_saved = False
-        model_file = os.path.join(td, "model")
-        for t in range(max_timesteps):
+        model_file = os.path.join(td, "best.npz")
+        # Saving the best model must not stall acting and training
+        checkpoint_writer = checkpoint.AsyncCheckpointWriter()
+        if checkpoint_dir is not None:
+            checkpoint_store = CheckpointStore(checkpoint_dir)
+            checkpoint_spec = _act_spec(act_params)
+            assert checkpoint_spec is not None, \
+                "checkpoint history needs a q_func from deepq.models"
+            # Deltas are computed and compressed in the background
+            checkpoint_adder = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+            pending_checkpoint = None
+
+        def keep_best(val_t, num_win, num_lose, num_draw, decision, values=None):
+            """Log a validation of the weights of time step val_t and save them
+            if they are the best so far, values are the weights if they are
+            not the current ones"""
+            nonlocal model_saved, saved_time_step, saved_num_win, saved_num_lose, saved_num_games
+            num_games = num_win + num_lose + num_draw
+            if print_freq is not None:
+                logger.record_tabular("win", num_win)
+                logger.record_tabular("lose", num_lose)
+                logger.record_tabular("draw", num_draw)
+                logger.record_tabular("validation games", num_games)
+                if validator is not None:
+                    logger.record_tabular("validation step", val_t)
+                    logger.logkvs(validator.metrics(t))
+                logger.dump_tabular()
+
+            if decision is not None:
+                improved = decision
+            else:
+                # Same or higher win rate
+                improved = num_win * saved_num_games >= saved_num_win * num_games
+            if improved:
+                logger.log("Saving model due to win rate increase or same as before: {}/{} -> {}/{}".format(
+                    saved_num_win, saved_num_games, num_win, num_games))
+                if values is None:
+                    checkpoint_writer.save(model_file, {}, _act_vars())
+                else:
+                    checkpoint_writer.save_values(model_file, {}, values)
+                model_saved = True
+                saved_time_step = val_t
+                saved_num_win = num_win
+                saved_num_lose = num_lose
+                saved_num_games = num_games
+            elif saved_time_step is not None:
+                logger.log("Nothing improve keep saved state at time step {} with num win-lose: {}-{} of {}".format(
+                    saved_time_step, saved_num_win, saved_num_lose, saved_num_games))
+            else:
+                logger.log(
+                    "Nothing improve keep saved state at time step 0")
+
+        start_t = 0
+        if snapshot_dir is not None:
+            snapshot = load_snapshot(
+                snapshot_dir, replay_buffer, best_model_file=model_file)
+            if snapshot is not None:
+                start_t = snapshot["t"]
+                model_saved = snapshot["has_best_model"]
+                (episode_rewards, saved_num_win, saved_num_lose, saved_num_games,
+                 saved_time_step, num_updates) = snapshot["state"]
+                # The episode in progress was lost
+                episode_rewards[-1] = 0.0
+                if inference_act is not None:
+                    inference_act.publish(num_updates)
+                if param_publisher is not None:
+                    param_publisher.publish()
+                logger.log("Resumed training from snapshot at time step {} with {} transitions".format(
+                    start_t, len(replay_buffer)))
+        for t in range(start_t, max_timesteps):
             if callback is not None:
                 if callback(locals(), globals()):
                     break
+            if (checkpoint_dir is not None and t > learning_starts and t % checkpoint_freq == 0 and
+                    (checkpoint_store.latest() is None or t > checkpoint_store.latest())):
+                if pending_checkpoint is not None:
+                    pending_checkpoint.result()
+                pending_checkpoint = checkpoint_adder.submit(
+                    checkpoint_store.add, t, checkpoint_spec, checkpoint.variable_values(_act_vars()))
+            if snapshot_dir is not None and t > start_t and t % snapshot_freq == 0:
+                # Snapshot settled weights
+                wait_for_trainer(settle=True)
+                if learner is not None:
+                    learner.pause()
+                checkpoint_writer.wait()
+                save_snapshot(snapshot_dir, t, replay_buffer,
+                              (episode_rewards, saved_num_win, saved_num_lose, saved_num_games,
+                               saved_time_step, num_updates),
+                              best_model_file=model_file if model_saved else None)
+                if learner is not None:
+                    learner.resume()
             # Take action and update exploration to the newest value
             kwargs = {}
             if not param_noise:
@@ -321,61 +915,100 @@ def learn(env,
                 kwargs['reset'] = reset
                 kwargs['update_param_noise_threshold'] = update_param_noise_threshold
                 kwargs['update_param_noise_scale'] = True
-            # if flatten_obs:
-            #     obs = obs.flatten()
-            action = act(np.array(obs)[None],
-                         update_eps=update_eps, **kwargs)[0]
-            reset = False
-            new_obs, rew, done, _ = env.step(action)
-            # if flatten_obs:
-            #     new_obs = new_obs.flatten()
-            # Store transition in the replay buffer.
-
-            episode_rewards[-1] += rew
-            if done:
-                # Player is black
-                new_obs[:, :, 0] = 0
-                replay_buffer.add(obs, action, rew, new_obs, float(done))
-
-                # Opponent is white
-                new_obs[:, :, 0] = 1
-                if opponent.old_obs is not None:
-                    replay_buffer.add(opponent.old_obs,
-                                      opponent.old_action, -rew, new_obs, float(done))
-                obs = env.reset()
-                opponent.reset()
-
-                episode_rewards.append(0.0)
-                reset = True
+            num_episodes_before = len(episode_rewards)
+            if self_play is not None:
+                # One move in every game, both colours in the same act call
+                for rew in self_play.step(update_eps=update_eps, **kwargs):
+                    episode_rewards[-1] += rew
+                    episode_rewards.append(0.0)
+                done = len(episode_rewards) > num_episodes_before
             else:
-                replay_buffer.add(obs, action, rew, new_obs, float(done))
-                obs = new_obs
-
-            if t > learning_starts and t % train_freq == 0:
-                # Minimize the error in Bellman's equation on a batch sampled from replay buffer.
-                if prioritized_replay:
-                    experience = replay_buffer.sample(
-                        batch_size, beta=beta_schedule.value(t))
-                    (obses_t, actions, rewards, obses_tp1,
-                     dones, weights, batch_idxes) = experience
+                # if flatten_obs:
+                #     obs = obs.flatten()
+                action = rollout_act(np.array(obs)[None],
+                                     update_eps=update_eps, **kwargs)[0]
+                reset = False
+                new_obs, rew, done, _ = env.step(action)
+                # if flatten_obs:
+                #     new_obs = new_obs.flatten()
+                # Store transition in the replay buffer.
+
+                episode_rewards[-1] += rew
+                if done:
+                    # Player is black, opponent is white
+                    _add_final_transitions(replay_buffer, opponent, obs, action, rew, new_obs)
+                    obs = env.reset()
+                    opponent.reset()
+
+                    episode_rewards.append(0.0)
+                    reset = True
                 else:
-                    obses_t, actions, rewards, obses_tp1, dones = replay_buffer.sample(
-                        batch_size)
-                    weights, batch_idxes = np.ones_like(rewards), None
-                td_errors, base_error, total_error = train(obses_t, actions, rewards,
-                                                           obses_tp1, dones, weights)
-                if prioritized_replay:
-                    new_priorities = np.abs(td_errors) + prioritized_replay_eps
-                    replay_buffer.update_priorities(
-                        batch_idxes, new_priorities)
-
-            if t > learning_starts and t % target_network_update_freq == 0:
+                    replay_buffer.add(obs, action, rew, new_obs, float(done))
+                    obs = new_obs
+
+            if controller is not None:
+                # An env step is a move of each colour
+                controller.add_env_steps(1 if self_play is None else self_play.num_games / 2.)
+
+            if learner is not None:
+                learner.set_env_step(t)
+                if t > learning_starts and not learner.started:
+                    learner.start()
+                learner.check()
+                if controller is not None:
+                    # Acting waits while the learner threads are behind
+                    while not controller.wait_for_learner(timeout=1.):
+                        learner.check()
+                num_updates = learner.num_updates
+                if learner.last_errors is not None:
+                    base_error, total_error = learner.last_errors
+            elif t > learning_starts:
+                if controller is not None:
+                    num_train_steps = controller.updates_due()
+                else:
+                    num_train_steps = 1 if t % train_freq == 0 else 0
+                for _ in range(num_train_steps):
+                    # Minimize the error in Bellman's equation on a batch sampled from replay buffer.
+                    (obses_t, actions, rewards, obses_tp1,
+                     dones, weights, batch_idxes) = sample_batch(t)
+                    if allreduce is not None:
+                        td_errors, base_error, total_error, flat_grads = compute_gradients(
+                            obses_t, actions, rewards, obses_tp1, dones, weights)
+                        apply_gradients(allreduce.allreduce_mean(flat_grads))
+                        finish_train((td_errors, base_error,
+                                      total_error), batch_idxes)
+                    elif trainer is not None:
+                        errors = wait_for_trainer()
+                        if errors is not None:
+                            base_error, total_error = errors
+                        pending_train = (trainer.submit(_run_in_session, sess, train, obses_t, actions, rewards,
+                                                        obses_tp1, dones, weights), batch_idxes)
+                    else:
+                        base_error, total_error = finish_train(train(obses_t, actions, rewards,
+                                                                     obses_tp1, dones, weights), batch_idxes)
+                    num_updates += 1
+                    if controller is not None:
+                        controller.add_updates()
+                    if inference_act is not None and num_updates % inference_sync_freq == 0:
+                        trainer.submit(_run_in_session, sess,
+                                       inference_act.publish, num_updates)
+                    if param_publisher is not None and num_updates % param_broadcast_freq == 0:
+                        if trainer is not None:
+                            trainer.submit(_run_in_session, sess,
+                                           param_publisher.publish)
+                        else:
+                            param_publisher.publish()
+
+            if learner is None and t > learning_starts and t % target_network_update_freq == 0:
                 # Update target network periodically.
-                update_target()
+                if trainer is not None:
+                    trainer.submit(_run_in_session, sess, update_target)
+                else:
+                    update_target()
 
             mean_100ep_reward = round(np.mean(episode_rewards[-101:-1]), 1)
             num_episodes = len(episode_rewards)
-            if done and print_freq is not None and len(episode_rewards) % print_freq == 0:
+            if episodes_reached(print_freq):
                 logger.record_tabular(
                     "Execution time", time.time() - start_time)
                 logger.record_tabular(
@@ -391,38 +1024,57 @@ def learn(env,
                     "mean 100 episode reward", mean_100ep_reward)
                 logger.record_tabular(
                     "% time spent exploring", int(100 * exploration.value(t)))
+                if inference_act is not None:
+                    logger.logkvs(inference_act.metrics(num_updates))
+                if model_saved:
+                    logger.logkvs(checkpoint_writer.metrics())
+                if controller is not None:
+                    logger.logkvs(controller.metrics())
+                if isinstance(replay_buffer, TieredReplayBuffer):
+                    logger.logkvs(replay_buffer.stats())
+                if puzzles is not None:
+                    puzzle_start = time.time()
+                    logger.logkvs(score_puzzles(act, puzzles))
+                    logger.record_tabular("puzzles time (s)", time.time() - puzzle_start)
                 logger.dump_tabular()
                 start_time = time.time()
                 start_clock = time.clock()
 
-            if done and val_env is not None and val_freq is not None and len(episode_rewards) % val_freq == 0:
-                num_win, num_lose, num_draw = validate(val_env, act, kwargs)
+            if validator is not None:
+                for report in validator.poll():
+                    keep_best(report.t, report.win, report.lose, report.draw,
+                              report.decision, values=report.values)
+                    if print_freq is not None:
+                        logger.log("Validated time step {} at time step {}, in {:.1f} s".format(
+                            report.t, t, report.duration))
+            if validator is not None and episodes_reached(val_freq):
+                # The weights are copied out, training goes on while they are validated
+                validator.submit(t, checkpoint.variable_values(_act_vars()),
+                                 saved_num_win / saved_num_games)
+            elif val_env is not None and episodes_reached(val_freq):
+                # Validate and save settled weights
+                wait_for_trainer(settle=True)
+                if learner is not None:
+                    learner.pause()
+                if val_sprt_delta is not None:
+                    sprt = SPRT.around(saved_num_win / saved_num_games, val_sprt_delta,
+                                       alpha=val_sprt_error, beta=val_sprt_error)
+                else:
+                    sprt = None
+                num_win, num_lose, num_draw = validate(
+                    val_envs, act, kwargs, num_episodes=val_max_games, sprt=sprt)
                 if print_freq is not None:
                     logger.record_tabular(
                         "Execution time", time.time() - start_time)
                     logger.record_tabular(
                         "Wall-clock time", time.clock() - start_clock)
-                    logger.record_tabular("win", num_win)
-                    logger.record_tabular("lose", num_lose)
-                    logger.record_tabular("draw", num_draw)
-                    logger.dump_tabular()
+                keep_best(t, num_win, num_lose, num_draw,
+                          None if sprt is None else sprt.decision)
+                if print_freq is not None:
                     start_time = time.time()
                     start_clock = time.clock()
-
-                if (num_win >= saved_num_win):
-                    logger.log("Saving model due to num win increase or same as before: {} -> {}".format(
-                        saved_num_win, num_win))
-                    U.save_state(model_file)
-                    model_saved = True
-                    saved_time_step = t
-                    saved_num_win = num_win
-                    saved_num_lose = num_lose
-                elif saved_time_step is not None:
-                    logger.log("Nothing improve keep saved state at time step {} with num win-lose: {}-{}".format(
-                        saved_time_step, saved_num_win, saved_num_lose))
-                else:
-                    logger.log(
-                        "Nothing improve keep saved state at time step 0")
+                if learner is not None:
+                    learner.resume()
                     # if (checkpoint_freq is not None and t > learning_starts and
                     #         num_episodes > 100 and t % checkpoint_freq == 0):
                     #     if saved_mean_reward is None or mean_100ep_reward > saved_mean_reward:
@@ -432,10 +1084,34 @@ def learn(env,
                     #         U.save_state(model_file)
                     #         model_saved = True
                     #         saved_mean_reward = mean_100ep_reward
+        if validator is not None:
+            # Keep the best of the validations still running
+            validator.close()
+            for report in validator.poll():
+                keep_best(report.t, report.win, report.lose, report.draw,
+                          report.decision, values=report.values)
+        if controller is not None:
+            controller.close()
+        if learner is not None:
+            learner.stop()
+        if trainer is not None:
+            wait_for_trainer(settle=True)
+            trainer.shutdown()
+            inference_act.close()
+        if param_publisher is not None:
+            param_publisher.close()
+        if allreduce is not None:
+            allreduce.close()
+        checkpoint_writer.close()
+        if checkpoint_dir is not None:
+            checkpoint_adder.shutdown()
+            if pending_checkpoint is not None:
+                pending_checkpoint.result()
         if model_saved:
             if print_freq is not None:
-                logger.log("Restored model at time step {} with num win-lose: {}-{}".format(
-                    saved_time_step, saved_num_win, saved_num_lose))
-            U.load_state(model_file)
+                logger.log("Restored model at time step {} with num win-lose: {}-{} of {}".format(
+                    saved_time_step, saved_num_win, saved_num_lose, saved_num_games))
+            checkpoint.assign_variables(
+                _act_vars(), checkpoint.read_checkpoint(model_file)[1])
 
     return ActWrapper(act, act_params)
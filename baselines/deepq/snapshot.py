@@ -0,0 +1,128 @@
+"""Resumable training snapshots
+
+A snapshot directory holds one generation directory per snapshot,
+gen-<t>, with
+
+    model.*           every variable, including the optimizer slots
+    best.npz          the best model kept by learn so far, if any
+    replay-<name>.npy the replay buffer contents, one array per field,
+                      loaded memory mapped
+
+and snapshot.pkl, written last with relatively_safe_pickle_dump, which
+holds the name of the current generation, the timestep, the episode stats,
+the RNG states and the small replay buffer state. Writing snapshot.pkl is
+the commit: a job killed while writing a generation resumes from the
+previous one, and older generations are deleted after the commit.
+"""
+import glob
+import os
+import random
+import shutil
+
+import numpy as np
+
+import baselines.common.tf_util as U
+from baselines.common.misc_util import relatively_safe_pickle_dump, pickle_load
+
+_META = "snapshot.pkl"
+
+
+def _fsync(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def save_snapshot(path, t, replay_buffer, state, best_model_file=None):
+    """Write a snapshot of the training state, runs in the default session.
+
+    Parameters
+    ----------
+    path: str
+        snapshot directory
+    t: int
+        timestep to resume from
+    replay_buffer: ReplayBuffer
+        buffer whose contents are saved, skipped if it has no get_state
+        (e.g. a replay_server.ReplayClient, which outlives the learner)
+    state: object
+        picklable training state (episode stats, counters, ...)
+    best_model_file: str or None
+        checkpoint file of the best model so far, copied into the snapshot
+    """
+    generation = "gen-{}".format(t)
+    gen_dir = os.path.join(path, generation)
+    if os.path.exists(gen_dir):
+        shutil.rmtree(gen_dir)
+    os.makedirs(gen_dir)
+
+    U.save_state(os.path.join(gen_dir, "model"))
+    if best_model_file is not None:
+        shutil.copyfile(best_model_file, os.path.join(gen_dir, "best.npz"))
+    if hasattr(replay_buffer, "get_state"):
+        arrays, replay_meta = replay_buffer.get_state()
+        for name, array in arrays.items():
+            np.save(os.path.join(gen_dir, "replay-{}.npy".format(name)), array)
+    else:
+        replay_meta = None
+    for fname in os.listdir(gen_dir):
+        _fsync(os.path.join(gen_dir, fname))
+
+    relatively_safe_pickle_dump({
+        "generation": generation,
+        "t": t,
+        "state": state,
+        "replay": replay_meta,
+        "has_best_model": best_model_file is not None,
+        "rng": (random.getstate(), np.random.get_state()),
+    }, os.path.join(path, _META))
+
+    for old_dir in glob.glob(os.path.join(path, "gen-*")):
+        if old_dir != gen_dir:
+            shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def load_snapshot(path, replay_buffer, best_model_file=None):
+    """Restore the last snapshot written by save_snapshot, if any.
+
+    Restores the variables into the default session, refills the empty
+    replay_buffer and sets the python and numpy RNG states.
+
+    Parameters
+    ----------
+    path: str
+        snapshot directory
+    replay_buffer: ReplayBuffer
+        empty buffer to refill
+    best_model_file: str or None
+        where to copy the best model of the snapshot, if it has one
+
+    Returns
+    -------
+    snapshot: dict or None
+        None if there is no snapshot, otherwise with keys
+            t: timestep to resume from
+            state: the state given to save_snapshot
+            has_best_model: whether best_model_file was written
+    """
+    meta_file = os.path.join(path, _META)
+    if not os.path.exists(meta_file):
+        return None
+    snapshot = pickle_load(meta_file)
+    gen_dir = os.path.join(path, snapshot["generation"])
+
+    U.load_state(os.path.join(gen_dir, "model"))
+    if snapshot["has_best_model"] and best_model_file is not None:
+        shutil.copyfile(os.path.join(gen_dir, "best.npz"), best_model_file)
+    if snapshot["replay"] is not None:
+        arrays = {}
+        for fname in glob.glob(os.path.join(gen_dir, "replay-*.npy")):
+            name = os.path.basename(fname)[len("replay-"):-len(".npy")]
+            arrays[name] = np.load(fname, mmap_mode='r')
+        replay_buffer.set_state(arrays, snapshot["replay"])
+    python_state, numpy_state = snapshot["rng"]
+    random.setstate(python_state)
+    np.random.set_state(numpy_state)
+    return snapshot
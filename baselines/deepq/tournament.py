@@ -0,0 +1,320 @@
+"""Tournaments between checkpoints, ranked with Elo ratings
+
+Players are checkpoint files, or "<directory>@<step>" for a checkpoint of a
+history written by learn(checkpoint_dir=...) (see players_from_paths). A
+match is a number of games between two players on the arena env, a plays
+one colour with the env and b plays the other one as the opponent policy,
+and they swap colours with swap_role after every game. Both models play
+greedily, so the first opening_moves plies of every pair of games are
+random, the same for both colours.
+
+Matches run on a pool of worker processes. A worker loads every model once
+and keeps it, each in a graph and a session of its own (see
+deepq.load(isolated=True)).
+
+Every finished match is appended to a JSON lines results file
+
+    {"round": 0, "a": "...", "b": "...", "a_win": 3, "b_win": 1, "draw": 0}
+
+and a tournament started again with the same results file only plays the
+matches that are missing. Swiss pairings only depend on the results of the
+previous rounds, so they are the same when a tournament is resumed.
+
+Ratings are the maximum likelihood Elo of the Bradley-Terry model, draws
+counted as half a win, with confidence intervals from a bootstrap over the
+games.
+"""
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import zlib
+
+import numpy as np
+
+import adversarial_gym as gym
+from baselines import deepq
+from baselines.common.checkpoint_store import CheckpointStore
+
+# Models loaded by the worker process, by player name
+_models = {}
+_worker_config = {}
+
+
+def players_from_paths(paths):
+    """Player names of checkpoint files and of every step of checkpoint
+    history directories"""
+    players = []
+    for path in paths:
+        if os.path.isdir(path):
+            players.extend("{}@{}".format(path, step) for step in CheckpointStore(path).steps())
+        else:
+            players.append(path)
+    return players
+
+
+def _load_model(player):
+    if player not in _models:
+        path, _, step = player.rpartition("@")
+        if path and os.path.isdir(path):
+            model = deepq.load(path, num_cpu=_worker_config["num_cpu"], step=int(step), isolated=True)
+        else:
+            model = deepq.load(player, num_cpu=_worker_config["num_cpu"], isolated=True)
+        _models[player] = model
+    return _models[player]
+
+
+def _init_worker(board_size, num_cpu, opening_moves):
+    _worker_config.update(board_size=board_size, num_cpu=num_cpu, opening_moves=opening_moves)
+
+
+def _random_move(board_state, rng):
+    empty = np.flatnonzero(np.reshape(board_state, -1) == 0)
+    return int(empty[rng.randint(len(empty))])
+
+
+def play_match(a, b, num_games, seed):
+    """Play num_games between a and b in the worker process
+
+    Returns
+    -------
+    a_win, b_win, draw: int
+    """
+    board_size = _worker_config["board_size"]
+    opening_moves = _worker_config["opening_moves"]
+    act_a, act_b = _load_model(a), _load_model(b)
+    opening_rng = None
+
+    def opponent_policy(curr_state, prev_state, prev_action):
+        if curr_state.board.move < opening_moves:
+            return _random_move(curr_state.board.board_state, opening_rng)
+        return act_b(curr_state.encode()[None], stochastic=False)[0]
+
+    env = gym.make('Gomoku{}x{}-arena-v0'.format(board_size, board_size), opponent_policy)
+    a_win = b_win = 0
+    for i in range(num_games):
+        # The two games of a pair share their opening
+        opening_rng = np.random.RandomState((seed + i // 2) % 2 ** 32)
+        obs = env.reset()
+        while True:
+            if obs[:, :, 1:].sum() < opening_moves:
+                action = _random_move(obs[:, :, 1] + obs[:, :, 2], opening_rng)
+            else:
+                action = act_a(obs[None], stochastic=False)[0]
+            obs, reward, done, _ = env.step(action)
+            if done:
+                if reward == 1.:
+                    a_win += 1
+                elif reward == -1.:
+                    b_win += 1
+                break
+        env.swap_role()
+    return a_win, b_win, num_games - a_win - b_win
+
+
+def _match_seed(round_index, a, b):
+    return zlib.crc32("{}|{}|{}".format(round_index, a, b).encode("utf-8"))
+
+
+def load_results(results_file):
+    """Results of the finished matches, [] if the file does not exist"""
+    if not os.path.exists(results_file):
+        return []
+    results = []
+    with open(results_file) as f:
+        for line in f:
+            # A line cut by a crash is the last one, its match is replayed
+            try:
+                results.append(json.loads(line))
+            except ValueError:
+                break
+    return results
+
+
+def _append_result(results_file, result):
+    with open(results_file, "a") as f:
+        f.write(json.dumps(result, sort_keys=True) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def round_robin_pairings(players):
+    """Every pair of players, in a single round"""
+    return [(a, b) for i, a in enumerate(players) for b in players[i + 1:]]
+
+
+def swiss_pairings(players, results):
+    """Pairings of the next round of a Swiss tournament
+
+    Players are sorted by points per game, and each one is paired with the
+    next unpaired player it has not met yet, or with the next unpaired
+    player if it met all of them. With an odd number of players the last
+    one sits the round out.
+    """
+    points = {player: 0. for player in players}
+    games = {player: 0 for player in players}
+    met = set()
+    for result in results:
+        a, b = result["a"], result["b"]
+        n = result["a_win"] + result["b_win"] + result["draw"]
+        points[a] += result["a_win"] + 0.5 * result["draw"]
+        points[b] += result["b_win"] + 0.5 * result["draw"]
+        games[a] += n
+        games[b] += n
+        met.update([(a, b), (b, a)])
+    ranked = sorted(players, key=lambda p: (-points[p] / max(games[p], 1), players.index(p)))
+    pairings = []
+    while len(ranked) > 1:
+        a = ranked.pop(0)
+        opponents = [p for p in ranked if (a, p) not in met] or ranked
+        b = opponents[0]
+        ranked.remove(b)
+        pairings.append((a, b))
+    return pairings
+
+
+def _game_outcomes(players, results):
+    """Every game as (index of a, index of b, points of a)"""
+    index = {player: i for i, player in enumerate(players)}
+    outcomes = []
+    for result in results:
+        a, b = index[result["a"]], index[result["b"]]
+        outcomes += [(a, b, 1.)] * result["a_win"]
+        outcomes += [(a, b, 0.)] * result["b_win"]
+        outcomes += [(a, b, 0.5)] * result["draw"]
+    return np.array(outcomes, dtype=np.float64).reshape(-1, 3)
+
+
+def _fit_elo(num_players, outcomes, prior, num_iters=10000, tol=1e-10):
+    """Maximum likelihood Elo, by the minorization-maximization iterations
+    of Hunter (2004). Every player also draws prior games against a fixed
+    player of strength 1, which keeps the ratings of players who won or
+    lost every game finite."""
+    a, b, points = outcomes[:, 0].astype(int), outcomes[:, 1].astype(int), outcomes[:, 2]
+    games = np.zeros((num_players, num_players))
+    np.add.at(games, (a, b), 1.)
+    games += games.T
+    score = np.full(num_players, 0.5 * prior)
+    np.add.at(score, a, points)
+    np.add.at(score, b, 1. - points)
+    gamma = np.ones(num_players)
+    for _ in range(num_iters):
+        denominator = (games / (gamma[:, None] + gamma[None, :])).sum(axis=1) + prior / (gamma + 1.)
+        new_gamma = score / denominator
+        converged = np.max(np.abs(np.log(new_gamma / gamma))) < tol
+        gamma = new_gamma
+        if converged:
+            break
+    elo = 400. * np.log10(gamma)
+    return elo - elo.mean()
+
+
+def elo_ratings(players, results, prior=1., num_bootstrap=200, confidence=0.95, seed=0):
+    """Elo ratings of the players, centered on 0
+
+    Parameters
+    ----------
+    players: [str]
+    results: [dict]
+        finished matches, see load_results
+    prior: float
+        number of virtual draws of every player against an average player
+    num_bootstrap: int
+        number of resamplings of the games for the confidence intervals
+    confidence: float
+        confidence level of the intervals
+
+    Returns
+    -------
+    ratings: [dict]
+        one per player, best first, with keys player, elo, lower, upper,
+        games and points
+    """
+    outcomes = _game_outcomes(players, results)
+    elo = _fit_elo(len(players), outcomes, prior)
+    rng = np.random.RandomState(seed)
+    samples = np.array([
+        _fit_elo(len(players), outcomes[rng.randint(len(outcomes), size=len(outcomes))], prior)
+        for _ in range(num_bootstrap if len(outcomes) else 0)]).reshape(-1, len(players))
+    tail = 100. * (1. - confidence) / 2.
+    ratings = []
+    for i, player in enumerate(players):
+        played = (outcomes[:, 0] == i) | (outcomes[:, 1] == i)
+        points = outcomes[outcomes[:, 0] == i, 2].sum() + (1. - outcomes[outcomes[:, 1] == i, 2]).sum()
+        ratings.append({
+            "player": player,
+            "elo": float(elo[i]),
+            "lower": float(np.percentile(samples[:, i], tail)) if len(samples) else float('nan'),
+            "upper": float(np.percentile(samples[:, i], 100. - tail)) if len(samples) else float('nan'),
+            "games": int(played.sum()),
+            "points": float(points),
+        })
+    return sorted(ratings, key=lambda rating: -rating["elo"])
+
+
+def run_tournament(players, results_file, board_size, games_per_match=2, swiss_rounds=None,
+                   num_workers=None, num_cpu=1, opening_moves=2, callback=None):
+    """Play the missing matches of a tournament and return the ratings
+
+    Parameters
+    ----------
+    players: [str]
+        checkpoint files or "<directory>@<step>", see players_from_paths
+    results_file: str
+        JSON lines file the finished matches are appended to, and read
+        back from when the tournament is resumed
+    board_size: int
+        board size of the arena env
+    games_per_match: int
+        number of games of a match, even so that both players play both
+        colours the same number of times
+    swiss_rounds: int or None
+        number of rounds of a Swiss tournament, round-robin if None
+    num_workers: int or None
+        number of worker processes, the number of cpus if None
+    num_cpu: int
+        number of cpus of the session of every model
+    opening_moves: int
+        number of random plies at the start of every game
+    callback: (dict) -> None or None
+        called with every result as soon as its match is finished
+
+    Returns
+    -------
+    ratings: [dict]
+        see elo_ratings
+    """
+    assert games_per_match % 2 == 0, "games_per_match must be even"
+    results = load_results(results_file)
+    num_rounds = 1 if swiss_rounds is None else swiss_rounds
+    executor = concurrent.futures.ProcessPoolExecutor(
+        max_workers=num_workers or multiprocessing.cpu_count(),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker, initargs=(board_size, num_cpu, opening_moves))
+    futures = {}
+    try:
+        for round_index in range(num_rounds):
+            previous = [r for r in results if r["round"] < round_index]
+            if swiss_rounds is None:
+                pairings = round_robin_pairings(players)
+            else:
+                pairings = swiss_pairings(players, previous)
+            done = {(r["a"], r["b"]) for r in results if r["round"] == round_index}
+            futures = {
+                executor.submit(play_match, a, b, games_per_match, _match_seed(round_index, a, b)): (a, b)
+                for a, b in pairings if (a, b) not in done}
+            for future in concurrent.futures.as_completed(futures):
+                a, b = futures[future]
+                a_win, b_win, draw = future.result()
+                result = {"round": round_index, "a": a, "b": b,
+                          "a_win": a_win, "b_win": b_win, "draw": draw}
+                _append_result(results_file, result)
+                results.append(result)
+                if callback is not None:
+                    callback(result)
+    finally:
+        # Do not wait for the matches not started yet after an error
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=True)
+    return elo_ratings(players, results)
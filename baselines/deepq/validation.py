@@ -0,0 +1,306 @@
+"""Validation games against the arena opponent
+
+validate plays its games in lockstep over several env instances: every ply
+it collects the observations of all the games still running and picks
+their moves with one batched act call, instead of one batch-1 call per move
+and per game.
+
+The counts do not depend on the number of envs. Game i is played with the
+colour the first env would have after i swap_role calls, as when the games
+are played one after another, and with its own python and numpy random
+streams seeded with seed + i: the opponent policies draw from the global
+np.random (or from the env RNG, seeded too), and without private streams the
+draws of interleaved games would depend on the order the games are stepped.
+
+With a sequential test (see common/sprt.py) the results are fed to the test
+in game order and validation stops as soon as it is decided, counting only
+the games up to the deciding one, again whatever the number of envs.
+
+BackgroundValidator runs validate on a thread of its own, on an inference
+copy of the Q-network loaded with weight snapshots, so that training never
+waits for validation.
+"""
+import collections
+import random
+import threading
+import time
+
+import numpy as np
+
+from baselines.common.misc_util import LatencyStats
+from baselines.common.sprt import SPRT
+from baselines.deepq.inference import InferenceCopy
+
+
+def _other_color(color):
+    return 'white' if color == 'black' else 'black'
+
+
+def _swap_random_state(state):
+    """Set the python and numpy global random states, return the previous ones"""
+    previous = random.getstate(), np.random.get_state()
+    random.setstate(state[0])
+    np.random.set_state(state[1])
+    return previous
+
+
+def validate(envs, act, kwargs, num_episodes=200, seed=None, sprt=None, private_random=True):
+    """Play up to num_episodes games with the greedy policy of act
+
+    Parameters
+    ----------
+    envs: AdversarialEnv or [AdversarialEnv]
+        arena envs, one game runs on each of them at a time. The first one
+        is left with the colour it would have after one swap_role per
+        counted game
+    act: ActWrapper or act function
+        the model to validate
+    kwargs: dict
+        extra arguments of act
+    num_episodes: int
+        max number of games to play
+    seed: int or None
+        base seed of the random streams of the games, drawn from np.random
+        if None. The same seed gives the same counts for any number of envs,
+        provided act picks the same action for an observation whatever the
+        batch it is in.
+    sprt: sprt.SPRT or None
+        if set, fed whether each game is won, in game order, and validation
+        stops once it is decided
+    private_random: bool
+        give every game its own random streams by swapping the global python
+        and numpy random states. Must be False if other threads draw from
+        them meanwhile, the counts then depend on the number of envs.
+
+    Returns
+    -------
+    win, lose, draw: int
+        number of games won, lost and drawn by the model, their sum is the
+        number of counted games
+    """
+    if not isinstance(envs, (list, tuple)):
+        envs = [envs]
+    if seed is None:
+        seed = np.random.randint(2 ** 31 - num_episodes)
+    first_color = envs[0].player_color
+    rewards = [None] * num_episodes
+    # env index -> [game index, observation, random state of the game]
+    games = {}
+    next_game = 0
+    # Games fed to sprt
+    num_counted = num_episodes if sprt is None else 0
+
+    def start_game(k):
+        nonlocal next_game
+        i = next_game
+        next_game += 1
+        env = envs[k]
+        env.player_color = first_color if i % 2 == 0 else _other_color(first_color)
+        env.seed(seed + i)
+        if not private_random:
+            games[k] = [i, env.reset(), None]
+            return
+        state = (random.Random(seed + i).getstate(),
+                 np.random.RandomState(seed + i).get_state())
+        outer = _swap_random_state(state)
+        try:
+            obs = env.reset()
+        finally:
+            state = _swap_random_state(outer)
+        games[k] = [i, obs, state]
+
+    for k in range(min(len(envs), num_episodes)):
+        start_game(k)
+    while games:
+        running = sorted(games)
+        actions = act(np.stack([games[k][1] for k in running]),
+                      stochastic=False, **kwargs)
+        for k, action in zip(running, actions):
+            i, _, state = games[k]
+            if state is None:
+                obs, reward, done, _ = envs[k].step(action)
+            else:
+                outer = _swap_random_state(state)
+                try:
+                    obs, reward, done, _ = envs[k].step(action)
+                finally:
+                    games[k][2] = _swap_random_state(outer)
+            if done:
+                rewards[i] = reward
+                del games[k]
+                if next_game < num_episodes:
+                    start_game(k)
+            else:
+                games[k][1] = obs
+        if sprt is not None:
+            while (sprt.decision is None and num_counted < num_episodes and
+                   rewards[num_counted] is not None):
+                sprt.update(rewards[num_counted] == 1.)
+                num_counted += 1
+            if sprt.decision is not None:
+                # The games still running are not counted
+                break
+    envs[0].player_color = first_color if num_counted % 2 == 0 else _other_color(first_color)
+
+    rewards = rewards[:num_counted]
+    win_count = sum(1 for reward in rewards if reward == 1.)
+    lose_count = sum(1 for reward in rewards if reward == -1.)
+    return win_count, lose_count, num_counted - win_count - lose_count
+
+
+# t: time step of the validated weights, decision: see SPRT.decision,
+# values: the validated weights by variable name
+ValidationReport = collections.namedtuple(
+    'ValidationReport', ['t', 'win', 'lose', 'draw', 'decision', 'values', 'duration'])
+
+
+class BackgroundValidator(object):
+    def __init__(self, act_params, envs, num_episodes=200, sprt_delta=None, sprt_error=0.05,
+                 num_cpu=1, scope="deepq"):
+        """Validate weight snapshots on a background thread.
+
+        submit hands over a snapshot and returns at once. The thread loads it
+        into an inference copy of the Q-network (see inference.InferenceCopy)
+        and plays the games on its own envs, poll returns the finished
+        reports. A snapshot submitted while another one is waiting replaces
+        it, so validation falls behind by at most one snapshot.
+
+        Must be created while the training graph is the default graph.
+
+        Parameters
+        ----------
+        act_params: dict
+            arguments of build_act, the same as the ones saved by ActWrapper
+        envs: [AdversarialEnv]
+            arena envs, only used by the validation thread
+        num_episodes: int
+            number of games, or max number of games with sprt_delta
+        sprt_delta: float or None
+            if set, every validation is an SPRT of the best win rate given to
+            submit minus sprt_delta against the same rate plus sprt_delta
+        sprt_error: float
+            alpha and beta of the SPRT
+        num_cpu: int
+            number of cpus of the inference copy session
+        scope: str
+            scope of the act and train functions in the training graph
+        """
+        self._act = InferenceCopy(act_params, num_cpu=num_cpu, scope=scope)
+        self._envs = envs
+        self._num_episodes = num_episodes
+        self._sprt_delta = sprt_delta
+        self._sprt_error = sprt_error
+
+        self._cond = threading.Condition()
+        # (t, values, best win rate) waiting for the thread
+        self._pending = None
+        self._reports = []
+        self._running_t = None
+        self._stopped = False
+        self._error = None
+        self._num_dropped = 0
+        self._last_t = None
+        self._duration = LatencyStats()
+        self._thread = threading.Thread(target=self._run, name="validator")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def submit(self, t, values, best_win_rate=None):
+        """Validate a weight snapshot in the background
+
+        Parameters
+        ----------
+        t: int
+            time step of the snapshot, reported back with the results
+        values: {str: np.array}
+            the weights by variable name, see checkpoint.variable_values
+        best_win_rate: float or None
+            win rate of the best model so far, needed with sprt_delta
+        """
+        self.check()
+        with self._cond:
+            if self._pending is not None:
+                self._num_dropped += 1
+            self._pending = (t, values, best_win_rate)
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._stopped:
+                    self._cond.wait()
+                if self._pending is None:
+                    return
+                (t, values, best_win_rate), self._pending = self._pending, None
+                self._running_t = t
+            try:
+                start = time.time()
+                self._act.publish(t, values=values)
+                if self._sprt_delta is not None:
+                    sprt = SPRT.around(best_win_rate, self._sprt_delta,
+                                       alpha=self._sprt_error, beta=self._sprt_error)
+                else:
+                    sprt = None
+                # The training thread keeps drawing from the global random
+                # generators
+                win, lose, draw = validate(self._envs, self._act, {}, num_episodes=self._num_episodes,
+                                           sprt=sprt, private_random=False)
+                duration = time.time() - start
+                self._duration.add(duration)
+                with self._cond:
+                    self._reports.append(ValidationReport(
+                        t, win, lose, draw, None if sprt is None else sprt.decision, values, duration))
+                    self._running_t = None
+            except Exception as e:
+                with self._cond:
+                    self._error = e
+                    self._stopped = True
+                raise
+
+    def check(self):
+        """Re-raise in the calling thread the error that stopped the thread"""
+        if self._error is not None:
+            raise RuntimeError("Background validation failed") from self._error
+
+    def poll(self):
+        """Reports of the validations finished since the last call, oldest first
+
+        Returns
+        -------
+        reports: [ValidationReport]
+        """
+        self.check()
+        with self._cond:
+            reports, self._reports = self._reports, []
+        if reports:
+            self._last_t = reports[-1].t
+        return reports
+
+    def metrics(self, t):
+        """Evaluation lag and duration
+
+        Parameters
+        ----------
+        t: int
+            current time step
+
+        Returns
+        -------
+        metrics: {str: float}
+        """
+        return {
+            "validation lag (steps)": float('nan') if self._last_t is None else t - self._last_t,
+            "validation running step": float('nan') if self._running_t is None else self._running_t,
+            "validation p50 (s)": self._duration.percentile(50),
+            "validation dropped": self._num_dropped,
+        }
+
+    def close(self):
+        """Finish the running and waiting validations and join the thread,
+        their reports are left for poll"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._act.close()
+        self.check()
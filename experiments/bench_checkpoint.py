@@ -0,0 +1,93 @@
+import sys
+sys.path.append('..')
+
+import os
+import tempfile
+import time
+
+import dill
+import numpy as np
+import tensorflow as tf
+
+import baselines.common.tf_util as U
+from baselines import deepq
+from baselines.common import checkpoint
+from baselines.deepq.simple import ActWrapper, _act_vars, _make_board_obs_ph, _restore_model_data
+
+
+def act_params(board_size):
+    return {
+        'make_obs_ph': _make_board_obs_ph(board_size),
+        'q_func': deepq.models.cnn_to_mlp(
+            convs=[(256, 3, 1)] * 8,
+            hiddens=[256]
+        ),
+        'num_actions': board_size * board_size,
+        'random_filter': True,
+        'deterministic_filter': True,
+        'jit': False,
+    }
+
+
+def median_time(f, num_iters):
+    times = []
+    for _ in range(num_iters):
+        start = time.time()
+        f()
+        times.append(time.time() - start)
+    return np.median(times)
+
+
+def load_legacy(path):
+    with open(path, "rb") as f:
+        model_data, _ = dill.load(f)
+    _restore_model_data(model_data)
+
+
+def load_lean(path):
+    _, values = checkpoint.read_checkpoint(path)
+    checkpoint.assign_variables(_act_vars(), values)
+
+
+def benchmark(board_size, num_iters=5):
+    """Save from a training graph, load into an act only graph"""
+    params = act_params(board_size)
+    with tempfile.TemporaryDirectory() as td:
+        legacy_path = os.path.join(td, "model.pkl")
+        lean_path = os.path.join(td, "model.npz")
+
+        with tf.Graph().as_default(), U.make_session(num_cpu=4).as_default():
+            act, _, _, _ = deepq.build_train(
+                optimizer=tf.train.AdamOptimizer(learning_rate=1e-4), gamma=0.99,
+                grad_norm_clipping=10, **params)
+            U.initialize()
+            wrapper = ActWrapper(act, params)
+            legacy_save = median_time(
+                lambda: wrapper.save(legacy_path, legacy=True), num_iters)
+            lean_save = median_time(lambda: wrapper.save(lean_path), num_iters)
+
+        timings = {}
+        for name, path, load in [('legacy', legacy_path, load_legacy), ('lean', lean_path, load_lean)]:
+            with tf.Graph().as_default(), U.make_session(num_cpu=4).as_default():
+                deepq.build_act(**params)
+                U.initialize()
+                # Warm up the page cache so that both formats read from memory
+                load(path)
+                timings[name] = median_time(lambda: load(path), num_iters)
+        sizes = (os.path.getsize(legacy_path), os.path.getsize(lean_path))
+    return (legacy_save, lean_save), (timings['legacy'], timings['lean']), sizes
+
+
+def main():
+    print('{:>6} {:>8} {:>10} {:>10} {:>10}'.format(
+        'board', 'format', 'save (ms)', 'load (ms)', 'size (MB)'))
+    for board_size in [9, 15, 19]:
+        saves, loads, sizes = benchmark(board_size)
+        for i, name in enumerate(['legacy', 'lean']):
+            print('{:>6} {:>8} {:>10.1f} {:>10.1f} {:>10.1f}'.format(
+                '{}x{}'.format(board_size, board_size), name,
+                saves[i] * 1000, loads[i] * 1000, sizes[i] / 2 ** 20))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+import sys
+sys.path.append('..')
+
+import argparse
+import multiprocessing
+import os
+import time
+import numpy as np
+
+from baselines.deepq.data_parallel import Replica
+
+
+def random_obses(batch_size, board_size):
+    """Random but well formed observations: color plane, black and white stones"""
+    cells = np.random.randint(0, 3, size=(batch_size, board_size, board_size))
+    obses = np.zeros((batch_size, board_size, board_size, 3), dtype=np.float32)
+    obses[:, :, :, 1] = cells == 1
+    obses[:, :, :, 2] = cells == 2
+    obses[:, :, :, 0] = np.random.randint(0, 2, size=(batch_size, 1, 1))
+    return obses
+
+
+def replica_updates(replica, board_size, batch_size, num_iters, num_warmup, num_cpu, filters, layers,
+                    result_queue):
+    """Times num_iters data parallel updates (compute, average, apply) of one replica"""
+    import tensorflow as tf
+    import baselines.common.tf_util as U
+    from baselines import deepq
+
+    np.random.seed(replica.rank)
+    model = deepq.models.cnn_to_mlp(
+        convs=[(filters, 3, 1)] * layers,
+        hiddens=[filters]
+    )
+    num_actions = board_size * board_size
+
+    def make_obs_ph(name):
+        return U.BatchInput((board_size, board_size, 3), name=name)
+
+    _, _, _, debug = deepq.build_train(
+        make_obs_ph=make_obs_ph,
+        q_func=model,
+        num_actions=num_actions,
+        optimizer=tf.train.AdamOptimizer(learning_rate=1e-4),
+        gamma=0.99,
+        grad_norm_clipping=10,
+        deterministic_filter=True,
+        random_filter=True,
+        data_parallel=True
+    )
+    q_func_vars = U.scope_vars("deepq/q_func")
+    size = int(np.sum([U.numel(v) for v in q_func_vars]))
+    with U.make_session(num_cpu=num_cpu):
+        U.initialize()
+        allreduce = replica.make_allreduce(size)
+        U.SetFromFlat(q_func_vars)(allreduce.broadcast(
+            U.GetFlat(q_func_vars)() if replica.rank == 0 else None))
+
+        obses_t = random_obses(batch_size, board_size)
+        obses_tp1 = random_obses(batch_size, board_size)
+        actions = np.random.randint(0, num_actions, size=batch_size)
+        rewards = np.random.choice([-1., 0., 1.], size=batch_size).astype(np.float32)
+        dones = (rewards != 0).astype(np.float32)
+        weights = np.ones(batch_size, dtype=np.float32)
+        flat_grads = np.empty(size, dtype=np.float32)
+
+        def update():
+            grads = debug['compute_gradients'](
+                obses_t, actions, rewards, obses_tp1, dones, weights)[-1]
+            debug['apply_gradients'](allreduce.allreduce_mean(grads, out=flat_grads))
+
+        for _ in range(num_warmup):
+            update()
+        start = time.time()
+        for _ in range(num_iters):
+            update()
+        update_time = (time.time() - start) / num_iters
+
+        # The replicas must end up with the same weights
+        weights_sum = float(np.sum(U.GetFlat(q_func_vars)(), dtype=np.float64))
+        allreduce.close()
+    result_queue.put((replica.rank, update_time, weights_sum))
+
+
+def benchmark(num_workers, board_size=9, batch_size=32, num_iters=50, num_warmup=5, filters=256, layers=8):
+    num_cpu = max(1, multiprocessing.cpu_count() // num_workers)
+    ctx = multiprocessing.get_context('spawn')
+    barrier = ctx.Barrier(num_workers)
+    result_queue = ctx.Queue()
+    name = 'bench_allreduce_{}_{}'.format(os.getpid(), num_workers)
+    processes = []
+    for rank in range(num_workers):
+        process = ctx.Process(target=replica_updates, args=(
+            Replica(rank, num_workers, barrier, name), board_size, batch_size,
+            num_iters, num_warmup, num_cpu, filters, layers, result_queue))
+        process.start()
+        processes.append(process)
+    results = [result_queue.get() for _ in range(num_workers)]
+    for process in processes:
+        process.join()
+
+    update_time = max(update_time for _, update_time, _ in results)
+    assert len(set(weights_sum for _, _, weights_sum in results)) == 1, \
+        "replicas diverged"
+    return update_time, num_workers * batch_size / update_time
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Time synchronous data parallel updates for several numbers of replicas',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--board-size', type=int, default=9)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--num-iters', type=int, default=50)
+    parser.add_argument('--num-warmup', type=int, default=5)
+    parser.add_argument('--filters', type=int, default=256, help='filters of every conv layer and hidden units')
+    parser.add_argument('--layers', type=int, default=8, help='number of conv layers')
+    args = parser.parse_args()
+
+    print('{:>8} {:>16} {:>16} {:>10}'.format(
+        'workers', 'update (ms)', 'samples / s', 'speedup'))
+    base_throughput = None
+    for num_workers in args.workers:
+        update_time, throughput = benchmark(
+            num_workers, board_size=args.board_size, batch_size=args.batch_size, num_iters=args.num_iters,
+            num_warmup=args.num_warmup, filters=args.filters, layers=args.layers)
+        if base_throughput is None:
+            base_throughput = throughput
+        print('{:>8} {:>16.3f} {:>16.1f} {:>10.2f}'.format(
+            num_workers, update_time * 1000, throughput, throughput / base_throughput))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import sys
+sys.path.append('..')
+
+import time
+import numpy as np
+import tensorflow as tf
+
+import baselines.common.tf_util as U
+from baselines import deepq
+
+
+def random_obses(batch_size, board_size):
+    """Random but well formed observations: color plane, black and white stones"""
+    cells = np.random.randint(0, 3, size=(batch_size, board_size, board_size))
+    obses = np.zeros((batch_size, board_size, board_size, 3), dtype=np.float32)
+    obses[:, :, :, 1] = cells == 1
+    obses[:, :, :, 2] = cells == 2
+    obses[:, :, :, 0] = np.random.randint(0, 2, size=(batch_size, 1, 1))
+    return obses
+
+
+def time_per_call(f, num_iters, num_warmup=10):
+    for _ in range(num_warmup):
+        f()
+    start = time.time()
+    for _ in range(num_iters):
+        f()
+    return (time.time() - start) / num_iters
+
+
+def benchmark(board_size, jit, batch_size=64, num_iters=100, num_cpu=16):
+    U.reset()
+    model = deepq.models.cnn_to_mlp(
+        convs=[(256, 3, 1)] * 8,
+        hiddens=[256]
+    )
+    num_actions = board_size * board_size
+
+    def make_obs_ph(name):
+        return U.BatchInput((board_size, board_size, 3), name=name)
+
+    act, train, _, _ = deepq.build_train(
+        make_obs_ph=make_obs_ph,
+        q_func=model,
+        num_actions=num_actions,
+        optimizer=tf.train.AdamOptimizer(learning_rate=1e-4),
+        gamma=0.99,
+        grad_norm_clipping=10,
+        deterministic_filter=True,
+        random_filter=True,
+        jit=jit
+    )
+    with U.make_session(num_cpu=num_cpu):
+        U.initialize()
+        obs = random_obses(1, board_size)
+        obses_t = random_obses(batch_size, board_size)
+        obses_tp1 = random_obses(batch_size, board_size)
+        actions = np.random.randint(0, num_actions, size=batch_size)
+        rewards = np.zeros(batch_size, dtype=np.float32)
+        dones = np.zeros(batch_size, dtype=np.float32)
+        weights = np.ones(batch_size, dtype=np.float32)
+
+        act_time = time_per_call(
+            lambda: act(obs, update_eps=0.1), num_iters)
+        train_time = time_per_call(
+            lambda: train(obses_t, actions, rewards, obses_tp1, dones, weights), num_iters)
+    return act_time, train_time
+
+
+def main():
+    print('{:>6} {:>5} {:>14} {:>16}'.format(
+        'board', 'jit', 'act (ms)', 'train step (ms)'))
+    for board_size in [9, 15]:
+        for jit in [False, True]:
+            act_time, train_time = benchmark(board_size, jit)
+            print('{:>6} {:>5} {:>14.3f} {:>16.3f}'.format(
+                '{}x{}'.format(board_size, board_size), str(jit),
+                act_time * 1000, train_time * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+import sys
+sys.path.append('..')
+
+import time
+import numpy as np
+
+import adversarial_gym as gym
+import baselines.common.tf_util as U
+from baselines import deepq
+from baselines.deepq.validation import validate
+
+
+def val_opponent_policy(curr_state, prev_state, prev_action):
+    return gym.gym_gomoku.envs.util.make_beginner_policy(np.random)(curr_state, prev_state, prev_action)
+
+
+def make_val_env(board_size):
+    return gym.make('Gomoku{}x{}-arena-v0'.format(board_size, board_size), val_opponent_policy)
+
+
+def benchmark(board_size, num_envs_list, num_episodes=200, seed=0, num_cpu=16):
+    """Validate an untrained model one game at a time, then in lockstep"""
+    U.reset()
+
+    def make_obs_ph(name):
+        return U.BatchInput((board_size, board_size, 3), name=name)
+
+    act = deepq.build_act(
+        make_obs_ph=make_obs_ph,
+        q_func=deepq.models.cnn_to_mlp(
+            convs=[(256, 3, 1)] * 8,
+            hiddens=[256]
+        ),
+        num_actions=board_size * board_size,
+        deterministic_filter=True,
+        random_filter=True
+    )
+    results = []
+    with U.make_session(num_cpu=num_cpu):
+        U.initialize()
+        for num_envs in num_envs_list:
+            envs = [make_val_env(board_size) for _ in range(num_envs)]
+            start = time.time()
+            counts = validate(envs, act, {}, num_episodes=num_episodes, seed=seed)
+            results.append((num_envs, counts, time.time() - start))
+    return results
+
+
+def main():
+    print('{:>6} {:>6} {:>16} {:>10} {:>8}'.format(
+        'board', 'envs', 'win/lose/draw', 'time (s)', 'speedup'))
+    for board_size in [9, 15]:
+        results = benchmark(board_size, [1, 10, 50, 200])
+        _, sequential_counts, sequential_time = results[0]
+        for num_envs, counts, elapsed in results:
+            assert counts == sequential_counts, \
+                'lockstep counts {} differ from sequential {}'.format(counts, sequential_counts)
+            print('{:>6} {:>6} {:>16} {:>10.1f} {:>8.1f}'.format(
+                '{}x{}'.format(board_size, board_size), num_envs,
+                '{}/{}/{}'.format(*counts), elapsed, sequential_time / elapsed))
+
+
+if __name__ == '__main__':
+    main()
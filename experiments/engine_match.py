@@ -0,0 +1,43 @@
+import sys
+sys.path.append('..')
+
+import argparse
+import json
+import shlex
+
+from baselines.deepq.engine_arena import play_engines
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Play a match between two engines speaking the line protocol of main.py',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('engine_a', help='command line of the first engine, e.g. "python main.py --serve"')
+    parser.add_argument('engine_b', help='command line of the second engine')
+    parser.add_argument('--names', nargs=2, default=['a', 'b'], help='names of the engines')
+    parser.add_argument('--board-size', type=int, required=True)
+    parser.add_argument('--games', type=int, default=100, help='number of games, even')
+    parser.add_argument('--move-time', type=float, default=1., help='seconds per move')
+    parser.add_argument('--start-time', type=float, default=30.,
+                        help='seconds for the first move of a new engine process')
+    parser.add_argument('--processes', type=int, default=4, help='processes of each engine')
+    parser.add_argument('--concurrency', type=int, default=32, help='games played at once')
+    parser.add_argument('--opening-moves', type=int, default=2, help='random plies at the start of every game')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--verbose', action='store_true', help='print every game')
+    args = parser.parse_args()
+
+    def print_game(game):
+        print('game {game}: {black} (black) - {white} (white), winner {winner}, {reason} after {moves} moves'.format(
+            **game))
+
+    result = play_engines(
+        (args.names[0], shlex.split(args.engine_a)), (args.names[1], shlex.split(args.engine_b)),
+        args.board_size, args.games, num_processes=args.processes, start_time=args.start_time,
+        move_time=args.move_time, concurrency=args.concurrency, opening_moves=args.opening_moves,
+        seed=args.seed, callback=print_game if args.verbose else None)
+    print(json.dumps(result, indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
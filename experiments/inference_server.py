@@ -0,0 +1,45 @@
+import sys
+sys.path.append('..')
+
+import argparse
+import asyncio
+import json
+
+from baselines import deepq
+from baselines.deepq.inference_server import InferenceServer
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Serve the moves of a model to many concurrent games, in micro-batches',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('model', help='model saved by deepq.learn, or a checkpoint history directory')
+    parser.add_argument('--board-size', type=int, required=True)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7007)
+    parser.add_argument('--unix', default=None, help='listen on this Unix socket instead of TCP')
+    parser.add_argument('--window-ms', type=float, default=2., help='ms to wait for more requests after the first one')
+    parser.add_argument('--max-batch', type=int, default=64, help='requests evaluated in one call at most')
+    parser.add_argument('--num-cpu', type=int, default=4)
+    parser.add_argument('--report-every', type=float, default=10., help='seconds between two metrics reports')
+    args = parser.parse_args()
+
+    act = deepq.load(args.model, num_cpu=args.num_cpu, board_size=args.board_size, isolated=True)
+    server = InferenceServer(act, args.board_size, window=args.window_ms / 1000., max_batch_size=args.max_batch)
+
+    async def serve():
+        async with await server.start(host=args.host, port=args.port, path=args.unix):
+            print('listening on {}'.format(args.unix or '{}:{}'.format(args.host, args.port)))
+            while True:
+                await asyncio.sleep(args.report_every)
+                print(json.dumps(server.metrics(), sort_keys=True))
+                sys.stdout.flush()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
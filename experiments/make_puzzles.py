@@ -0,0 +1,40 @@
+import sys
+sys.path.append('..')
+
+import argparse
+import time
+
+from baselines import deepq
+from baselines.deepq.puzzles import generate_puzzles, save_puzzles, load_puzzles, score_puzzles
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Generate a tactical puzzle file, or score a model on one',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('puzzle_file')
+    parser.add_argument('--board-size', type=int, default=15)
+    parser.add_argument('--num-puzzles', type=int, default=3000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--model', default=None,
+                        help='score this model on the existing puzzle file instead of generating it')
+    args = parser.parse_args()
+
+    if args.model is None:
+        start = time.time()
+        save_puzzles(args.puzzle_file, generate_puzzles(args.board_size, args.num_puzzles, seed=args.seed))
+        print('Generated {} puzzles in {:.1f} s'.format(args.num_puzzles, time.time() - start))
+        return
+    puzzles = load_puzzles(args.puzzle_file)
+    act = deepq.load(args.model)
+    # The first call builds the kernels
+    score_puzzles(act, puzzles)
+    start = time.time()
+    scores = score_puzzles(act, puzzles)
+    for name, score in sorted(scores.items()):
+        print('{:>24} {:>6.1%}'.format(name, score))
+    print('Scored {} puzzles in {:.0f} ms'.format(len(puzzles.kinds), (time.time() - start) * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+import sys
+sys.path.append('..')
+
+import argparse
+
+from baselines.deepq.tournament import players_from_paths, run_tournament
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Rank checkpoints with a round-robin or Swiss tournament',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('checkpoints', nargs='+',
+                        help='checkpoint files, or checkpoint history directories (every step plays)')
+    parser.add_argument('--board-size', type=int, required=True)
+    parser.add_argument('--results', required=True,
+                        help='JSON lines file of the match results, the tournament resumes from it')
+    parser.add_argument('--games', type=int, default=2, help='games per match, even')
+    parser.add_argument('--swiss-rounds', type=int, default=None,
+                        help='play a Swiss tournament of this many rounds instead of a round-robin')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes')
+    parser.add_argument('--num-cpu', type=int, default=1, help='cpus of the session of every model')
+    parser.add_argument('--opening-moves', type=int, default=2, help='random plies at the start of every game')
+    args = parser.parse_args()
+
+    players = players_from_paths(args.checkpoints)
+
+    def print_result(result):
+        print('round {round}: {a} {a_win} - {b_win} {b} ({draw} draws)'.format(**result))
+
+    ratings = run_tournament(
+        players, args.results, args.board_size, games_per_match=args.games,
+        swiss_rounds=args.swiss_rounds, num_workers=args.workers, num_cpu=args.num_cpu,
+        opening_moves=args.opening_moves, callback=print_result)
+
+    print('{:>4} {:>8} {:>17} {:>6} {:>7}  {}'.format('rank', 'elo', '95% interval', 'games', 'points', 'player'))
+    for rank, rating in enumerate(ratings, 1):
+        print('{:>4} {:>8.1f} {:>17} {:>6} {:>7.1f}  {}'.format(
+            rank, rating['elo'], '[{:.1f}, {:.1f}]'.format(rating['lower'], rating['upper']),
+            rating['games'], rating['points'], rating['player']))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,12 @@
 import sys
 import json
+import contextlib
+import time
+import argparse
 import numpy as np
 
+EMPTY = 0
+
 
 def read_input() -> str:
     lines = sys.stdin.readlines()
@@ -9,21 +14,123 @@ def read_input() -> str:
     return json.loads(lines[0])
 
 
-def main():
-    empty = '0'
+def random_move(board: np.ndarray) -> int:
+    empty = np.flatnonzero(board == EMPTY)
+    return int(empty[np.random.randint(len(empty))])
+
+
+class ModelPlayer(object):
+    def __init__(self, path, board_size=None, num_cpu=1):
+        '''Greedy moves of a model saved by deepq.learn, loaded once'''
+        from baselines import deepq
+        from adversarial_gym.gym_gomoku.envs.util import encode_boards
+        # stdout carries the answers, anything printed while loading goes to stderr
+        with contextlib.redirect_stdout(sys.stderr):
+            self._act = deepq.load(path, num_cpu=num_cpu, board_size=board_size)
+        self._encode_boards = encode_boards
+        self._num_actions = self._act._act_params['num_actions']
+
+    def move(self, board, color, q_values=False):
+        if len(board) != self._num_actions:
+            raise ValueError('the model plays on boards of {} intersections'.format(self._num_actions))
+        size = int(round(np.sqrt(len(board))))
+        obs = self._encode_boards(board.reshape(1, size, size), [color])
+        move = int(self._act(obs, stochastic=False)[0])
+        if not q_values:
+            return move, None
+        return move, self._act.q_values(obs)[0].tolist()
+
+
+class RandomPlayer(object):
+    def move(self, board, color, q_values=False):
+        return random_move(board), None
+
 
-    my_input = read_input()
-    num_empty_square = my_input.count(empty)
-    empty_move_idx = np.random.randint(num_empty_square)
+def answer_request(player, request):
+    '''Answer line of a request of serve, raises ValueError, KeyError,
+    TypeError or AttributeError if it is malformed'''
+    from adversarial_gym.gym_gomoku.envs.util import parse_move_request
+    board, color = parse_move_request(request)
+    if not isinstance(request, dict):
+        move, _ = player.move(board, color)
+        return str(move)
+    move, q_values = player.move(board, color, q_values=request.get('q_values', False))
+    answer = {'move': move}
+    if q_values is not None:
+        answer['q_values'] = q_values
+    return json.dumps(answer)
+
+
+def serve(player, report_every=1000, stdin=sys.stdin, stdout=sys.stdout, stderr=sys.stderr):
+    '''Answer move requests, one JSON value per line, until stdin is closed
+
+    A request is either the board string alone, as in the one-shot mode, and
+    the answer is the move index alone, or an object
+        {"board": "0102...", "color": "black", "q_values": true}
+    where color (the side to move) and q_values are optional, answered with
+        {"move": 12, "q_values": [...]}
+    A malformed request is answered with {"error": "..."} and the server
+    goes on.
+    Moves per second and the latency percentiles of the last requests go to
+    stderr every report_every requests, and when stdin is closed.
+    '''
+    latencies = []
+    start = time.time()
+    num_moves = 0
+
+    def report():
+        elapsed = time.time() - start
+        stderr.write('{} moves, {:.1f} moves/s, latency p50 {:.3f} ms p99 {:.3f} ms\n'.format(
+            num_moves, num_moves / max(elapsed, 1e-9),
+            np.percentile(latencies, 50) * 1000 if latencies else float('nan'),
+            np.percentile(latencies, 99) * 1000 if latencies else float('nan')))
+        stderr.flush()
+
+    for line in stdin:
+        if not line.strip():
+            continue
+        request_start = time.time()
+        try:
+            stdout.write(answer_request(player, json.loads(line)) + '\n')
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            # A malformed request must not bring the server down
+            stdout.write(json.dumps({'error': 'invalid request: {}'.format(e)}) + '\n')
+        stdout.flush()
+        num_moves += 1
+        latencies.append(time.time() - request_start)
+        if num_moves % report_every == 0:
+            report()
+            # Percentiles of the last report_every moves
+            latencies = []
+    if latencies:
+        report()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Gomoku engine: reads a JSON board string, prints a move index')
+    parser.add_argument('--serve', action='store_true',
+                        help='keep answering requests, one JSON value per line, until stdin is closed')
+    parser.add_argument('--model', default=None,
+                        help='model saved by deepq.learn, random moves if not given (with --serve)')
+    parser.add_argument('--board-size', type=int, default=None,
+                        help='board size to build the model for, if it is not the one it was trained on')
+    parser.add_argument('--num-cpu', type=int, default=1)
+    parser.add_argument('--report-every', type=int, default=1000,
+                        help='requests between two reports of the speed on stderr')
+    args = parser.parse_args()
 
-    empty_square_count = -1
-    for square_idx in range(0, len(my_input)):
-        empty_square_count += (my_input[square_idx] == empty)
-        if empty_square_count == empty_move_idx:
-            my_output = square_idx
-            break
+    if not args.serve:
+        from adversarial_gym.gym_gomoku.envs.util import parse_move_request
+        board, _ = parse_move_request(read_input())
+        print(random_move(board))
+        return
 
-    print(my_output)
+    if args.model is None:
+        player = RandomPlayer()
+    else:
+        player = ModelPlayer(args.model, board_size=args.board_size, num_cpu=args.num_cpu)
+    serve(player, report_every=args.report_every)
 
 
 if __name__ == "__main__":
@@ -50,6 +50,7 @@ def train(board_size, max_timesteps):
         exploration_final_eps=0.35,
         train_freq=1,
         val_freq=1000,
+        val_num_envs=50,
         print_freq=100,
         learning_starts=10000,
         # learning_starts=32,
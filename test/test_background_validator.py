@@ -0,0 +1,76 @@
+import sys
+sys.path.append('..')
+
+import os
+import tempfile
+import time
+
+import numpy as np
+import tensorflow as tf
+
+import adversarial_gym as gym
+import baselines.common.tf_util as U
+from baselines import deepq
+from baselines.common import checkpoint
+from baselines.deepq.simple import _act_spec, _act_vars, _make_board_obs_ph
+from baselines.deepq.validation import BackgroundValidator
+from test_learn_best_model import beginner_policy, learn_and_restore
+
+
+def validate_and_keep(num_games=4):
+    '''
+    Submit a snapshot to BackgroundValidator, poll its report and save the
+    validated weights the way keep_best does, then load them back
+    '''
+    params = {
+        'make_obs_ph': _make_board_obs_ph(5),
+        'q_func': deepq.models.cnn_to_mlp(convs=[(8, 3, 1)], hiddens=[16]),
+        'num_actions': 25,
+        'random_filter': True,
+        'deterministic_filter': True,
+        'jit': False,
+    }
+    envs = [gym.make('Gomoku5x5-arena-v0', beginner_policy) for _ in range(2)]
+    with tempfile.TemporaryDirectory() as td:
+        path = os.path.join(td, 'best.npz')
+        with tf.Graph().as_default(), U.make_session(num_cpu=1).as_default():
+            act, _, _, _ = deepq.build_train(
+                optimizer=tf.train.AdamOptimizer(learning_rate=1e-4), gamma=0.99, **params)
+            U.initialize()
+            act(np.zeros((1, 5, 5, 3)), update_eps=0.25)
+            validator = BackgroundValidator(params, envs, num_episodes=num_games)
+            snapshot = checkpoint.variable_values(_act_vars())
+            validator.submit(7, snapshot)
+            reports = []
+            deadline = time.time() + 60
+            while not reports:
+                assert time.time() < deadline, 'no validation report'
+                time.sleep(0.05)
+                reports = validator.poll()
+            validator.close()
+        report, = reports
+        assert report.t == 7
+        assert report.win + report.lose + report.draw == num_games
+
+        writer = checkpoint.AsyncCheckpointWriter()
+        writer.save_values(path, _act_spec(params), report.values)
+        writer.close()
+
+        loaded = deepq.load(path, num_cpu=1, isolated=True)
+        with loaded._scope():
+            actual = checkpoint.variable_values(_act_vars())
+    assert sorted(actual) == sorted(snapshot)
+    for name, value in snapshot.items():
+        assert actual[name].shape == value.shape and np.array_equal(actual[name], value), name
+    assert np.isclose(actual['deepq/eps:0'], 0.25)
+
+
+def main():
+    validate_and_keep()
+    # The best model of the background validations is restored at the end
+    learn_and_restore(val_background=True)
+    print('ok')
+
+
+if __name__ == "__main__":
+    main()
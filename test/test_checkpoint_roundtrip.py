@@ -0,0 +1,67 @@
+import sys
+sys.path.append('..')
+
+import os
+import tempfile
+
+import numpy as np
+import tensorflow as tf
+
+import baselines.common.tf_util as U
+from baselines import deepq
+from baselines.common import checkpoint
+from baselines.deepq.simple import ActWrapper, _act_vars, _make_board_obs_ph
+
+
+def main():
+    '''
+    Save a lean checkpoint and load it back with deepq.load: every act
+    variable, the scalar exploration rate included, comes back with its
+    shape and value
+    '''
+    params = {
+        'make_obs_ph': _make_board_obs_ph(5),
+        'q_func': deepq.models.cnn_to_mlp(convs=[(8, 3, 1)], hiddens=[16]),
+        'num_actions': 25,
+        'random_filter': True,
+        'deterministic_filter': True,
+        'jit': False,
+    }
+    with tempfile.TemporaryDirectory() as td:
+        path = os.path.join(td, 'model.npz')
+        with tf.Graph().as_default(), U.make_session(num_cpu=1).as_default():
+            act, _, _, _ = deepq.build_train(
+                optimizer=tf.train.AdamOptimizer(learning_rate=1e-4), gamma=0.99, **params)
+            U.initialize()
+            act(np.zeros((1, 5, 5, 3)), update_eps=0.25)
+            ActWrapper(act, params).save(path)
+            expected = checkpoint.variable_values(_act_vars())
+        assert expected['deepq/eps:0'].shape == ()
+
+        _, values = checkpoint.read_checkpoint(path)
+        assert values['deepq/eps:0'].shape == ()
+
+        loaded = deepq.load(path, num_cpu=1, isolated=True)
+        with loaded._scope():
+            graph = tf.get_default_graph()
+            actual = checkpoint.variable_values(_act_vars())
+            # Loading again reuses the assign ops
+            num_ops = len(graph.get_operations())
+            checkpoint.assign_variables(_act_vars(), values)
+            assert len(graph.get_operations()) == num_ops
+        assert sorted(actual) == sorted(expected)
+        for name, value in expected.items():
+            assert actual[name].shape == value.shape and np.array_equal(actual[name], value), name
+        assert np.isclose(actual['deepq/eps:0'], 0.25)
+
+        # Autotuning the threads times the act function of the model graph,
+        # it only adds the initializer of the candidate sessions
+        tuned = deepq.load(path, num_cpu='auto', isolated=True)
+        tuned_ops = {op.name for op in tuned._sess.graph.get_operations()}
+        loaded_ops = {op.name for op in loaded._sess.graph.get_operations()}
+        assert tuned_ops - loaded_ops == {'init'} and not loaded_ops - tuned_ops
+    print('ok')
+
+
+if __name__ == "__main__":
+    main()
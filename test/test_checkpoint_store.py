@@ -0,0 +1,45 @@
+import sys
+sys.path.append('..')
+
+import tempfile
+import time
+
+import numpy as np
+
+from baselines.common.checkpoint_store import CheckpointStore
+
+
+def main():
+    # Same variable sizes as the 8x256 conv tower on 15x15
+    shapes = {'deepq/q_func/convnet/Conv{}/weights:0'.format(i): (3, 3, 3 if i == 0 else 256, 256)
+              for i in range(8)}
+    shapes['deepq/q_func/action_value/fully_connected/weights:0'] = (15 * 15 * 256, 256)
+    shapes['deepq/eps:0'] = ()
+    values = {name: np.random.normal(0, 0.05, size=shape).astype(np.float32)
+              for name, shape in shapes.items()}
+    history = []
+    with tempfile.TemporaryDirectory() as td:
+        store = CheckpointStore(td, full_every=5)
+        for step in range(1000, 13000, 1000):
+            # Small training updates between checkpoints
+            values = {name: value + np.random.normal(0, 1e-4, size=value.shape).astype(np.float32)
+                      for name, value in values.items()}
+            store.add(step, {'model': 'test'}, values)
+            history.append((step, values))
+        print(store.stats())
+
+        # Random access, with a fresh store reading the index back
+        store = CheckpointStore(td)
+        for step, expected in reversed(history):
+            start = time.time()
+            spec, rebuilt = store.get(step)
+            assert spec == {'model': 'test'}
+            for name, value in expected.items():
+                assert rebuilt[name].shape == value.shape, name
+                assert np.array_equal(value.view(np.uint32), rebuilt[name].view(np.uint32))
+            print('step {}: rebuilt in {:.1f} ms'.format(step, (time.time() - start) * 1000))
+    print('ok')
+
+
+if __name__ == "__main__":
+    main()
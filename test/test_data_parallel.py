@@ -0,0 +1,40 @@
+import sys
+sys.path.append('..')
+
+import functools
+import os
+import tempfile
+
+import numpy as np
+
+import adversarial_gym as gym
+from baselines import deepq
+from baselines.deepq import data_parallel
+
+
+def main():
+    '''
+    Train two data parallel replicas for a few hundred steps, averaging
+    their gradients through shared memory, and load the saved model
+    '''
+    with tempfile.TemporaryDirectory() as td:
+        save_path = os.path.join(td, 'model.npz')
+        wall_times = data_parallel.learn(
+            num_workers=2,
+            make_env=functools.partial(gym.make, 'Gomoku5x5-training-camp-v0'),
+            make_q_func=functools.partial(deepq.models.cnn_to_mlp, convs=[(8, 3, 1)], hiddens=[16]),
+            save_path=save_path,
+            max_timesteps=300,
+            learning_starts=100,
+            buffer_size=1000,
+            batch_size=16,
+            print_freq=None,
+            num_cpu=1)
+        assert len(wall_times) == 2 and all(wall_time > 0 for wall_time in wall_times)
+        act = deepq.load(save_path, num_cpu=1, isolated=True)
+        assert act.q_values(np.zeros((1, 5, 5, 3))).shape == (1, 25)
+    print('ok')
+
+
+if __name__ == "__main__":
+    main()
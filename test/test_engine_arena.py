@@ -0,0 +1,48 @@
+import sys
+sys.path.append('..')
+
+import os
+import tempfile
+
+from baselines.deepq.engine_arena import play_engines
+
+ENGINE = '''
+import json
+import random
+import sys
+import time
+
+flaky = len(sys.argv) > 1
+for line in sys.stdin:
+    board = json.loads(line)
+    if flaky and random.random() < 0.02:
+        sys.exit(1)
+    if flaky and random.random() < 0.02:
+        time.sleep(1.)
+    empty = [i for i, v in enumerate(board) if v == '0']
+    print(random.choice(empty))
+    sys.stdout.flush()
+'''
+
+
+def main():
+    '''
+    A random engine against a random engine that sometimes crashes or times
+    out: every game is played, and the crashed engines are restarted
+    '''
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'engine.py')
+        with open(path, 'w') as f:
+            f.write(ENGINE)
+        result = play_engines(('random', [sys.executable, path]),
+                              ('flaky', [sys.executable, path, 'flaky']),
+                              board_size=9, num_games=40, num_processes=4,
+                              move_time=0.2, concurrency=20, start_time=5.)
+    print(result)
+    assert result['a_win'] + result['b_win'] + result['draw'] == 40
+    assert result['b']['restarts'] == sum(result['b']['errors'].values())
+    assert result['a']['restarts'] == 0
+
+
+if __name__ == "__main__":
+    main()
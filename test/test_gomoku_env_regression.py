@@ -0,0 +1,109 @@
+import sys
+sys.path.append('..')
+
+import json
+import os
+import random
+
+import numpy as np
+
+from adversarial_gym.gym_gomoku.envs import GomokuEnv
+
+# Games of the GomokuEnv of the baseline tree, before it became a wrapper of
+# GomokuTurnEnv, recorded by running this script with --record from a
+# checkout of that tree
+GAMES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gomoku_env_games.json')
+
+# player_color, opponent, board_size, random_reset
+CONFIGS = [
+    ('black', 'beginner', 9, False),
+    ('black', 'beginner', 5, True),
+    ('black', 'player', 5, True),
+    ('white', 'beginner', 9, False),
+    ('white', 'player', 5, True),
+]
+
+
+def encode(obs):
+    '''Colour plane and board digits of an observation, 0 empty, 1 black, 2 white'''
+    obs = np.asarray(obs)
+    board = (obs[:, :, 1] + 2 * obs[:, :, 2]).reshape(-1)
+    return '{}:{}'.format(int(obs[0, 0, 0]), ''.join(str(v) for v in board))
+
+
+def random_move(rng, legal_actions, num_actions):
+    '''Mostly legal moves, a few random ones that may be illegal'''
+    if rng.rand() < 0.05:
+        return int(rng.randint(num_actions))
+    return int(rng.choice(legal_actions))
+
+
+def play_games(config, num_games, seed):
+    '''Observations, rewards and dones of num_games seeded games'''
+    player_color, opponent, board_size, random_reset = config
+    num_actions = board_size * board_size
+    random.seed(seed)
+    env = GomokuEnv(player_color, opponent, board_size, random_reset)
+    env.seed(seed)
+    agent_rng = np.random.RandomState(seed)
+    opponent_rng = np.random.RandomState(seed + 1)
+
+    def opponent_policy(curr_state, prev_state, prev_action):
+        return random_move(opponent_rng, curr_state.board.get_legal_action(), num_actions)
+
+    games = []
+    for _ in range(num_games):
+        # A callable resets the env with it as the opponent policy
+        game = {'reset': encode(env.step(opponent_policy)), 'steps': []}
+        done = False
+        while not done:
+            action = random_move(agent_rng, np.flatnonzero(env.action_space.invalid_mask == 0), num_actions)
+            obs, reward, done, _ = env.step(action)
+            game['steps'].append([action, float(reward), bool(done), encode(obs)])
+        games.append(game)
+    return games
+
+
+def record():
+    games = {str(i): play_games(config, 20, i) for i, config in enumerate(CONFIGS)}
+    with open(GAMES_FILE, 'w') as f:
+        json.dump(games, f)
+
+
+def check_opening_on_random_stones():
+    '''The beginner policy opens in the center only if no stone of the random
+    reset is there'''
+    random.seed(0)
+    env = GomokuEnv('white', 'beginner', 5, random_reset=True)
+    env.seed(0)
+    center = 2 * 5 + 2
+    num_center_taken = 0
+    for _ in range(100):
+        env.reset()
+        board = env.state.board.board_state
+        # As many random stones of each colour, and a new one of black
+        assert np.count_nonzero(board == 1) == np.count_nonzero(board == 2) + 1
+        if env.state.board.last_action != center:
+            num_center_taken += 1
+    assert num_center_taken > 0
+
+
+def main():
+    '''
+    Play the recorded seeded games again on GomokuEnv: the agent and the
+    opponents play the same moves and the observations, rewards and dones
+    must be the ones of the previous env
+    '''
+    with open(GAMES_FILE) as f:
+        recorded = json.load(f)
+    for i, config in enumerate(CONFIGS):
+        assert play_games(config, len(recorded[str(i)]), i) == recorded[str(i)], config
+    check_opening_on_random_stones()
+    print('ok')
+
+
+if __name__ == "__main__":
+    if '--record' in sys.argv:
+        record()
+    else:
+        main()
@@ -0,0 +1,79 @@
+import sys
+sys.path.append('..')
+
+import asyncio
+import json
+
+import numpy as np
+
+from baselines.deepq.inference_server import InferenceServer
+
+
+class RandomQValues(object):
+    '''Stands for an ActWrapper, random Q-values'''
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def q_values(self, obs):
+        self.batch_sizes.append(len(obs))
+        return np.random.rand(len(obs), obs.shape[1] * obs.shape[2])
+
+
+async def client(port, num_moves, board_size):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    rng = np.random.RandomState(port)
+    for i in range(num_moves):
+        board = ''.join(rng.choice(['0', '1', '2'], size=board_size * board_size))
+        if i % 2:
+            writer.write((json.dumps(board) + '\n').encode())
+            await writer.drain()
+            move = int(await reader.readline())
+        else:
+            writer.write((json.dumps({'board': board, 'q_values': True}) + '\n').encode())
+            await writer.drain()
+            answer = json.loads(await reader.readline())
+            move = answer['move']
+            assert len(answer['q_values']) == board_size * board_size
+        if '0' in board:
+            assert board[move] == '0'
+    writer.close()
+    await writer.wait_closed()
+
+
+async def run():
+    act = RandomQValues()
+    server = InferenceServer(act, board_size=9, window=0.005, max_batch_size=16)
+    listener = await server.start(port=0)
+    port = listener.sockets[0].getsockname()[1]
+    await asyncio.gather(*[client(port, 50, 9) for _ in range(40)])
+
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    # Invalid requests are answered with an error, the connection stays open
+    for request in [b'not json', b'12', b'["0000"]', b'{"color": "black"}', b'{"board": 5}', b'"0000"',
+                    json.dumps('12' * 40 + '1').encode(), json.dumps({'board': '0' * 81, 'color': 'blue'}).encode()]:
+        writer.write(request + b'\n')
+        assert 'error' in json.loads(await reader.readline()), request
+    writer.write(b'{"stats": true}\n')
+    metrics = json.loads(await reader.readline())
+    writer.close()
+    await writer.wait_closed()
+    listener.close()
+    await listener.wait_closed()
+    await server.close()
+    return act, metrics
+
+
+def main():
+    '''
+    40 clients play 50 moves each: every answer is a legal move, and the
+    requests are evaluated in batches of at most 16
+    '''
+    act, metrics = asyncio.run(run())
+    print(json.dumps(metrics, indent=2))
+    assert metrics['requests'] == 40 * 50 == sum(act.batch_sizes)
+    assert max(act.batch_sizes) <= 16 and metrics['mean batch size'] > 1
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import sys
+sys.path.append('..')
+
+import threading
+
+import numpy as np
+import tensorflow as tf
+
+import adversarial_gym as gym
+from baselines import deepq
+from baselines.common import checkpoint
+from baselines.deepq.hogwild import HogwildLearner
+from baselines.deepq.replay_server import ReplayClient, ReplayServer
+from baselines.deepq.simple import _act_vars
+
+
+def beginner_policy(curr_state, prev_state, prev_action):
+    return gym.gym_gomoku.envs.util.make_beginner_policy(np.random)(curr_state, prev_state, prev_action)
+
+
+def learn_and_restore(**kwargs):
+    '''
+    Train until a best model was saved, stop and check that the weights
+    learn returns are the ones of best.npz
+    '''
+    env = gym.make('Gomoku5x5-training-camp-v0')
+    val_env = gym.make('Gomoku5x5-arena-v0', beginner_policy)
+    best = {}
+
+    def callback(lcl, _glb):
+        if not lcl['model_saved'] or lcl['t'] < lcl['saved_time_step'] + 50:
+            return False
+        # Stop once the weights moved on from the best ones
+        lcl['checkpoint_writer'].wait()
+        _, values = checkpoint.read_checkpoint(lcl['model_file'])
+        best.update({name: np.array(value) for name, value in values.items()})
+        return True
+
+    # Every run builds its model in a graph of its own
+    with tf.Graph().as_default():
+        act = deepq.learn(
+            env=env,
+            val_env=val_env,
+            q_func=deepq.models.cnn_to_mlp(convs=[(8, 3, 1)], hiddens=[16]),
+            max_timesteps=20000,
+            buffer_size=1000,
+            batch_size=16,
+            exploration_fraction=0.5,
+            exploration_final_eps=0.1,
+            val_freq=5,
+            val_max_games=4,
+            print_freq=None,
+            learning_starts=100,
+            target_network_update_freq=100,
+            num_cpu=1,
+            deterministic_filter=True,
+            random_filter=True,
+            callback=callback,
+            **kwargs)
+        restored = checkpoint.variable_values(_act_vars())
+    assert best, 'no best model was saved'
+    assert best['deepq/eps:0'].shape == ()
+    assert sorted(restored) == sorted(best)
+    for name, value in best.items():
+        assert restored[name].shape == value.shape and np.array_equal(restored[name], value), name
+    return act
+
+
+def check_learner_env_step():
+    '''Learner threads train with the env step set by the acting loop'''
+    env_steps = []
+    trained = threading.Event()
+
+    def train_step(env_step):
+        env_steps.append(env_step)
+        trained.set()
+        return 0., 0.
+
+    with tf.Session() as sess:
+        learner = HogwildLearner(sess, train_step, 2)
+        learner.set_env_step(5)
+        learner.start()
+        assert trained.wait(10)
+        learner.pause()
+        learner.set_env_step(7)
+        del env_steps[:]
+        trained.clear()
+        learner.resume()
+        assert trained.wait(10)
+        learner.stop()
+    assert env_steps and all(env_step == 7 for env_step in env_steps), env_steps
+
+
+def main():
+    check_learner_env_step()
+    learn_and_restore()
+    # Gradient steps, target updates and publications on the trainer thread
+    learn_and_restore(inference_sync_freq=10)
+    # Hogwild learner threads, the beta schedule follows the env step
+    learn_and_restore(num_learner_threads=2, prioritized_replay=True)
+    # Parameters broadcast through shared memory
+    learn_and_restore(param_broadcast_name='test_learn_best_model', param_broadcast_freq=10)
+    # Replay buffer served by another process
+    server = ReplayServer(1000, (5, 5, 3), obs_dtype=np.int8, alpha=0.6)
+    client = ReplayClient(server.info)
+    learn_and_restore(replay_buffer=client, prioritized_replay=True)
+    client.close()
+    server.close()
+    print('ok')
+
+
+if __name__ == "__main__":
+    main()
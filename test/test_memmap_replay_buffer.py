@@ -0,0 +1,115 @@
+import sys
+sys.path.append('..')
+
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from baselines.deepq.replay_buffer import MemmapReplayBuffer, PrioritizedMemmapReplayBuffer
+
+OBS_SHAPE = (19, 19, 3)
+
+
+def fill(replay_buffer, num_adds):
+    for i in range(num_adds):
+        # Every field is derived from the index to check the gathers
+        obs_t = np.full(OBS_SHAPE, i % 100, dtype=np.int8)
+        obs_tp1 = np.full(OBS_SHAPE, (i + 1) % 100, dtype=np.int8)
+        replay_buffer.add(obs_t, i, float(i), obs_tp1, float(i % 2))
+
+
+def check(batch):
+    obses_t, actions, rewards, obses_tp1, dones = batch[:5]
+    for obs_t, action, reward, obs_tp1, done in zip(obses_t, actions, rewards, obses_tp1, dones):
+        assert np.all(obs_t == action % 100)
+        assert np.all(obs_tp1 == (action + 1) % 100)
+        assert reward == action and done == action % 2
+
+
+def check_state(replay_buffer, new_buffer, directory):
+    """Save the state as snapshot.py does and load it into new_buffer"""
+    arrays, meta = replay_buffer.get_state()
+    for name, array in arrays.items():
+        np.save(os.path.join(directory, "replay-{}.npy".format(name)), array)
+    new_buffer.set_state({name: np.load(os.path.join(directory, "replay-{}.npy".format(name)), mmap_mode='r')
+                          for name in arrays}, meta)
+    assert len(new_buffer) == len(replay_buffer)
+    expected = replay_buffer._encode_sample(range(len(replay_buffer)))
+    for expected_field, field in zip(expected, new_buffer._encode_sample(range(len(new_buffer)))):
+        assert np.array_equal(expected_field, field)
+    # Both buffers overwrite the same slot next
+    fill(replay_buffer, 1)
+    fill(new_buffer, 1)
+    assert np.array_equal(replay_buffer._actions, new_buffer._actions)
+
+
+class FailingPrefetch(MemmapReplayBuffer):
+    def _warm(self, idxes):
+        raise OSError("posix_fadvise failed")
+
+
+def check_prefetch_errors(directory):
+    """Errors of the prefetch thread come out of sample instead of blocking it"""
+    replay_buffer = MemmapReplayBuffer(100, OBS_SHAPE, os.path.join(directory, 'empty'), prefetch_batches=2)
+    try:
+        replay_buffer.sample(32)
+        assert False, 'sampled an empty buffer'
+    except ValueError:
+        pass
+    replay_buffer.close()
+
+    replay_buffer = FailingPrefetch(100, OBS_SHAPE, os.path.join(directory, 'failing'), prefetch_batches=2)
+    fill(replay_buffer, 10)
+    try:
+        replay_buffer.sample(32)
+        assert False, 'the prefetch error was not raised'
+    except RuntimeError as e:
+        assert isinstance(e.__cause__, OSError)
+    replay_buffer.close()
+
+
+def main():
+    size = 20000
+    if hasattr(os, 'posix_fadvise'):
+        with tempfile.TemporaryDirectory() as td:
+            check_prefetch_errors(td)
+
+    with tempfile.TemporaryDirectory() as td:
+        replay_buffer = MemmapReplayBuffer(size, OBS_SHAPE, td, prefetch_batches=2)
+        fill(replay_buffer, size + size // 2)
+        assert len(replay_buffer) == size
+        sample_times = []
+        for _ in range(200):
+            start = time.time()
+            batch = replay_buffer.sample(32)
+            sample_times.append(time.time() - start)
+            check(batch)
+        with tempfile.TemporaryDirectory() as new_dir:
+            new_buffer = MemmapReplayBuffer(size, OBS_SHAPE, new_dir)
+            check_state(replay_buffer, new_buffer, new_dir)
+            new_buffer.close()
+        replay_buffer.close()
+        print('mean uniform sample: {:.3f} ms'.format(np.mean(sample_times) * 1000))
+
+    with tempfile.TemporaryDirectory() as td:
+        replay_buffer = PrioritizedMemmapReplayBuffer(
+            size, alpha=0.6, obs_shape=OBS_SHAPE, directory=td)
+        fill(replay_buffer, size // 2)
+        for _ in range(200):
+            batch = replay_buffer.sample(32, beta=0.4)
+            check(batch)
+            replay_buffer.update_priorities(batch[-1], np.random.uniform(0.1, 2., size=32))
+        with tempfile.TemporaryDirectory() as new_dir:
+            new_buffer = PrioritizedMemmapReplayBuffer(
+                size, alpha=0.6, obs_shape=OBS_SHAPE, directory=new_dir)
+            check_state(replay_buffer, new_buffer, new_dir)
+            assert np.isclose(new_buffer._it_sum.sum(), replay_buffer._it_sum.sum())
+            new_buffer.close()
+        replay_buffer.close()
+    print('ok')
+
+
+if __name__ == "__main__":
+    main()
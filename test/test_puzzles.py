@@ -0,0 +1,65 @@
+import sys
+sys.path.append('..')
+
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from adversarial_gym.gym_gomoku.envs import util
+from baselines.deepq.puzzles import KINDS, generate_puzzles, save_puzzles, load_puzzles, score_puzzles
+
+
+def check_board_functions(board_size=9, num_boards=50):
+    """Batched board functions against GomokuUtil"""
+    g = util.gomoku_util
+    rng = np.random.RandomState(0)
+    boards = rng.choice(3, size=(num_boards, board_size, board_size), p=[.5, .25, .25]).astype(np.int8)
+    for pattern in util.defend_patterns('black') + util.strike_patterns('white'):
+        matches = util.match_pattern(boards, pattern)
+        for n in range(num_boards):
+            assert g.check_pattern(boards[n].tolist(), pattern)[0] == matches[n].any()
+    for color in ['black', 'white']:
+        five = [g.color_dict[color]] * 5
+        fives = util.has_five(boards, color)
+        wins = util.winning_moves(boards, color)
+        for n in range(num_boards):
+            assert g.check_pattern(boards[n].tolist(), five)[0] == fives[n]
+            if fives[n]:
+                continue
+            for i, j in zip(*np.nonzero(boards[n] == 0)):
+                board = boards[n].copy()
+                board[i, j] = g.color_dict[color]
+                assert g.check_pattern(board.tolist(), five)[0] == wins[n, i, j]
+
+
+def main():
+    check_board_functions()
+
+    start = time.time()
+    puzzles = generate_puzzles(15, 3000)
+    print('generated {} puzzles in {:.1f} s'.format(len(puzzles.kinds), time.time() - start))
+    assert np.array_equal(np.bincount(puzzles.kinds), [1000] * len(KINDS))
+    answers = np.unpackbits(puzzles.answers, axis=1)[:, :15 * 15]
+
+    def oracle(obs, stochastic=False):
+        """Plays a correct answer, obs must come in order"""
+        actions = answers[oracle.next:oracle.next + len(obs)].argmax(axis=1)
+        oracle.next += len(obs)
+        return actions
+    oracle.next = 0
+    assert score_puzzles(oracle, puzzles)['puzzles all'] == 1.
+    print(score_puzzles(lambda obs, stochastic: np.random.randint(15 * 15, size=len(obs)), puzzles))
+
+    with tempfile.TemporaryDirectory() as td:
+        path = os.path.join(td, 'puzzles.npz')
+        save_puzzles(path, puzzles)
+        print('{:.1f} KB'.format(os.path.getsize(path) / 1024))
+        for saved, loaded in zip(puzzles, load_puzzles(path)):
+            assert np.array_equal(saved, loaded)
+    print('ok')
+
+
+if __name__ == '__main__':
+    main()
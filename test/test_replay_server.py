@@ -0,0 +1,61 @@
+import sys
+sys.path.append('..')
+
+import multiprocessing
+import time
+
+import numpy as np
+
+from baselines.deepq.replay_server import ReplayServer, ReplayClient
+
+OBS_SHAPE = (9, 9, 3)
+
+
+def actor(info, actor_id, num_adds):
+    replay_buffer = ReplayClient(info)
+    for i in range(num_adds):
+        # Every field carries the actor id so that torn transitions show up
+        obs = np.full(OBS_SHAPE, actor_id, dtype=np.int8)
+        replay_buffer.add(obs, actor_id, float(actor_id), obs, 0.)
+    replay_buffer.close()
+
+
+def main():
+    num_actors = 4
+    num_adds = 2000
+    server = ReplayServer(5000, OBS_SHAPE, obs_dtype=np.int8, alpha=0.6)
+
+    ctx = multiprocessing.get_context('spawn')
+    processes = [ctx.Process(target=actor, args=(server.info, actor_id + 1, num_adds))
+                 for actor_id in range(num_actors)]
+    for process in processes:
+        process.start()
+
+    learner = ReplayClient(server.info)
+    while len(learner) == 0:
+        time.sleep(0.01)
+    sample_times = []
+    num_samples = 0
+    while any(process.is_alive() for process in processes) or num_samples < 100:
+        start = time.time()
+        obses_t, actions, rewards, obses_tp1, dones, weights, idxes = learner.sample(
+            32, beta=0.4)
+        sample_times.append(time.time() - start)
+        for obs_t, action, reward, obs_tp1 in zip(obses_t, actions, rewards, obses_tp1):
+            assert np.all(obs_t == action) and np.all(obs_tp1 == action)
+            assert reward == action
+        assert np.all(weights > 0) and np.all(weights <= 1)
+        learner.update_priorities(idxes, np.random.uniform(0.1, 2., size=32))
+        num_samples += 1
+    for process in processes:
+        process.join()
+
+    print('transitions: {}'.format(len(learner)))
+    print('mean sample: {:.3f} ms'.format(np.mean(sample_times) * 1000))
+    assert len(learner) == min(5000, num_actors * num_adds)
+    learner.close()
+    server.close()
+
+
+if __name__ == "__main__":
+    main()
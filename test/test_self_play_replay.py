@@ -0,0 +1,94 @@
+import sys
+sys.path.append('..')
+
+import numpy as np
+
+import adversarial_gym as gym
+from baselines.deepq.opponent import Opponent
+from baselines.deepq.replay_buffer import ReplayBuffer
+from baselines.deepq.self_play import BatchedSelfPlay
+from baselines.deepq.simple import _add_final_transitions
+
+
+class RandomLegalAct(object):
+    '''Random empty intersection of every observation, drawn from one seeded
+    stream so that the same sequence of act calls plays the same moves'''
+
+    def __init__(self, seed):
+        self._rng = np.random.RandomState(seed)
+
+    def __call__(self, obs, **kwargs):
+        obs = np.asarray(obs)
+        empty = (obs[..., 1] + obs[..., 2]).reshape(len(obs), -1) == 0
+        return np.array([self._rng.choice(np.flatnonzero(row)) for row in empty])
+
+
+def play_with_opponent(num_games, seed):
+    '''Replay buffer of num_games games of learn against Opponent, the
+    transitions written as in the acting loop of deepq.learn'''
+    act = RandomLegalAct(seed)
+    replay_buffer = ReplayBuffer(10000)
+    opponent = Opponent(flatten_obs=False, act=act, replay_buffer=replay_buffer)
+    env = gym.make('Gomoku5x5-arena-v0', opponent.policy)
+    rewards = []
+    obs = env.reset()
+    while len(rewards) < num_games:
+        action = act(np.array(obs)[None])[0]
+        new_obs, rew, done, _ = env.step(action)
+        if done:
+            _add_final_transitions(replay_buffer, opponent, obs, action, rew, new_obs)
+            obs = env.reset()
+            opponent.reset()
+            rewards.append(rew)
+        else:
+            replay_buffer.add(obs, action, rew, new_obs, float(done))
+            obs = new_obs
+    return replay_buffer, rewards
+
+
+def play_self_play(num_games, seed):
+    '''Replay buffer of num_games games of BatchedSelfPlay, one game at a
+    time so that the act calls come in the same order as against Opponent'''
+    replay_buffer = ReplayBuffer(10000)
+    self_play = BatchedSelfPlay(RandomLegalAct(seed), replay_buffer, 5, 1, random_reset=False)
+    rewards = []
+    while len(rewards) < num_games:
+        rewards += self_play.step()
+    return replay_buffer, rewards
+
+
+def transition_key(transition):
+    obs_t, action, reward, obs_tp1, done = transition
+    return (np.asarray(obs_t, dtype=np.int8).tobytes(), int(action), float(reward),
+            np.asarray(obs_tp1, dtype=np.int8).tobytes(), float(done))
+
+
+def main():
+    '''
+    Play the same seeded games through GomokuEnv with Opponent and through
+    BatchedSelfPlay: the replay buffers must hold the same transitions,
+    with the final observation encoded for the colour of each transition,
+    -reward for the colour that did not end the game, and no pending move
+    carried over to the next game
+    '''
+    num_games = 30
+    for seed in range(3):
+        opponent_buffer, opponent_rewards = play_with_opponent(num_games, seed)
+        self_play_buffer, self_play_rewards = play_self_play(num_games, seed)
+        assert opponent_rewards == self_play_rewards, seed
+        assert len(opponent_buffer) == len(self_play_buffer), seed
+        # learn writes a move of black as soon as white replied, BatchedSelfPlay
+        # when black is to move again, so only the order differs
+        assert (sorted(map(transition_key, opponent_buffer._storage)) ==
+                sorted(map(transition_key, self_play_buffer._storage))), seed
+        finals = [t for t in self_play_buffer._storage if t[4]]
+        assert len(finals) == 2 * num_games
+        for obs_t, _, reward, obs_tp1, _ in finals:
+            # The final observation is encoded for the colour that moved
+            assert (obs_tp1[:, :, 0] == obs_t[0, 0, 0]).all()
+        assert set(opponent_rewards) <= {-1., 0., 1.} and len(set(opponent_rewards)) > 1
+    print('ok')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import sys
+sys.path.append('..')
+
+import io
+import json
+import os
+import subprocess
+import tempfile
+
+from main import RandomPlayer, serve
+from test_tournament_match import save_model
+
+
+def serve_lines(player, lines):
+    stdout, stderr = io.StringIO(), io.StringIO()
+    serve(player, stdin=io.StringIO(''.join(line + '\n' for line in lines)), stdout=stdout, stderr=stderr)
+    return stdout.getvalue().splitlines()
+
+
+def check_invalid_requests():
+    '''Malformed requests are answered with an error and the server goes on'''
+    board = '0' * 24 + '1'
+    requests = ['not json', '12', '["0"]', '{"color": "black"}', '{"board": 5}', json.dumps('0a1'),
+                json.dumps({'board': board, 'color': 'blue'}), json.dumps({'board': board, 'color': 3}),
+                json.dumps({'board': board, 'color': 'empty'}), json.dumps('1' * 25)]
+    answers = serve_lines(RandomPlayer(), requests + [json.dumps(board)])
+    assert len(answers) == len(requests) + 1
+    for request, answer in zip(requests, answers):
+        assert 'error' in json.loads(answer), request
+    assert 0 <= int(answers[-1]) < 24
+    answer = json.loads(serve_lines(RandomPlayer(), [json.dumps({'board': board, 'color': 'white'})])[0])
+    assert 0 <= answer['move'] < 24
+
+
+def main():
+    '''
+    Serve a saved model with main.py --serve: stdout only holds the
+    answers, whatever is printed while the model is loaded
+    '''
+    check_invalid_requests()
+    with tempfile.TemporaryDirectory() as td:
+        path = os.path.join(td, 'model.npz')
+        save_model(path, 0)
+        board = '0' * 12 + '1' + '0' * 12
+        requests = [json.dumps(board), json.dumps({'board': board, 'q_values': True}), json.dumps('0' * 9)]
+        process = subprocess.run(
+            [sys.executable, os.path.join('..', 'main.py'), '--serve', '--model', path],
+            input='\n'.join(requests) + '\n', stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            universal_newlines=True, timeout=300)
+    assert process.returncode == 0, process.stderr
+    lines = process.stdout.splitlines()
+    assert len(lines) == 3, lines
+    assert 0 <= int(lines[0]) < 25 and int(lines[0]) != 12
+    answer = json.loads(lines[1])
+    assert answer['move'] == int(lines[0]) and len(answer['q_values']) == 25
+    # A board of another size is an error, not a crash
+    assert 'error' in json.loads(lines[2])
+    print('ok')
+
+
+if __name__ == "__main__":
+    main()
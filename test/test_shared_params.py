@@ -0,0 +1,62 @@
+import sys
+sys.path.append('..')
+
+import multiprocessing
+import time
+
+import numpy as np
+
+from baselines.common.shared_params import SharedFlatParams
+
+
+def reader(name, num_reads, result_queue):
+    shared = SharedFlatParams(name)
+    out = np.empty(shared.size, dtype=np.float32)
+    last_version = 0
+    num_torn = 0
+    read_times = []
+    while last_version < num_reads:
+        start = time.time()
+        version, flat = shared.read(out)
+        read_times.append(time.time() - start)
+        if flat is None:
+            continue
+        # The writer fills the whole vector with its version number
+        if not np.all(flat == flat[0]):
+            num_torn += 1
+        last_version = version
+    shared.close()
+    result_queue.put((num_torn, np.mean(read_times)))
+
+
+def main():
+    size = 8 * 256 * 256 * 9
+    num_writes = 200
+    shared = SharedFlatParams('test_shared_params', size=size, create=True)
+
+    ctx = multiprocessing.get_context('spawn')
+    result_queue = ctx.Queue()
+    process = ctx.Process(target=reader, args=(
+        'test_shared_params', num_writes, result_queue))
+    process.start()
+
+    write_times = []
+    for version in range(1, num_writes + 1):
+        flat = np.full(size, version, dtype=np.float32)
+        start = time.time()
+        assert shared.write(flat) == version
+        write_times.append(time.time() - start)
+
+    num_torn, mean_read_time = result_queue.get()
+    process.join()
+    shared.close()
+
+    print('parameters: {}'.format(size))
+    print('torn reads: {}'.format(num_torn))
+    print('mean write: {:.3f} ms'.format(np.mean(write_times) * 1000))
+    print('mean read: {:.3f} ms'.format(mean_read_time * 1000))
+    assert num_torn == 0
+
+
+if __name__ == "__main__":
+    main()
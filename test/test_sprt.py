@@ -0,0 +1,38 @@
+import sys
+sys.path.append('..')
+
+import random
+
+from baselines.common.sprt import SPRT
+
+
+def run(p, best, delta, error, max_games):
+    """Decision and number of games of one validation of true win rate p"""
+    sprt = SPRT.around(best, delta, alpha=error, beta=error)
+    for _ in range(max_games):
+        if sprt.update(random.random() < p) is not None:
+            break
+    return sprt.decision, sprt.num_trials
+
+
+def main():
+    random.seed(0)
+    best, delta, error, max_games, num_runs = 0.3, 0.1, 0.05, 200, 2000
+    for p in [0.1, 0.2, 0.3, 0.4, 0.5]:
+        runs = [run(p, best, delta, error, max_games) for _ in range(num_runs)]
+        accepted = sum(1 for decision, _ in runs if decision) / num_runs
+        rejected = sum(1 for decision, _ in runs if decision is False) / num_runs
+        mean_games = sum(n for _, n in runs) / num_runs
+        print('win rate {:.1f}: better {:.3f} worse {:.3f} games {:.1f}'.format(
+            p, accepted, rejected, mean_games))
+        if p <= best - delta:
+            assert accepted <= error
+        if p >= best + delta:
+            assert rejected <= error
+        if abs(p - best) >= 2 * delta:
+            assert mean_games < max_games / 4
+    print('ok')
+
+
+if __name__ == '__main__':
+    main()
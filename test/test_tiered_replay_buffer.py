@@ -0,0 +1,81 @@
+import sys
+sys.path.append('..')
+
+import os
+import tempfile
+
+import numpy as np
+
+from baselines.deepq.replay_buffer import TieredReplayBuffer, PrioritizedTieredReplayBuffer
+
+OBS_SHAPE = (15, 15, 3)
+
+
+def fill(replay_buffer, num_adds):
+    for i in range(num_adds):
+        # Sparse boards like the real ones, every field derived from the index
+        obs_t = np.zeros(OBS_SHAPE, dtype=np.int32)
+        obs_t[i % 15, :, i % 3] = 1
+        obs_tp1 = np.zeros(OBS_SHAPE, dtype=np.int32)
+        obs_tp1[(i + 1) % 15, :, (i + 1) % 3] = 1
+        replay_buffer.add(obs_t, i, float(i), obs_tp1, float(i % 2))
+
+
+def check(batch):
+    obses_t, actions, rewards, obses_tp1, dones = batch[:5]
+    for obs_t, action, reward, obs_tp1, done in zip(obses_t, actions, rewards, obses_tp1, dones):
+        assert np.sum(obs_t) == 15 and np.all(obs_t[action % 15, :, action % 3] == 1)
+        assert np.all(obs_tp1[(action + 1) % 15, :, (action + 1) % 3] == 1)
+        assert reward == action and done == action % 2
+
+
+def check_state(replay_buffer, new_buffer):
+    """Save the state as snapshot.py does and load it into new_buffer"""
+    arrays, meta = replay_buffer.get_state()
+    with tempfile.TemporaryDirectory() as td:
+        for name, array in arrays.items():
+            np.save(os.path.join(td, "replay-{}.npy".format(name)), array)
+        new_buffer.set_state({name: np.load(os.path.join(td, "replay-{}.npy".format(name)), mmap_mode='r')
+                              for name in arrays}, meta)
+    assert len(new_buffer) == len(replay_buffer)
+    assert new_buffer.stats()["replay cold transitions"] == replay_buffer.stats()["replay cold transitions"]
+    expected = replay_buffer._encode_sample(range(len(replay_buffer)))
+    for expected_field, field in zip(expected, new_buffer._encode_sample(range(len(new_buffer)))):
+        assert np.array_equal(expected_field, field)
+    # Both buffers go on the same way
+    fill(replay_buffer, 1000)
+    fill(new_buffer, 1000)
+    assert replay_buffer.stats()["replay cold transitions"] == new_buffer.stats()["replay cold transitions"]
+    check(new_buffer._encode_sample(range(len(new_buffer))))
+
+
+def main():
+    for compression in ['zlib', 'lzma']:
+        replay_buffer = TieredReplayBuffer(
+            10000, hot_size=1000, chunk_size=256, compression=compression)
+        fill(replay_buffer, 15000)
+        assert len(replay_buffer) == 10240
+        for _ in range(200):
+            check(replay_buffer.sample(32))
+        stats = replay_buffer.stats()
+        assert stats["replay hot transitions"] >= 1000
+        print(compression)
+        for key, value in sorted(stats.items()):
+            print('  {}: {:.3f}'.format(key, value))
+        check_state(replay_buffer, TieredReplayBuffer(
+            10000, hot_size=1000, chunk_size=256, compression=compression))
+
+    replay_buffer = PrioritizedTieredReplayBuffer(5000, alpha=0.6, hot_size=500)
+    fill(replay_buffer, 8000)
+    for _ in range(200):
+        batch = replay_buffer.sample(32, beta=0.4)
+        check(batch)
+        replay_buffer.update_priorities(batch[-1], np.random.uniform(0.1, 2., size=32))
+    new_buffer = PrioritizedTieredReplayBuffer(5000, alpha=0.6, hot_size=500)
+    check_state(replay_buffer, new_buffer)
+    assert np.isclose(new_buffer._it_sum.sum(), replay_buffer._it_sum.sum())
+    print('ok')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import sys
+sys.path.append('..')
+
+import numpy as np
+
+from baselines.deepq.tournament import elo_ratings, round_robin_pairings, swiss_pairings
+
+
+def simulate(players, strengths, pairings, games, rng, round_index=0):
+    """Match results between players of known Elo, no draws"""
+    results = []
+    for a, b in pairings:
+        p = 1. / (1. + 10 ** ((strengths[b] - strengths[a]) / 400.))
+        a_win = int(rng.binomial(games, p))
+        results.append({"round": round_index, "a": a, "b": b,
+                        "a_win": a_win, "b_win": games - a_win, "draw": 0})
+    return results
+
+
+def main():
+    rng = np.random.RandomState(0)
+    players = ['p{}'.format(i) for i in range(8)]
+    strengths = {player: 100. * i for i, player in enumerate(players)}
+    results = simulate(players, strengths, round_robin_pairings(players), 100, rng)
+    ratings = elo_ratings(players, results)
+    mean_strength = np.mean(list(strengths.values()))
+    for rating in ratings:
+        true_elo = strengths[rating['player']] - mean_strength
+        print('{player}: {elo:.1f} [{lower:.1f}, {upper:.1f}] true {true:.1f}'.format(true=true_elo, **rating))
+        assert rating['lower'] - 50 <= true_elo <= rating['upper'] + 50
+    assert [r['player'] for r in ratings] == list(reversed(players))
+
+    # Every player plays once per Swiss round, and the first round pairs
+    # players who have not met
+    results = []
+    for round_index in range(3):
+        pairings = swiss_pairings(players, results)
+        assert sorted(p for pair in pairings for p in pair) == players
+        results += simulate(players, strengths, pairings, 10, rng, round_index)
+    assert len({(r['a'], r['b']) for r in results}) > len(players) // 2
+    print(elo_ratings(players, results)[0])
+    print('ok')
+
+
+if __name__ == '__main__':
+    main()
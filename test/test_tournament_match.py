@@ -0,0 +1,61 @@
+import sys
+sys.path.append('..')
+
+import os
+import tempfile
+
+import numpy as np
+import tensorflow as tf
+
+import baselines.common.tf_util as U
+from baselines import deepq
+from baselines.deepq import tournament
+from baselines.deepq.simple import ActWrapper, _make_board_obs_ph
+
+
+def save_model(path, seed):
+    '''Save an untrained 5x5 model with weights drawn from seed'''
+    params = {
+        'make_obs_ph': _make_board_obs_ph(5),
+        'q_func': deepq.models.cnn_to_mlp(convs=[(8, 3, 1)], hiddens=[16]),
+        'num_actions': 25,
+        'random_filter': True,
+        'deterministic_filter': True,
+        'jit': False,
+    }
+    with tf.Graph().as_default(), U.make_session(num_cpu=1).as_default():
+        tf.set_random_seed(seed)
+        act, _, _, _ = deepq.build_train(
+            optimizer=tf.train.AdamOptimizer(learning_rate=1e-4), gamma=0.99, **params)
+        U.initialize()
+        ActWrapper(act, params).save(path)
+
+
+def main():
+    '''
+    Play a match between two saved models in this process, then a small
+    tournament on a worker process
+    '''
+    with tempfile.TemporaryDirectory() as td:
+        players = [os.path.join(td, 'a.npz'), os.path.join(td, 'b.npz')]
+        for seed, path in enumerate(players):
+            save_model(path, seed)
+
+        tournament._init_worker(5, 1, 2)
+        counts = tournament.play_match(players[0], players[1], 4, seed=0)
+        assert sum(counts) == 4 and min(counts) >= 0
+        # Greedy models with the same openings play the same games
+        assert tournament.play_match(players[0], players[1], 4, seed=0) == counts
+
+        results_file = os.path.join(td, 'results.jsonl')
+        ratings = tournament.run_tournament(players, results_file, 5, games_per_match=2, num_workers=1)
+        assert sorted(r['player'] for r in ratings) == sorted(players)
+        results = tournament.load_results(results_file)
+        assert len(results) == 1
+        assert results[0]['a_win'] + results[0]['b_win'] + results[0]['draw'] == 2
+        assert np.isclose(sum(r['points'] for r in ratings), 2.)
+    print('ok')
+
+
+if __name__ == "__main__":
+    main()
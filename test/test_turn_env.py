@@ -0,0 +1,42 @@
+import sys
+sys.path.append('..')
+
+import numpy as np
+
+from adversarial_gym.gym_gomoku.envs import GomokuTurnEnv, GomokuVecEnv
+
+
+def main():
+    '''
+    Play the same random moves on GomokuTurnEnv games and on a GomokuVecEnv,
+    they must give the same rewards, dones and observations
+    '''
+    num_envs = 32
+    rng = np.random.RandomState(0)
+    vec_env = GomokuVecEnv(num_envs, 5)
+    vec_obs = vec_env.reset()
+    envs = [GomokuTurnEnv(5) for _ in range(num_envs)]
+    for k, env in enumerate(envs):
+        assert (env.reset() == vec_obs[k]).all()
+
+    num_games = 0
+    for _ in range(500):
+        legal_mask = vec_env.legal_mask()
+        # Mostly legal moves, a few random ones that may be illegal
+        actions = np.array([rng.randint(25) if rng.rand() < 0.05 else rng.choice(np.flatnonzero(legal_mask[k]))
+                            for k in range(num_envs)])
+        vec_obs, rewards, dones, info = vec_env.step(actions)
+        for k, env in enumerate(envs):
+            obs, reward, done, env_info = env.step(actions[k])
+            assert reward == rewards[k] and done == dones[k]
+            assert (obs == info['final_observation'][k]).all()
+            if done:
+                num_games += 1
+                assert (env.reset() == vec_obs[k]).all()
+            else:
+                assert (env_info['legal_mask'] == info['legal_mask'][k]).all()
+    print("{} games, same results".format(num_games))
+
+
+if __name__ == "__main__":
+    main()